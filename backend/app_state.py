@@ -3,11 +3,31 @@ import os
 from typing import Optional
 
 import aiorwlock
-from web3 import AsyncHTTPProvider
+from eth_account import Account
 from web3 import AsyncWeb3
+from web3.middleware import async_simple_cache_middleware
 from dotenv import load_dotenv
 
+from fee_oracle import FeeOracle
 from logger import logger
+from metrics import NONCE_RESERVED
+from metrics import RPC_ENDPOINT_IN_FLIGHT
+from metrics import RPC_ENDPOINT_LATENCY
+from metrics import RPC_ENDPOINT_LIMIT
+from metrics import RPC_ENDPOINT_QUEUED
+from metrics import SIGNER_HEALTHY
+from metrics import SIGNER_LOAD
+from metrics import TX_PENDING
+from nonce_manager import NonceManager
+from receipt_tracker import JobStatus
+from receipt_tracker import ReceiptTracker
+from rpc_pool import PooledRPCProvider
+from signer_accounts import SignerAccountPool
+from single_flight import SingleFlight
+from submission_coordinator import SharedNonceManager
+from submission_coordinator import SharedSingleFlight
+from submission_coordinator import SubmissionCoordinator
+from tx_signer import create_signer
 
 state_logger = logger.bind(
     service='I Was BORED|App State',
@@ -25,7 +45,15 @@ class AppState:
         self.w3 = None
         self.signer_account = None
         self.signer_pkey = None
-        self.signer_nonce = None
+        self.signer_accounts = None
+        self.coordinator = None
+        self.receipt_tracker = None
+        self.submissions = None
+        self.market_cache = None
+        self.positions_cache = None
+        self.market_stream = None
+        self.fee_oracle = None
+        self.signer = None
         self.oracle_abi = None
         self.oracle_contract = None
         self.token_contract = None
@@ -35,7 +63,18 @@ class AppState:
 
     async def initialize(self):
         """
-        Initialize the application state.
+        Initialize the application state for serving reads and submitting transactions.
+        """
+        await self.initialize_reader()
+        await self._initialize_writer()
+
+    async def initialize_reader(self):
+        """
+        Initialize only web3 and the contract instances.
+
+        Used by processes that read the chain but never sign or send transactions,
+        such as the market monitor, so they do not start the fee oracle, signer,
+        receipt tracker or nonce managers.
         """
         # Load environment variables
         load_dotenv()
@@ -44,27 +83,25 @@ class AppState:
 
         # Initialize Web3 instance
         infura_url = os.getenv("INFURA_URL", "https://sepolia.infura.io/v3/1c6b5e4765a341b29b9d77dd2549c025")
-        self.w3 = AsyncWeb3(AsyncHTTPProvider(infura_url))
-        await self._initialize_backend()
-
-    async def _initialize_backend(self):
+        # Extra endpoints (comma separated) join the pool; reads go to the fastest healthy one
+        rpc_urls = [infura_url] + [url.strip() for url in os.getenv("RPC_URLS", "").split(",") if url.strip()]
+        # Each endpoint coalesces concurrent requests into JSON-RPC batch arrays
+        self.w3 = AsyncWeb3(PooledRPCProvider(list(dict.fromkeys(rpc_urls))))
+        # web3 validates the chain id on every eth_call/eth_estimateGas; answer it from cache
+        self.w3.middleware_onion.add(async_simple_cache_middleware, 'simple_cache')
+        self._initialize_contracts()
+
+    def _initialize_contracts(self):
         """
-        Initialize the main backend with contract interactions and balance checks.
-
+        Load the contract ABIs and create the contract instances.
         """
-        # Load contract addresses and signer credentials from environment
+        # Load contract addresses from environment
         self.oracle_contract_address = os.getenv("ORACLE_CONTRACT_ADDRESS")
         self.token_contract_address = os.getenv("TOKEN_CONTRACT_ADDRESS")
-        self.signer_account = os.getenv("SIGNER_ACCOUNT")
-        self.signer_pkey = os.getenv("SIGNER_PRIVATE_KEY")
-        
+
         # Validate required environment variables
         if not self.oracle_contract_address:
             raise ValueError("ORACLE_CONTRACT_ADDRESS environment variable is required")
-        if not self.signer_account:
-            raise ValueError("SIGNER_ACCOUNT environment variable is required")
-        if not self.signer_pkey:
-            raise ValueError("SIGNER_PRIVATE_KEY environment variable is required")
 
         # Load ABIs for various contracts
         try:
@@ -81,8 +118,87 @@ class AppState:
             address=self.token_contract_address, abi=self.token_abi,
         )
 
-        # Get initial nonce for the signer account
-        self.signer_nonce = await self.w3.eth.get_transaction_count(self.signer_account)
+    async def _initialize_writer(self):
+        """
+        Initialize transaction submission: signer accounts, fees, signing and receipt tracking.
+        """
+        # Load signer credentials from environment
+        self.signer_account = os.getenv("SIGNER_ACCOUNT")
+        self.signer_pkey = os.getenv("SIGNER_PRIVATE_KEY")
+
+        # Validate required environment variables
+        if not self.signer_account:
+            raise ValueError("SIGNER_ACCOUNT environment variable is required")
+        if not self.signer_pkey:
+            raise ValueError("SIGNER_PRIVATE_KEY environment variable is required")
+
+        # Extra signer keys (SIGNER_PRIVATE_KEYS, comma separated) join the primary account
+        signer_keys = [(self.signer_account, self.signer_pkey)] + [
+            (Account.from_key(key.strip()).address, key.strip())
+            for key in os.getenv("SIGNER_PRIVATE_KEYS", "").split(",") if key.strip()
+        ]
+        # With several workers (NONCE_DB_PATH set) they share one allocator in SQLite
+        if os.getenv("NONCE_DB_PATH"):
+            self.coordinator = SubmissionCoordinator()
+            await self.coordinator.open()
+
+        # Chain id and fees are cached, so building a transaction costs only a gas estimate
+        self.fee_oracle = FeeOracle(self.w3)
+        await self.fee_oracle.start()
+
+        # ABI encoding and signing run off the event loop (SIGNER_BACKEND)
+        self.signer = create_signer()
+
+        # One background loop polls receipts for every pending transaction
+        self.receipt_tracker = ReceiptTracker(self.w3, store=self.coordinator)
+        await self.receipt_tracker.start()
+
+        # Each account has its own nonces; the primary's are reserved under the writer lock,
+        # which is held only for the reservation
+        accounts = []
+        for index, (address, private_key) in enumerate(signer_keys):
+            lock = self._rwlock.writer_lock if index == 0 else None
+            if self.coordinator is not None:
+                nonce_manager = SharedNonceManager(self.w3, address, self.coordinator, lock=lock)
+            else:
+                nonce_manager = NonceManager(self.w3, address, lock=lock)
+            accounts.append((address, private_key, nonce_manager))
+        # Submissions go to the least-loaded healthy account; resolutions have their own lane
+        self.signer_accounts = SignerAccountPool(accounts, self.receipt_tracker)
+        await self.signer_accounts.initialize()
+        await self.signer_accounts.start()
+
+        # Write requests are deduplicated by (function, question_id); failed jobs may be retried,
+        # and jobs whose transaction may still be mined are never resubmitted. With several
+        # workers the keys live in the coordinator database, so a retry on another worker attaches
+        reuse_rules = {
+            'reusable': lambda job: job.status != JobStatus.FAILED,
+            'pinned': lambda job: job.status in (JobStatus.PENDING, JobStatus.UNKNOWN),
+        }
+        if self.coordinator is not None:
+            self.submissions = SharedSingleFlight(self.coordinator, self.receipt_tracker, **reuse_rules)
+        else:
+            self.submissions = SingleFlight(**reuse_rules)
+
+    def register_metrics(self):
+        """
+        Point the scrape-time gauges at the RPC pool and, once initialized for writing,
+        at the signer accounts and receipt tracker.
+        """
+        endpoints = self.w3.provider.endpoints
+        RPC_ENDPOINT_LIMIT.set_callback(lambda: [((e.url,), e.limiter.limit) for e in endpoints])
+        RPC_ENDPOINT_IN_FLIGHT.set_callback(lambda: [((e.url,), e.limiter.in_flight) for e in endpoints])
+        RPC_ENDPOINT_QUEUED.set_callback(lambda: [((e.url,), e.limiter.queued) for e in endpoints])
+        RPC_ENDPOINT_LATENCY.set_callback(lambda: [((e.url,), e.latency) for e in endpoints])
+        if self.signer_accounts is None:
+            return
+        accounts = self.signer_accounts
+        NONCE_RESERVED.set_callback(lambda: [((a.address,), a.nonce_manager.reserved_count) for a in accounts])
+        SIGNER_LOAD.set_callback(lambda: [((address,), load) for address, load in accounts.loads().items()])
+        SIGNER_HEALTHY.set_callback(
+            lambda: [((a.address, a.lane), 0 if a.stuck or a.cooling_down else 1) for a in accounts],
+        )
+        TX_PENDING.set_callback(lambda: [((), self.receipt_tracker.pending_count)])
 
     def _load_abi(self, file_path):
         """
@@ -102,5 +218,15 @@ class AppState:
         """
         Clean up shared resources when shutting down the application.
         """
-        # Implement cleanup logic here (e.g., closing connections)
-        pass
+        if self.signer_accounts is not None:
+            await self.signer_accounts.stop()
+        if self.receipt_tracker is not None:
+            await self.receipt_tracker.stop()
+        if self.fee_oracle is not None:
+            await self.fee_oracle.stop()
+        if self.signer is not None:
+            await self.signer.close()
+        if self.coordinator is not None:
+            await self.coordinator.close()
+        if self.w3 is not None:
+            await self.w3.provider.close()
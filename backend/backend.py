@@ -1,19 +1,45 @@
+import os
 import uuid
 from typing import Any
 from typing import Dict
 from typing import Optional
 
 from fastapi import FastAPI
+from fastapi import Query
+from fastapi import WebSocket
+from fastapi import WebSocketDisconnect
 from fastapi import Request as FastAPIRequest
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from eth_utils import is_address
 from tenacity import retry
 from tenacity import retry_if_exception_type
 from tenacity import stop_after_attempt
 from tenacity import wait_random_exponential
 import asyncio
 from app_state import AppState
+from logger import RequestLogSampler
 from logger import logger
+from market_cache import MarketSnapshotCache
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from metrics import HTTP_REQUEST_DURATION
+from metrics import HTTP_REQUESTS
+from metrics import MARKET_SNAPSHOT_BLOCK
+from metrics import REGISTRY as METRICS_REGISTRY
+from metrics import STREAM_SUBSCRIBERS
+from metrics import TX_SUBMIT_RETRIES
+from market_stream import MarketUpdateBroadcaster
+from positions_cache import UserPositionsCache
+from receipt_tracker import JobStatus
+from receipt_tracker import TransactionJob
+from signer_accounts import SignerAccount
+from single_flight import SubmissionInFlightError
+from tracing import SPAN_KIND_SERVER
+from tracing import STATUS_ERROR
+from tracing import TRACEPARENT_HEADER
+from tracing import SpanContext
+from tracing import tracer
 from transaction_utils import write_payable_transaction
 from pydantic import BaseModel
 from fastapi import HTTPException
@@ -23,10 +49,16 @@ import time
 
 AUTH_TOKEN = "iwasbored"
 
+MARKETS_PAGE_SIZE = 50
+MARKETS_MAX_PAGE_SIZE = 500
+
+BULK_MAX_ITEMS = 100  # Items accepted by one /initializeMarkets or /resolveMarkets request
+
 # Initialize logger for this service
 service_logger = logger.bind(
     service='IWasBored|Backend',
 )
+request_log_sampler = RequestLogSampler()
 
 class MarketInfo(BaseModel):
     question_id: str
@@ -74,9 +106,11 @@ async def request_middleware(request: FastAPIRequest, call_next: Any) -> Optiona
 
     This middleware:
     1. Generates a unique request ID
-    2. Logs the start and end of each request
-    3. Catches and logs any exceptions
-    4. Adds the request ID to the response headers
+    2. Catches and logs any exceptions
+    3. Adds the request ID to the response headers
+    4. Records the request latency by route template
+    5. Logs one end-of-request record with the duration, sampled per route
+    6. Traces the request as a server span, continuing an incoming traceparent
 
     Args:
         request (FastAPIRequest): The incoming request object
@@ -88,10 +122,17 @@ async def request_middleware(request: FastAPIRequest, call_next: Any) -> Optiona
     # Generate a unique request ID
     request_id = str(uuid.uuid4())
     request.state.request_id = request_id
+    started = time.perf_counter()
+
+    # Requests without a traceparent start a trace whose id is the request id
+    parent = SpanContext.from_traceparent(request.headers.get(TRACEPARENT_HEADER))
+    span = tracer.span(
+        f'{request.method} {request.url.path}', parent=parent, kind=SPAN_KIND_SERVER,
+        trace_id=request_id.replace('-', ''), **{'http.method': request.method, 'request.id': request_id},
+    )
 
     # Use contextualized logging
-    with service_logger.contextualize(request_id=request_id):
-        service_logger.info('Request started for: {}', request.url)
+    with service_logger.contextualize(request_id=request_id), span:
         try:
             # Call the next middleware or route handler
             response = await call_next(request)
@@ -115,7 +156,25 @@ async def request_middleware(request: FastAPIRequest, call_next: Any) -> Optiona
         finally:
             # Add the request ID to the response headers
             response.headers['X-Request-ID'] = request_id
-            service_logger.info('Request ended')
+            # Label by route template, not the raw path, to keep the series count bounded
+            route = request.scope.get('route')
+            route_path = route.path if route is not None else 'unmatched'
+            duration = time.perf_counter() - started
+            span.update_name(f'{request.method} {route_path}')
+            span.set_attribute('http.route', route_path)
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.set_status(STATUS_ERROR, f'HTTP {response.status_code}')
+            HTTP_REQUEST_DURATION.labels(request.method, route_path).observe(duration)
+            HTTP_REQUESTS.labels(request.method, route_path, str(response.status_code)).inc()
+            if request_log_sampler.should_log(route_path, response.status_code):
+                service_logger.bind(
+                    method=request.method,
+                    path=request.url.path,
+                    route=route_path,
+                    status=response.status_code,
+                    duration_ms=round(duration * 1000, 2),
+                ).info('Request ended')
             return response
 
 
@@ -127,8 +186,24 @@ async def startup_event():
     This function is called when the application starts up.
     It initializes the application state with the provided settings.
     """
+    tracer.configure('iwasbored-backend')
     await app.state.initialize()
 
+    # Read endpoints are served from a snapshot refreshed once per block
+    app.state.market_cache = MarketSnapshotCache(app.state)
+    app.state.positions_cache = UserPositionsCache(app.state, app.state.market_cache)
+    await app.state.positions_cache.start()
+    # Per-block market changes are pushed to stream subscribers
+    app.state.market_stream = MarketUpdateBroadcaster()
+    app.state.market_cache.add_listener(app.state.market_stream.on_snapshot)
+    await app.state.market_cache.start()
+
+    app.state.register_metrics()
+    MARKET_SNAPSHOT_BLOCK.set_callback(
+        lambda: [((), app.state.market_cache.snapshot.block_number)] if app.state.market_cache.snapshot else [],
+    )
+    STREAM_SUBSCRIBERS.set_callback(lambda: [((), len(app.state.market_stream.subscribers))])
+
 
 @app.on_event('shutdown')
 async def shutdown_event():
@@ -138,13 +213,142 @@ async def shutdown_event():
     This function is called when the application is shutting down.
     It performs cleanup operations for the application state.
     """
+    if app.state.positions_cache is not None:
+        await app.state.positions_cache.stop()
+    if app.state.market_stream is not None:
+        app.state.market_stream.close()
+    if app.state.market_cache is not None:
+        await app.state.market_cache.stop()
     await app.state.cleanup()
+    tracer.shutdown()
+
+def count_submit_retry(retry_state):
+    """tenacity `before_sleep` hook counting submission retries and tracing the backoff."""
+    TX_SUBMIT_RETRIES.labels(retry_state.fn.__name__).inc()
+    now = time.time_ns()
+    tracer.record(
+        'tx.retry_backoff', now, now + int(retry_state.next_action.sleep * 1e9),
+        attempt=retry_state.attempt_number, **{'retry.cause': str(retry_state.outcome.exception())},
+    )
+
+
+async def _send_oracle_transaction(
+    app_state: AppState, account: SignerAccount, _nonce: int, function: str, value: int, *args,
+):
+    """
+    Build, sign and send an oracle contract transaction with a reserved nonce.
+
+    Args:
+        app_state (AppState): The application state.
+        account (SignerAccount): The signer account the nonce was reserved for.
+        _nonce (int): A nonce reserved from the account's nonce manager.
+        function (str): The oracle contract function to call.
+        value (int): The amount of Ether to send with the transaction (in wei).
+        *args: The function parameters.
+
+    Returns:
+        tuple: The transaction hash and its nonce.
+    """
+    nonce_manager = account.nonce_manager
+    try:
+        with tracer.span('tx.submit', function=function, nonce=_nonce, signer=account.address):
+            tx_hash = await write_payable_transaction(
+                app_state.w3,
+                account.address,
+                account.private_key,
+                app_state.oracle_contract,
+                function,
+                _nonce,
+                value,
+                *args,
+                fee_oracle=app_state.fee_oracle,
+                signer=app_state.signer,
+            )
+
+    except Exception as e:
+        service_logger.error(f'Exception: {e}')
+
+        # Frees or retires the nonce and resyncs in the background on nonce errors
+        nonce_manager.handle_send_error(_nonce, e)
+        app_state.signer_accounts.record_failure(account)
+        if 'nonce' in str(e):
+            raise Exception('nonce error, resyncing nonce')
+        raise e
+
+    nonce_manager.mark_sent(_nonce)
+    app_state.signer_accounts.record_success(account)
+    service_logger.info(
+        f'submitted transaction with tx_hash: {tx_hash}, nonce: {_nonce}, signer: {account.address}',
+    )
+    return tx_hash, _nonce
+
+
+async def submit_oracle_transaction(app_state: AppState, account: SignerAccount, function: str, value: int, *args):
+    """
+    Build, sign and send an oracle contract transaction.
+
+    The nonce is reserved atomically up front, so several transactions can be
+    built, signed and sent concurrently instead of one at a time under the lock.
+
+    Args:
+        app_state (AppState): The application state.
+        account (SignerAccount): The signer account leased from `app_state.signer_accounts`.
+        function (str): The oracle contract function to call.
+        value (int): The amount of Ether to send with the transaction (in wei).
+        *args: The function parameters.
+
+    Returns:
+        tuple: The transaction hash and its nonce.
+    """
+    with tracer.span('nonce.reserve', signer=account.address):
+        _nonce = await account.nonce_manager.reserve()
+    return await _send_oracle_transaction(app_state, account, _nonce, function, value, *args)
+
+
+async def submit_oracle_transactions(app_state: AppState, accounts: list[SignerAccount], calls: list[tuple]):
+    """
+    Send many oracle contract transactions back-to-back.
+
+    The nonces of each signer account are reserved in one step, then every
+    transaction is signed and sent concurrently; the batching provider
+    coalesces the sends into one JSON-RPC batch.
+
+    Args:
+        app_state (AppState): The application state.
+        accounts (list): The signer account for each call, from `signer_accounts.lease_many`.
+        calls (list): (function, value, args) tuples.
+
+    Returns:
+        list: The (transaction hash, nonce) tuple, or the exception raised, for each call.
+    """
+    by_account = {}
+    for index, account in enumerate(accounts):
+        by_account.setdefault(account, []).append(index)
+
+    async def reserve(account: SignerAccount, count: int):
+        with tracer.span('nonce.reserve_many', count=count, signer=account.address):
+            return await account.nonce_manager.reserve_many(count)
+
+    nonces = [None] * len(calls)
+    reserved = await asyncio.gather(*[reserve(account, len(indexes)) for account, indexes in by_account.items()])
+    for indexes, account_nonces in zip(by_account.values(), reserved):
+        for index, _nonce in zip(indexes, account_nonces):
+            nonces[index] = _nonce
+    return await asyncio.gather(
+        *[
+            _send_oracle_transaction(app_state, account, _nonce, function, value, *args)
+            for account, _nonce, (function, value, args) in zip(accounts, nonces, calls)
+        ],
+        return_exceptions=True,
+    )
+
 
 @retry(
     reraise=True,
     retry=retry_if_exception_type(Exception),
     wait=wait_random_exponential(multiplier=1, max=10),
     stop=stop_after_attempt(3),
+    before_sleep=count_submit_retry,
 )
 async def initilize_market_on_contract(
     request: FastAPIRequest, payload: MarketInfo,
@@ -157,60 +361,23 @@ async def initilize_market_on_contract(
         payload (MarketInfo): The market information payload.
 
     Returns:
-        tuple: A tuple containing a boolean indicating success and a message.
+        TransactionJob: The receipt tracker job for the submitted transaction.
     """
-    async with request.app.state._rwlock.writer_lock:
-        _nonce = request.app.state.signer_nonce
-        try:
-            tx_hash = await write_payable_transaction(
-                request.app.state.w3,
-                request.app.state.signer_account,
-                request.app.state.signer_pkey,
-                request.app.state.oracle_contract,
-                'createMarket',
-                _nonce,
-                payload.value,
-                payload.question_id,
-                payload.random_index,
-                payload.market_end_timestamp,
-                payload.price_update_data,
-            )
-
-            request.app.state.signer_nonce += 1
-            service_logger.info(
-                f'submitted transaction with tx_hash: {tx_hash}',
-            )
-
-        except Exception as e:
-            service_logger.error(f'Exception: {e}')
-
-            if 'nonce' in str(e):
-                # Reset nonce if there's a nonce-related error
-                await asyncio.sleep(10)
-                request.app.state.signer_nonce = await request.app.state.w3.eth.get_transaction_count(
-                    request.app.state.signer_account,
-                )
-                service_logger.info(
-                    f'nonce reset to: {request.app.state.signer_nonce}',
-                )
-                raise Exception('nonce error, reset nonce')
-            else:
-                raise e
-
-    receipt = await request.app.state.w3.eth.wait_for_transaction_receipt(tx_hash)
-
-    if receipt['status'] == 0:
-        service_logger.info(
-            f'tx_hash: {tx_hash} failed, receipt: {receipt}, '
-            f'question_id: {payload.question_id}',
-        )
-        return False, f'tx failed for question_id: {payload.question_id}'
-    else:
-        service_logger.info(
-            f'tx_hash: {tx_hash} succeeded!, question_id: {payload.question_id}',
+    # The account counts as loaded until its transaction is registered as pending
+    with request.app.state.signer_accounts.lease('createMarket') as account:
+        tx_hash, _nonce = await submit_oracle_transaction(
+            request.app.state,
+            account,
+            'createMarket',
+            payload.value,
+            payload.question_id,
+            payload.random_index,
+            payload.market_end_timestamp,
+            payload.price_update_data,
         )
-        return True, (
-            f'tx_hash: {tx_hash} succeeded!, question_id: {payload.question_id}'
+
+        return request.app.state.receipt_tracker.add_job(
+            'createMarket', payload.question_id, tx_hash, account=account.address, nonce=_nonce,
         )
 
 
@@ -219,6 +386,7 @@ async def initilize_market_on_contract(
     retry=retry_if_exception_type(Exception),
     wait=wait_random_exponential(multiplier=1, max=10),
     stop=stop_after_attempt(3),
+    before_sleep=count_submit_retry,
 )
 async def resolve_market_on_contract(
     request: FastAPIRequest, payload: ResolveMarketMessage,
@@ -231,65 +399,92 @@ async def resolve_market_on_contract(
         payload (ResolveMarketMessage): The resolve market message.
 
     Returns:
-        tuple: A tuple containing a boolean indicating success, the transaction hash, and a message.
+        TransactionJob: The receipt tracker job for the submitted transaction.
     """
-    async with request.app.state._rwlock.writer_lock:
-        _nonce = request.app.state.signer_nonce
-        try:
-            tx_hash = await write_payable_transaction(
-                request.app.state.w3,
-                request.app.state.signer_account,
-                request.app.state.signer_pkey,
-                request.app.state.oracle_contract,
-                'resolveMarket',
-                _nonce,
-                payload.value,
-                payload.question_id,
-                payload.price_update_data,
-                payload.answer_cid,
-            )
+    # Resolutions are sent from the dedicated resolution lane
+    with request.app.state.signer_accounts.lease('resolveMarket') as account:
+        tx_hash, _nonce = await submit_oracle_transaction(
+            request.app.state,
+            account,
+            'resolveMarket',
+            payload.value,
+            payload.question_id,
+            payload.price_update_data,
+            payload.answer_cid,
+        )
 
-            request.app.state.signer_nonce += 1
-            service_logger.info(
-                f'submitted transaction with tx_hash: {tx_hash}',
-            )
+        return request.app.state.receipt_tracker.add_job(
+            'resolveMarket', payload.question_id, tx_hash, account=account.address, nonce=_nonce,
+        )
 
-        except Exception as e:
-            service_logger.error(f'Exception: {e}')
 
-            if 'nonce' in str(e):
-                # Reset nonce if there's a nonce-related error
-                await asyncio.sleep(10)
-                request.app.state.signer_nonce = await request.app.state.w3.eth.get_transaction_count(
-                    request.app.state.signer_account,
-                )
-                service_logger.info(
-                    f'nonce reset to: {request.app.state.signer_nonce}',
-                )
-                raise Exception('nonce error, reset nonce')
-            else:
-                raise e
+async def wait_for_job_result(request: FastAPIRequest, job: TransactionJob):
+    """
+    Wait for a submitted transaction job to be confirmed, to fail or to time out.
 
-    receipt = await request.app.state.w3.eth.wait_for_transaction_receipt(tx_hash)
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        job (TransactionJob): The job returned by the submission.
 
-    if receipt['status'] == 0:
+    Returns:
+        tuple: A tuple containing a boolean indicating success and a message.
+    """
+    job = await request.app.state.receipt_tracker.wait_for_job(job)
+
+    if job.status == JobStatus.UNKNOWN:
+        service_logger.warning(
+            f'tx_hash: {job.tx_hash} has no receipt yet, question_id: {job.question_id}',
+        )
+        return False, f'tx outcome unknown for question_id: {job.question_id}, check job {job.job_id}'
+    elif job.status != JobStatus.CONFIRMED:
         service_logger.info(
-            f'tx_hash: {tx_hash} failed, receipt: {receipt}, '
-            f'question_id: {payload.question_id}',
+            f'tx_hash: {job.tx_hash} failed, error: {job.error}, '
+            f'question_id: {job.question_id}',
         )
-        return False, tx_hash, f'tx failed for question_id: {payload.question_id}'
+        return False, f'tx failed for question_id: {job.question_id}'
     else:
         service_logger.info(
-            f'tx_hash: {tx_hash} succeeded!, question_id: {payload.question_id}',
+            f'tx_hash: {job.tx_hash} succeeded!, question_id: {job.question_id}',
         )
-        return True, tx_hash, (
-            f'tx_hash: {tx_hash} succeeded!, question_id: {payload.question_id}'
+        return True, (
+            f'tx_hash: {job.tx_hash} succeeded!, question_id: {job.question_id}'
         )
 
 
+def submitted_job_response(request: FastAPIRequest, job: TransactionJob):
+    """
+    Build the immediate response for a request made with `wait=false`.
+    """
+    return {
+        'info': {
+            'success': True,
+            'response': f'submitted tx_hash: {job.tx_hash}, question_id: {job.question_id}',
+        },
+        'job': job.to_dict(),
+        'request_id': request.state.request_id,
+    }
+
+
+def in_flight_conflict(request: FastAPIRequest, error: SubmissionInFlightError) -> HTTPException:
+    """
+    Build the 409 returned while another worker is still submitting the same transaction.
+    """
+    return HTTPException(
+        status_code=409,
+        detail={
+            'info': {
+                'success': False,
+                'response': str(error),
+            },
+            'request_id': request.state.request_id,
+        },
+    )
+
+
 @app.post('/resolveMarket')
 async def resolve_market(
     request: FastAPIRequest, req_parsed: ResolveMarketMessage, response: Response,
+    wait: bool = True,
 ):
     """
     Resolve a market.
@@ -298,6 +493,7 @@ async def resolve_market(
         request (FastAPIRequest): The FastAPI request object.
         req_parsed (ResolveMarketMessage): The parsed request message.
         response (Response): The FastAPI response object.
+        wait (bool): Wait for the receipt; if false, return the job right after submission.
 
     Returns:
         dict: A dictionary containing the resolution result.
@@ -315,7 +511,14 @@ async def resolve_market(
         )
 
     try:
-        status, tx_hash, message = await resolve_market_on_contract(request, req_parsed)
+        job = await request.app.state.submissions.do(
+            ('resolveMarket', req_parsed.question_id),
+            lambda: resolve_market_on_contract(request, req_parsed),
+        )
+        if not wait:
+            return submitted_job_response(request, job)
+
+        status, message = await wait_for_job_result(request, job)
         if status:
             return {
                 'info': {
@@ -336,6 +539,8 @@ async def resolve_market(
                 },
             )
 
+    except SubmissionInFlightError as e:
+        raise in_flight_conflict(request, e)
     except Exception as e:
 
         raise HTTPException(
@@ -356,6 +561,7 @@ async def initialize_market(
     request: FastAPIRequest,
     req_parsed: MarketInfo,
     response: Response,
+    wait: bool = True,
 ):
     """
     Initialize a new prediction market.
@@ -370,6 +576,7 @@ async def initialize_market(
         request (FastAPIRequest): The FastAPI request object.
         req_parsed (InitializeMarketMessage): Parsed request data containing market details.
         response (Response): The FastAPI response object.
+        wait (bool): Wait for the receipt; if false, return the job right after submission.
 
     Returns:
         dict: A dictionary containing the result of the market initialization.
@@ -388,8 +595,15 @@ async def initialize_market(
             },
         )
     try:
-        # Initialize the market on-chain
-        status, message = await initilize_market_on_contract(request, req_parsed)
+        # Initialize the market on-chain, attaching to any earlier submission for this market
+        job = await request.app.state.submissions.do(
+            ('createMarket', req_parsed.question_id),
+            lambda: initilize_market_on_contract(request, req_parsed),
+        )
+        if not wait:
+            return submitted_job_response(request, job)
+
+        status, message = await wait_for_job_result(request, job)
         if status:
             return {
                 'info': {
@@ -406,6 +620,8 @@ async def initialize_market(
                 },
                 'request_id': request.state.request_id,
             }
+    except SubmissionInFlightError as e:
+        raise in_flight_conflict(request, e)
     except Exception as e:
         service_logger.opt(exception=True).error(f'Exception: {e}')
         # Return error response if initialization fails
@@ -421,3 +637,488 @@ async def initialize_market(
         )
 
 
+@app.get('/jobs/{job_id}')
+async def get_job_status(request: FastAPIRequest, job_id: str):
+    """
+    Report the status of a submitted transaction job.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        job_id (str): The job id returned by a write endpoint called with `wait=false`.
+
+    Returns:
+        dict: The job, with status pending, confirmed or failed.
+    """
+    # Jobs sent by other workers are found in the shared store
+    job = await request.app.state.receipt_tracker.find_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                'info': {
+                    'success': False,
+                    'response': f'Unknown job: {job_id}',
+                },
+                'request_id': request.state.request_id,
+            },
+        )
+
+    return {
+        'info': {
+            'success': True,
+            'response': job['status'],
+        },
+        'job': job,
+        'request_id': request.state.request_id,
+    }
+
+
+def validate_bulk_size(request: FastAPIRequest, payloads: list):
+    """
+    Reject a bulk request with more than BULK_MAX_ITEMS items.
+    """
+    max_items = int(os.getenv('BULK_MAX_ITEMS', BULK_MAX_ITEMS))
+    if len(payloads) > max_items:
+        raise HTTPException(
+            status_code=413,
+            detail={
+                'info': {
+                    'success': False,
+                    'response': f'Too many items: {len(payloads)}, at most {max_items} per request',
+                },
+                'request_id': request.state.request_id,
+            },
+        )
+
+
+def validate_bulk_auth(request: FastAPIRequest, payloads: list):
+    """
+    Reject a bulk request if any item carries the wrong auth token.
+    """
+    if not payloads or any(payload.auth_token != AUTH_TOKEN for payload in payloads):
+        raise HTTPException(
+            status_code=401,
+            detail={
+                'info': {
+                    'success': False,
+                    'response': 'Incorrect Token!',
+                },
+                'request_id': request.state.request_id,
+            },
+        )
+
+
+async def submit_bulk(request: FastAPIRequest, function: str, payloads: list, calls: list[tuple], wait: bool):
+    """
+    Submit one transaction per payload and collect a result for each item.
+
+    Items whose question_id is already submitted or in flight attach to that
+    submission instead of sending another transaction, and so do repeats of a
+    question_id within the request: each question_id is claimed at most once.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        function (str): The oracle contract function being called.
+        payloads (list): The parsed request items.
+        calls (list): (function, value, args) tuples, one per payload.
+        wait (bool): Wait for every receipt before responding.
+
+    Returns:
+        dict: The bulk response with per-item results.
+    """
+    tracker = request.app.state.receipt_tracker
+    submissions = request.app.state.submissions
+
+    entries = {}  # question_id -> stored job or future of the in-flight submission
+    fresh = []  # indexes of the items this request submits, one per question_id
+    for index, payload in enumerate(payloads):
+        if payload.question_id in entries:
+            continue
+        # Looked up right before claiming, with no await in between
+        key = (function, payload.question_id)
+        entry = submissions.lookup(key)
+        if entry is None:
+            entry = submissions.claim(key)
+            fresh.append(index)
+        entries[payload.question_id] = entry
+
+    # With several workers, another one may already have submitted some of the keys claimed here
+    try:
+        elsewhere = await submissions.claimed_elsewhere(
+            [(function, payloads[index].question_id) for index in fresh],
+        )
+    except BaseException as e:
+        for index in fresh:
+            submissions.fail((function, payloads[index].question_id), e)
+        raise
+    for key, outcome in elsewhere.items():
+        if isinstance(outcome, Exception):
+            submissions.fail(key, outcome)
+        else:
+            submissions.resolve(key, outcome)
+    fresh = [index for index in fresh if (function, payloads[index].question_id) not in elsewhere]
+
+    # The new transactions are spread over the least-loaded signer accounts of the lane
+    with request.app.state.signer_accounts.lease_many(function, len(fresh)) as accounts:
+        try:
+            sent = await submit_oracle_transactions(
+                request.app.state, accounts, [calls[index] for index in fresh],
+            )
+        except BaseException as e:
+            for index in fresh:
+                submissions.fail((function, payloads[index].question_id), e)
+            raise
+        for index, account, outcome in zip(fresh, accounts, sent):
+            key = (function, payloads[index].question_id)
+            if isinstance(outcome, Exception):
+                submissions.fail(key, outcome)
+            else:
+                tx_hash, _nonce = outcome
+                submissions.resolve(
+                    key, tracker.add_job(function, key[1], tx_hash, account=account.address, nonce=_nonce),
+                )
+
+    # Every entry is now a stored job or the future of a (possibly just finished) submission
+    by_question_id = {}
+    for question_id, entry in entries.items():
+        try:
+            by_question_id[question_id] = await asyncio.shield(entry) if isinstance(entry, asyncio.Future) else entry
+        except Exception as e:
+            by_question_id[question_id] = e
+    outcomes = [by_question_id[payload.question_id] for payload in payloads]
+    jobs = [None if isinstance(outcome, Exception) else outcome for outcome in outcomes]
+    if wait:
+        await asyncio.gather(*[tracker.wait_for_job(job) for job in jobs if job is not None])
+
+    results = []
+    for payload, outcome, job in zip(payloads, outcomes, jobs):
+        if job is None:
+            results.append({
+                'question_id': payload.question_id,
+                'success': False,
+                'response': f'Failed to submit: {outcome}',
+                'job': None,
+            })
+            continue
+
+        success = job.status == JobStatus.CONFIRMED if wait else True
+        if not wait:
+            message = f'submitted tx_hash: {job.tx_hash}, question_id: {job.question_id}'
+        elif success:
+            message = f'tx_hash: {job.tx_hash} succeeded!, question_id: {job.question_id}'
+        elif job.status == JobStatus.UNKNOWN:
+            message = f'tx outcome unknown for question_id: {job.question_id}, check job {job.job_id}'
+        else:
+            message = f'tx failed for question_id: {job.question_id}'
+        results.append({
+            'question_id': payload.question_id,
+            'success': success,
+            'response': message,
+            'job': job.to_dict(),
+        })
+
+    succeeded = sum(result['success'] for result in results)
+    service_logger.info(f'{function} bulk request: {succeeded}/{len(results)} succeeded')
+    return {
+        'info': {
+            'success': succeeded == len(results),
+            'response': f'{succeeded}/{len(results)} succeeded',
+        },
+        'results': results,
+        'request_id': request.state.request_id,
+    }
+
+
+@app.post('/initializeMarkets')
+async def initialize_markets(
+    request: FastAPIRequest,
+    req_parsed: list[MarketInfo],
+    response: Response,
+    wait: bool = True,
+):
+    """
+    Initialize many prediction markets in one request.
+
+    Nonces for every market are reserved in one step and the transactions are
+    sent back-to-back.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        req_parsed (list[MarketInfo]): The markets to create.
+        response (Response): The FastAPI response object.
+        wait (bool): Wait for the receipts; if false, return the jobs right after submission.
+
+    Returns:
+        dict: A dictionary containing a result for each market.
+    """
+    validate_bulk_size(request, req_parsed)
+    validate_bulk_auth(request, req_parsed)
+    calls = [
+        (
+            'createMarket',
+            payload.value,
+            (payload.question_id, payload.random_index, payload.market_end_timestamp, payload.price_update_data),
+        )
+        for payload in req_parsed
+    ]
+    return await submit_bulk(request, 'createMarket', req_parsed, calls, wait)
+
+
+@app.post('/resolveMarkets')
+async def resolve_markets(
+    request: FastAPIRequest,
+    req_parsed: list[ResolveMarketMessage],
+    response: Response,
+    wait: bool = True,
+):
+    """
+    Resolve many markets in one request.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        req_parsed (list[ResolveMarketMessage]): The markets to resolve.
+        response (Response): The FastAPI response object.
+        wait (bool): Wait for the receipts; if false, return the jobs right after submission.
+
+    Returns:
+        dict: A dictionary containing a result for each market.
+    """
+    validate_bulk_size(request, req_parsed)
+    validate_bulk_auth(request, req_parsed)
+    calls = [
+        (
+            'resolveMarket',
+            payload.value,
+            (payload.question_id, payload.price_update_data, payload.answer_cid),
+        )
+        for payload in req_parsed
+    ]
+    return await submit_bulk(request, 'resolveMarket', req_parsed, calls, wait)
+
+
+def current_market_snapshot(request: FastAPIRequest):
+    """
+    Return the cached market snapshot, or fail with 503 until the first one is loaded.
+    """
+    snapshot = request.app.state.market_cache.snapshot
+    if snapshot is None:
+        raise HTTPException(
+            status_code=503,
+            detail={
+                'info': {
+                    'success': False,
+                    'response': 'Market snapshot not loaded yet',
+                },
+                'request_id': request.state.request_id,
+            },
+        )
+    return snapshot
+
+
+def etag_matches(request: FastAPIRequest, etag: str) -> bool:
+    """
+    Check the request's If-None-Match header against `etag`.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or etag in [
+        candidate.removeprefix('W/') for candidate in candidates
+    ]
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+@app.get('/metrics')
+async def get_metrics():
+    """
+    Expose the service metrics in the Prometheus text format.
+    """
+    return Response(content=METRICS_REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get('/markets')
+async def get_markets(
+    request: FastAPIRequest,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(MARKETS_PAGE_SIZE, ge=1, le=MARKETS_MAX_PAGE_SIZE),
+):
+    """
+    List active markets from the block-synchronized snapshot.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        response (Response): The FastAPI response object.
+        offset (int): Index of the first market to return.
+        limit (int): Maximum number of markets to return.
+
+    Returns:
+        dict: A page of markets with the snapshot block number and total count.
+    """
+    snapshot = current_market_snapshot(request)
+    etag = f'"{snapshot.version}-{offset}-{limit}"'
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+
+    page = snapshot.market_ids[offset:offset + limit]
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return {
+        'info': {
+            'success': True,
+            'response': f'{len(page)} of {len(snapshot.market_ids)} markets',
+        },
+        'block_number': snapshot.block_number,
+        'total': len(snapshot.market_ids),
+        'offset': offset,
+        'limit': limit,
+        'markets': [snapshot.markets[market_id] for market_id in page],
+        'request_id': request.state.request_id,
+    }
+
+
+@app.get('/markets/{question_id}')
+async def get_market(request: FastAPIRequest, response: Response, question_id: str):
+    """
+    Return one active market from the block-synchronized snapshot.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        response (Response): The FastAPI response object.
+        question_id (str): The 0x-prefixed question id.
+
+    Returns:
+        dict: The market with the snapshot block number.
+    """
+    snapshot = current_market_snapshot(request)
+    market = snapshot.markets.get(question_id.lower())
+    if market is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                'info': {
+                    'success': False,
+                    'response': f'Unknown market: {question_id}',
+                },
+                'request_id': request.state.request_id,
+            },
+        )
+
+    market_id = market['question_id']
+    etag = f'"{snapshot.etags[market_id]}"'
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return {
+        'info': {
+            'success': True,
+            'response': market_id,
+        },
+        'block_number': snapshot.block_number,
+        'market': market,
+        'request_id': request.state.request_id,
+    }
+
+
+@app.get('/positions/{address}')
+async def get_positions(request: FastAPIRequest, address: str):
+    """
+    Return a user's open and closed positions with balances and market details.
+
+    The user part is cached per address until a BuyPosition or RedeemPosition
+    event for that address is seen; market details come from the market snapshot.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+        address (str): The user's address.
+
+    Returns:
+        dict: The open and closed positions.
+    """
+    if not is_address(address):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                'info': {
+                    'success': False,
+                    'response': f'Invalid address: {address}',
+                },
+                'request_id': request.state.request_id,
+            },
+        )
+
+    positions = await request.app.state.positions_cache.get_positions(address)
+    return {
+        'info': {
+            'success': True,
+            'response': (
+                f"{len(positions['open_positions'])} open, "
+                f"{len(positions['closed_positions'])} closed positions"
+            ),
+        },
+        **positions,
+        'request_id': request.state.request_id,
+    }
+
+
+@app.get('/stream/markets')
+async def stream_markets(request: FastAPIRequest):
+    """
+    Server-Sent Events stream of per-market changes, one `markets` event per block.
+
+    Each event carries the block number and, per changed market, only the
+    changed probabilities, buy amounts, unique buys and resolved state. The
+    stream ends if the client falls behind; clients should reconnect and
+    re-read `/markets`.
+
+    Args:
+        request (FastAPIRequest): The FastAPI request object.
+
+    Returns:
+        StreamingResponse: The event stream.
+    """
+    broadcaster = request.app.state.market_stream
+    subscriber = broadcaster.subscribe()
+
+    async def events():
+        try:
+            async for update in subscriber.updates(broadcaster.keepalive_interval):
+                yield update.sse if update is not None else ': keepalive\n\n'
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.websocket('/ws/markets')
+async def websocket_markets(websocket: WebSocket):
+    """
+    WebSocket stream of per-market changes, one JSON message per block.
+
+    Messages have the same shape as the `/stream/markets` events.
+
+    Args:
+        websocket (WebSocket): The client connection.
+    """
+    await websocket.accept()
+    broadcaster = websocket.app.state.market_stream
+    subscriber = broadcaster.subscribe()
+    try:
+        async for update in subscriber.updates(broadcaster.keepalive_interval):
+            if update is not None:
+                await websocket.send_text(update.json)
+        await websocket.close(code=1013)  # Fell behind; try again later
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
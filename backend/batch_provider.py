@@ -0,0 +1,226 @@
+"""
+JSON-RPC batching provider for AsyncWeb3.
+
+Requests made in the same event-loop tick (or within a short configurable
+window) are coalesced into one JSON-RPC batch array and sent as a single
+HTTP POST. Each response is routed back to the caller that made the request.
+An optional `OutboundLimiter` admits each POST, and batches the provider
+rejects as overloaded are resent once the limiter allows it. Batches carrying
+a transaction are never resent: a timed-out send may have been delivered, and
+`PooledRPCProvider` looks it up by hash before sending it anywhere again.
+"""
+import asyncio
+import os
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from aiohttp import ClientResponseError
+from eth_utils import to_bytes
+from web3 import AsyncHTTPProvider
+from web3._utils.encoding import FriendlyJsonSerde
+from web3._utils.encoding import Web3JsonEncoder
+from web3._utils.request import async_make_post_request
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+from logger import logger
+from metrics import RPC_BATCH_RESENDS
+from rpc_limiter import OutboundLimiter
+from rpc_limiter import PRIORITY_READ
+from rpc_limiter import PRIORITY_WRITE
+from rpc_limiter import RPC_DEFAULT_RETRY_AFTER
+
+provider_logger = logger.bind(
+    service='I Was BORED|Batch Provider',
+)
+
+# 0 flushes on the next loop iteration, i.e. batches requests made in the same tick
+RPC_BATCH_WINDOW_MS = 0
+RPC_MAX_BATCH_SIZE = 100
+RPC_OVERLOAD_RETRIES = 2  # Resends of a read batch the provider rejected as overloaded
+
+WRITE_METHODS = {'eth_sendRawTransaction', 'eth_sendTransaction'}
+RATE_LIMIT_CODES = {-32005, 429}
+
+
+def overload_info(error: Exception) -> Tuple[bool, Optional[float]]:
+    """
+    Tell whether a request error means the provider is overloaded.
+
+    Returns:
+        tuple: (overloaded, seconds to wait from Retry-After or None)
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return True, None
+    if isinstance(error, ClientResponseError) and error.status in (429, 503):
+        retry_after = (error.headers or {}).get('Retry-After')
+        try:
+            return True, float(retry_after) if retry_after is not None else RPC_DEFAULT_RETRY_AFTER
+        except ValueError:
+            return True, RPC_DEFAULT_RETRY_AFTER
+    return False, None
+
+
+def is_rate_limit_response(response: RPCResponse) -> bool:
+    error = response.get('error')
+    return isinstance(error, dict) and (
+        error.get('code') in RATE_LIMIT_CODES or 'rate limit' in str(error.get('message', '')).lower()
+    )
+
+
+class BatchingHTTPProvider(AsyncHTTPProvider):
+    """
+    Drop-in replacement for `AsyncHTTPProvider` that batches concurrent requests.
+    """
+
+    def __init__(
+        self,
+        endpoint_uri: Optional[str] = None,
+        request_kwargs: Optional[Any] = None,
+        batch_window_ms: Optional[float] = None,
+        max_batch_size: Optional[int] = None,
+        limiter: Optional[OutboundLimiter] = None,
+    ) -> None:
+        super().__init__(endpoint_uri, request_kwargs)
+        if batch_window_ms is None:
+            batch_window_ms = float(os.getenv('RPC_BATCH_WINDOW_MS', RPC_BATCH_WINDOW_MS))
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size or int(
+            os.getenv('RPC_MAX_BATCH_SIZE', RPC_MAX_BATCH_SIZE),
+        )
+
+        self.limiter = limiter
+        self.overload_retries = int(os.getenv('RPC_OVERLOAD_RETRIES', RPC_OVERLOAD_RETRIES))
+
+        self._pending: List[Tuple[RPCEndpoint, Any, asyncio.Future]] = []
+        self._flush_handle = None
+        # The loop only holds weak references to tasks; an unreferenced send could be collected mid-flight
+        self._sending: Set[asyncio.Task] = set()
+        self.stats = {'requests': 0, 'http_posts': 0}
+
+    def __str__(self) -> str:
+        return f'Batching RPC connection {self.endpoint_uri}'
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((method, params, future))
+        self.stats['requests'] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            if self.batch_window > 0:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush)
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+
+        return await future
+
+    def _flush(self):
+        """
+        Hand the queued requests to a background send and start a new batch.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send_batch(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def close(self):
+        """
+        Send the queued requests and wait for every batch in flight.
+        """
+        self._flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def _post(self, batch: List[Tuple[RPCEndpoint, Any, asyncio.Future]]) -> List[RPCResponse]:
+        """
+        Send one HTTP POST for the batch and return the responses in batch order.
+        """
+        # A lone request goes out as a plain JSON-RPC object
+        if len(batch) == 1:
+            method, params, _ = batch[0]
+            return [await super().make_request(method, params)]
+
+        request_ids = []
+        rpc_batch = []
+        for method, params, _ in batch:
+            request_id = next(self.request_counter)
+            request_ids.append(request_id)
+            rpc_batch.append({
+                'jsonrpc': '2.0',
+                'method': method,
+                'params': params or [],
+                'id': request_id,
+            })
+
+        encoded = FriendlyJsonSerde().json_encode(rpc_batch, cls=Web3JsonEncoder)
+        raw_response = await async_make_post_request(
+            self.endpoint_uri, to_bytes(text=encoded), **self.get_request_kwargs()
+        )
+        responses = self.decode_rpc_response(raw_response)
+
+        # Some providers answer a rejected batch with a single error object
+        if not isinstance(responses, list):
+            return [dict(responses, id=request_id) for request_id in request_ids]
+
+        by_id = {response.get('id'): response for response in responses}
+        return [
+            by_id.get(request_id) or {
+                'jsonrpc': '2.0',
+                'id': request_id,
+                'error': {
+                    'code': -32603,
+                    'message': 'No response for request in JSON-RPC batch',
+                },
+            }
+            for request_id in request_ids
+        ]
+
+    async def _send_batch(self, batch: List[Tuple[RPCEndpoint, Any, asyncio.Future]]):
+        writes = any(method in WRITE_METHODS for method, _, _ in batch)
+        priority = PRIORITY_WRITE if writes else PRIORITY_READ
+
+        retries = 0
+        while True:
+            if self.limiter is not None:
+                await self.limiter.acquire(priority, len(batch))
+            try:
+                self.stats['http_posts'] += 1
+                responses = await self._post(batch)
+                if self.limiter is not None:
+                    if any(is_rate_limit_response(response) for response in responses):
+                        self.limiter.on_overload()
+                    else:
+                        self.limiter.on_success()
+            except Exception as e:
+                overloaded, retry_after = overload_info(e)
+                if overloaded and self.limiter is not None:
+                    self.limiter.on_overload(retry_after)
+                    # A resent transaction would come back "already known" if the first POST got through
+                    if retries < self.overload_retries and not writes:
+                        retries += 1
+                        RPC_BATCH_RESENDS.inc()
+                        continue
+                if len(batch) > 1:
+                    provider_logger.error(f'Batch of {len(batch)} requests failed: {e}')
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                if self.limiter is not None:
+                    self.limiter.release()
+
+            for (_, _, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+            return
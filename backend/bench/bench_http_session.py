@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Hermes call latency with a new aiohttp session per call vs the pooled HttpSessionManager.
+
+Runs a local Hermes stand-in that answers `latest_vaas` after --latency-ms and
+charges --handshake-ms on the first request of every new TCP connection, like
+the TCP/TLS handshake to a remote host. Each mode issues --requests calls,
+--concurrency at a time:
+
+- "per-call": `async with aiohttp.ClientSession()` around every request, as the
+  monitor and the market creator used to do;
+- "pooled": one HttpSessionManager session shared by every call, keeping
+  connections alive between them.
+
+Reports wall time, p50/p99 call latency and how many connections were opened.
+
+Usage:
+    python bench/bench_http_session.py
+    python bench/bench_http_session.py --requests 500 --concurrency 20 --handshake-ms 60
+"""
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from http_session import HttpSessionManager  # noqa: E402
+
+FEED_ID = '0xff61491a931112ddf1bd8147cd1b641375f79f5825126d665480874634fd0ace'
+
+
+class HermesStandIn:
+    """Local `latest_vaas` endpoint that counts connections and charges a handshake per new one."""
+
+    def __init__(self, latency_ms: float, handshake_ms: float):
+        self.latency = latency_ms / 1000
+        self.handshake = handshake_ms / 1000
+        self.connections = set()
+        self.port = None
+        self._runner = None
+        self._body = [base64.b64encode(b'PNAU' + os.urandom(1024)).decode()]
+
+    async def latest_vaas(self, request: web.Request) -> web.Response:
+        transport = request.transport
+        if transport not in self.connections:
+            self.connections.add(transport)
+            await asyncio.sleep(self.handshake)
+        await asyncio.sleep(self.latency)
+        return web.json_response(self._body)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/api/latest_vaas', self.latest_vaas)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+async def fetch(session: aiohttp.ClientSession, url: str):
+    async with session.get(url, params={'ids[]': FEED_ID}) as response:
+        response.raise_for_status()
+        await response.json()
+
+
+async def per_call(url: str):
+    async with aiohttp.ClientSession() as session:
+        await fetch(session, url)
+
+
+async def run(name: str, server: HermesStandIn, call, requests: int, concurrency: int) -> dict:
+    server.connections.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call()
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    wall = time.perf_counter() - started
+    samples.sort()
+    return {
+        'mode': name,
+        'wall_s': round(wall, 2),
+        'p50_ms': round(statistics.median(samples) * 1000, 1),
+        'p99_ms': round(samples[int(len(samples) * 0.99) - 1] * 1000, 1),
+        'connections': len(server.connections),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Response time of every call')
+    parser.add_argument('--handshake-ms', type=float, default=40.0, help='Extra cost of a new connection')
+    args = parser.parse_args()
+
+    server = HermesStandIn(args.latency_ms, args.handshake_ms)
+    await server.start()
+    url = f'http://127.0.0.1:{server.port}/api/latest_vaas'
+    sessions = HttpSessionManager()
+    try:
+        pooled_session = await sessions.get_session()
+        results = [
+            await run('per-call', server, lambda: per_call(url), args.requests, args.concurrency),
+            await run('pooled', server, lambda: fetch(pooled_session, url), args.requests, args.concurrency),
+        ]
+    finally:
+        await sessions.close()
+        await server.stop()
+
+    print(
+        f'{args.requests} calls, {args.concurrency} concurrent, '
+        f'{args.latency_ms:.0f} ms response, {args.handshake_ms:.0f} ms per new connection',
+    )
+    print(f"{'mode':>9} {'wall s':>7} {'p50 ms':>7} {'p99 ms':>7} {'connections':>12}")
+    for result in results:
+        print(
+            f"{result['mode']:>9} {result['wall_s']:>7} {result['p50_ms']:>7} "
+            f"{result['p99_ms']:>7} {result['connections']:>12}",
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
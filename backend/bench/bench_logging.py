@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Per-request logging overhead on the event-loop thread, before and after the queued pipeline.
+
+"legacy" is the previous setup: three synchronous sinks (stdout DEBUG, stderr
+WARNING, stderr ERROR) and a start and an end INFO record per request.
+"queued" is the current pipeline: one JSON end-of-request record handed to a
+background writer; "queued-sampled" also samples it at 10%. Sinks write into
+pipes drained by `cat`, as under a process supervisor.
+
+Usage: python bench/bench_logging.py [--requests N]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from logger import FORMAT  # noqa: E402
+from logger import QueuedStreamSink  # noqa: E402
+from logger import RequestLogSampler  # noqa: E402
+from logger import WARNING_LEVEL  # noqa: E402
+from logger import format_json  # noqa: E402
+from logger import logger  # noqa: E402
+
+service_logger = logger.bind(service='IWasBored|Backend')
+
+
+def open_pipe():
+    process = subprocess.Popen(['cat'], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True)
+    return process, process.stdin
+
+
+def legacy_request(request_id: str, url: str):
+    with service_logger.contextualize(request_id=request_id):
+        service_logger.info('Request started for: {}', url)
+        service_logger.info('Request ended')
+
+
+def queued_request(request_id: str, url: str, sampler: RequestLogSampler):
+    with service_logger.contextualize(request_id=request_id):
+        if sampler.should_log('/markets/{question_id}', 200):
+            service_logger.bind(
+                method='GET', path=url, route='/markets/{question_id}', status=200, duration_ms=1.23,
+            ).info('Request ended')
+
+
+def run(name: str, requests: int, setup, request):
+    logger.remove()
+    pipes, sinks = setup()
+    samples = []
+    for index in range(requests):
+        started = time.perf_counter()
+        request(f'request-{index}', f'/markets/0x{index:064x}')
+        samples.append(time.perf_counter() - started)
+    for sink in sinks:
+        sink.stop()
+    logger.remove()
+    for process, stream in pipes:
+        stream.close()
+        process.wait()
+
+    samples.sort()
+    result = {
+        'name': name,
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'p50_us': samples[len(samples) // 2] * 1e6,
+        'p99_us': samples[int(len(samples) * 0.99)] * 1e6,
+    }
+    print(f"{name:16} mean {result['mean_us']:8.2f} us  p50 {result['p50_us']:8.2f} us  p99 {result['p99_us']:8.2f} us")
+    return result
+
+
+def legacy_setup():
+    stdout, stderr = open_pipe(), open_pipe()
+    logger.add(stdout[1], level='DEBUG', format=FORMAT)
+    logger.add(stderr[1], level='WARNING', format=FORMAT)
+    logger.add(stderr[1], level='ERROR', format=FORMAT)
+    return [stdout, stderr], []
+
+
+def queued_setup():
+    stdout, stderr = open_pipe(), open_pipe()
+    sinks = [QueuedStreamSink(stdout[1]), QueuedStreamSink(stderr[1])]
+    logger.add(sinks[0], level='DEBUG', format=format_json, filter=lambda record: record['level'].no < WARNING_LEVEL)
+    logger.add(sinks[1], level='WARNING', format=format_json)
+    return [stdout, stderr], sinks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    full = RequestLogSampler(rates={}, default_rate=1)
+    sampled = RequestLogSampler(rates={'/markets/{question_id}': 0.1})
+    run('legacy', args.requests, legacy_setup, legacy_request)
+    run('queued', args.requests, queued_setup, lambda *a: queued_request(*a, full))
+    run('queued-sampled', args.requests, queued_setup, lambda *a: queued_request(*a, sampled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Monitor cycle time against market count: per-market reads vs Multicall3 snapshots.
+
+Seeds the mock chain (bench/mock_chain.py) with N live markets and times one
+monitor read cycle both ways:
+
+- "loop": `getActiveMarketIds` followed by one `getMarketData` eth_call per
+  market, one after the other, as the monitor used to do every cycle;
+- "multicall": `MarketSnapshotReader.fetch_snapshot`, which pins a block and
+  reads every market through `aggregate3` in chunks of --chunk-size.
+
+Every request to the mock chain pays --latency-ms, like a round trip to a
+remote provider, so the numbers show how cycle time and HTTP requests grow
+with the number of markets.
+
+Usage:
+    python bench/bench_market_reader.py
+    python bench/bench_market_reader.py --markets 10 100 500 1000 --latency-ms 50 --chunk-size 200
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict
+
+from eth_utils import to_checksum_address
+from web3 import AsyncHTTPProvider
+from web3 import AsyncWeb3
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bench.mock_chain import ORACLE_ABI  # noqa: E402
+from bench.mock_chain import ORACLE_ADDRESS  # noqa: E402
+from bench.mock_chain import MockChain  # noqa: E402
+from bench.mock_chain import MockChainConfig  # noqa: E402
+from bench.mock_chain import MockChainServer  # noqa: E402
+from market_reader import MarketRecord  # noqa: E402
+from market_reader import MarketSnapshotReader  # noqa: E402
+
+
+async def loop_cycle(app_state) -> Dict[str, MarketRecord]:
+    """The old monitor cycle: the id list, then one eth_call per market."""
+    functions = app_state.oracle_contract.functions
+    market_ids = await functions.getActiveMarketIds().call()
+    records = {}
+    for market_id in market_ids:
+        question_id = '0x' + market_id.hex()
+        market_data = await functions.getMarketData(market_id).call()
+        records[question_id] = MarketRecord.from_market_data(question_id, market_data)
+    return records
+
+
+async def measure(chain: MockChain, cycle, repeats: int) -> Dict:
+    seconds = []
+    requests = []
+    for _ in range(repeats):
+        http_requests = chain.stats.http_requests
+        started = time.perf_counter()
+        records = await cycle()
+        seconds.append(time.perf_counter() - started)
+        requests.append(chain.stats.http_requests - http_requests)
+    return {
+        'markets': len(records),
+        'ms': round(statistics.median(seconds) * 1000, 1),
+        'http_requests': int(statistics.median(requests)),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--markets', type=int, nargs='+', default=[10, 50, 100, 250, 500])
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Added to every request to the chain')
+    parser.add_argument('--chunk-size', type=int, default=100, help='getMarketData calls per aggregate3 call')
+    parser.add_argument('--repeats', type=int, default=3, help='Cycles per measurement; the median is reported')
+    args = parser.parse_args()
+
+    chain = MockChain(MockChainConfig(block_time=3600, latency_ms=args.latency_ms))
+    server = MockChainServer(chain)
+    await server.start()
+    w3 = AsyncWeb3(AsyncHTTPProvider(server.url))
+    app_state = SimpleNamespace(
+        w3=w3,
+        oracle_abi=ORACLE_ABI,
+        oracle_contract=w3.eth.contract(address=to_checksum_address(ORACLE_ADDRESS), abi=ORACLE_ABI),
+    )
+    reader = MarketSnapshotReader(app_state, chunk_size=args.chunk_size)
+
+    print(f'{args.latency_ms:.0f} ms per request, {args.chunk_size} markets per aggregate3 call')
+    print(f"{'markets':>8} {'loop ms':>10} {'requests':>9} {'multicall ms':>13} {'requests':>9} {'speedup':>8}")
+    try:
+        seeded = 0
+        for count in sorted(args.markets):
+            while seeded < count:
+                seeded += 1
+                chain.seed_market('0x' + seeded.to_bytes(32, 'big').hex(), int(time.time()) + 3600)
+            loop = await measure(chain, lambda: loop_cycle(app_state), args.repeats)
+            multicall = await measure(chain, reader.fetch_snapshot, args.repeats)
+            if loop['markets'] != count or multicall['markets'] != count:
+                raise RuntimeError(f"read {loop['markets']} and {multicall['markets']} of {count} markets")
+            print(
+                f"{count:>8} {loop['ms']:>10} {loop['http_requests']:>9} "
+                f"{multicall['ms']:>13} {multicall['http_requests']:>9} {loop['ms'] / multicall['ms']:>7.1f}x",
+            )
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
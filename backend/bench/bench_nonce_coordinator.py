@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Multi-process load test for the shared nonce coordinator.
+
+Starts the mock chain (bench/mock_chain.py) and several worker processes that
+send transactions from the same account as fast as they can, each reserving
+nonces through SharedNonceManager on one SQLite file, the way uvicorn workers
+do with NONCE_DB_PATH set. Some sends fail before reaching the node and
+release their nonce, and the chain can inject "nonce too low" errors. With
+--kill-after, the first worker dies abruptly while holding reservations and a
+replacement worker is started, as uvicorn's supervisor would, which must
+reclaim them.
+
+The run passes when every transaction was accepted exactly once, nothing was
+rejected as a duplicate, and nothing is left stuck behind a nonce gap once
+the chain settles. --in-process gives every worker its own NonceManager
+instead, which shows the collisions the coordinator prevents.
+
+Usage:
+    python bench/bench_nonce_coordinator.py --workers 4 --transactions 250 --concurrency 16
+    python bench/bench_nonce_coordinator.py --workers 4 --kill-after 50 --nonce-error-rate 0.02
+    python bench/bench_nonce_coordinator.py --workers 4 --in-process
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bench.bench_writes import BENCH_PRIVATE_KEY  # noqa: E402
+from bench.mock_chain import BASE_FEE  # noqa: E402
+from bench.mock_chain import CHAIN_ID  # noqa: E402
+from bench.mock_chain import GAS_ESTIMATE  # noqa: E402
+from bench.mock_chain import ORACLE_ABI  # noqa: E402
+from bench.mock_chain import ORACLE_ADDRESS  # noqa: E402
+from bench.mock_chain import MockChain  # noqa: E402
+from bench.mock_chain import MockChainConfig  # noqa: E402
+from bench.mock_chain import MockChainServer  # noqa: E402
+
+MAX_ATTEMPTS = 10
+
+
+def create_market_data(worker: int, index: int) -> bytes:
+    from eth_abi import encode
+    from eth_utils import function_abi_to_4byte_selector
+
+    fn_abi = next(item for item in ORACLE_ABI if item.get('name') == 'createMarket')
+    question_id = worker.to_bytes(4, 'big') + index.to_bytes(28, 'big')
+    return function_abi_to_4byte_selector(fn_abi) + encode(
+        ['bytes32', 'uint256', 'uint256', 'bytes[]'], [question_id, 0, int(time.time()) + 3600, []],
+    )
+
+
+async def run_worker(
+    worker: int, url: str, db_path: str, transactions: int, concurrency: int,
+    release_rate: float, kill_after: int, in_process: bool,
+) -> Dict:
+    from eth_account import Account
+    from web3 import AsyncHTTPProvider
+    from web3 import AsyncWeb3
+
+    from nonce_manager import NonceManager
+    from submission_coordinator import SharedNonceManager
+    from submission_coordinator import SubmissionCoordinator
+
+    account = Account.from_key(BENCH_PRIVATE_KEY)
+    w3 = AsyncWeb3(AsyncHTTPProvider(url))
+    coordinator = None
+    if in_process:
+        manager = NonceManager(w3, account.address)
+    else:
+        coordinator = SubmissionCoordinator(db_path)
+        await coordinator.open()
+        manager = SharedNonceManager(w3, account.address, coordinator)
+    await manager.initialize()
+
+    stats = {'worker': worker, 'pid': os.getpid(), 'sent': 0, 'released': 0, 'send_errors': 0, 'failed': 0}
+    reserve_latencies = []
+    indexes = iter(range(transactions))
+
+    async def send_one(index: int):
+        data = create_market_data(worker, index)
+        for _ in range(MAX_ATTEMPTS):
+            started = time.perf_counter()
+            nonce = await manager.reserve()
+            reserve_latencies.append(time.perf_counter() - started)
+            if random.random() < release_rate:
+                # The send failed before reaching the node (e.g. a signing or connection error)
+                stats['released'] += 1
+                manager.release(nonce)
+                continue
+            raw = account.sign_transaction({
+                'chainId': CHAIN_ID, 'nonce': nonce, 'to': ORACLE_ADDRESS, 'data': data, 'value': 0,
+                'gas': GAS_ESTIMATE, 'maxFeePerGas': 2 * BASE_FEE, 'maxPriorityFeePerGas': 10 ** 8,
+            }).rawTransaction
+            try:
+                await w3.eth.send_raw_transaction(raw)
+            except Exception as e:
+                stats['send_errors'] += 1
+                manager.handle_send_error(nonce, e)
+                continue
+            manager.mark_sent(nonce)
+            stats['sent'] += 1
+            if kill_after and stats['sent'] >= kill_after:
+                # Die while other tasks hold reservations, without releasing anything
+                os._exit(17)
+            return
+        stats['failed'] += 1
+
+    async def run_tasks():
+        for index in indexes:
+            await send_one(index)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[run_tasks() for _ in range(concurrency)])
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    reserve_latencies.sort()
+    stats['reserve_ms_p50'] = round(reserve_latencies[len(reserve_latencies) // 2] * 1000, 3)
+    stats['reserve_ms_p99'] = round(reserve_latencies[int(len(reserve_latencies) * 0.99)] * 1000, 3)
+    if coordinator is not None:
+        await coordinator.close()
+    return stats
+
+
+def worker_process(results, *args):
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    results.put(asyncio.run(run_worker(*args)))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--transactions', type=int, default=250, help='Transactions per worker')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent sends per worker')
+    parser.add_argument('--release-rate', type=float, default=0.05, help='Share of reservations released unsent')
+    parser.add_argument('--nonce-error-rate', type=float, default=0.0)
+    parser.add_argument('--kill-after', type=int, default=0, help='Kill the first worker after this many sends')
+    parser.add_argument('--in-process', action='store_true', help='Per-worker NonceManager (no coordination)')
+    parser.add_argument('--block-time', type=float, default=0.5)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    parser.add_argument('--settle-timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    chain = MockChain(MockChainConfig(
+        block_time=args.block_time, latency_ms=args.latency_ms, latency_jitter_ms=args.latency_ms / 4,
+        nonce_error_rate=args.nonce_error_rate,
+    ))
+    server = MockChainServer(chain)
+    await server.start()
+    db_path = os.path.join(tempfile.mkdtemp(prefix='nonce-coordinator-'), 'nonces.db')
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    loop = asyncio.get_running_loop()
+
+    def start(worker: int, kill_after: int = 0):
+        process = context.Process(target=worker_process, args=(
+            results, worker, server.url, db_path, args.transactions, args.concurrency,
+            args.release_rate, kill_after, args.in_process,
+        ))
+        process.start()
+        return process
+
+    started = time.perf_counter()
+    processes = [start(worker, args.kill_after if worker == 0 else 0) for worker in range(args.workers)]
+    await asyncio.gather(*[loop.run_in_executor(None, process.join) for process in processes])
+    replaced = [process for process in processes if process.exitcode != 0]
+    if replaced:
+        print(f'{len(replaced)} worker(s) died (exit {replaced[0].exitcode}); starting replacements')
+        # A replacement under a new pid must reclaim the dead worker's reservations
+        processes = [start(args.workers + index) for index in range(len(replaced))]
+        await asyncio.gather(*[loop.run_in_executor(None, process.join) for process in processes])
+    elapsed = time.perf_counter() - started
+
+    worker_stats = []
+    while not results.empty():
+        worker_stats.append(results.get())
+    for stats in sorted(worker_stats, key=lambda stats: stats['worker']):
+        print(stats)
+
+    deadline = time.monotonic() + args.settle_timeout
+    summary = chain.summary()
+    while (summary['pending'] or summary['stuck_behind_gap']) and time.monotonic() < deadline:
+        await asyncio.sleep(args.block_time)
+        summary = chain.summary()
+    await server.stop()
+
+    # Transactions on chain per worker, from the worker index in the question id
+    accepted = {}
+    for tx in chain.transactions.values():
+        if tx.function == 'createMarket':
+            worker = int.from_bytes(tx.args[0][:4], 'big')
+            accepted[worker] = accepted.get(worker, 0) + 1
+    sent = sum(accepted.values())
+    print(
+        f"\n{len(worker_stats)} workers sent {sent} transactions in {elapsed:.2f} s ({sent / elapsed:.0f} tx/s); "
+        f"chain accepted {summary['accepted']}, mined {summary['mined']}, pending {summary['pending']}, "
+        f"stuck {summary['stuck_behind_gap']}, duplicates {summary['duplicate_sends']}, "
+        f"nonce too low {summary['nonce_too_low']} (+{summary['injected_nonce_errors']} injected)",
+    )
+    failures = []
+    # A killed worker's in-flight sends may land after it died, so only survivors must match exactly
+    for stats in worker_stats:
+        if accepted.get(stats['worker'], 0) != stats['sent']:
+            failures.append(
+                f"chain accepted {accepted.get(stats['worker'], 0)} transactions from worker {stats['worker']}, "
+                f"it reported {stats['sent']}",
+            )
+    if summary['duplicate_sends']:
+        failures.append(f"{summary['duplicate_sends']} sends reused a nonce")
+    if summary['stuck_behind_gap'] or summary['pending']:
+        failures.append(f"{summary['stuck_behind_gap']} transactions stuck behind a nonce gap")
+    if any(stats['failed'] for stats in worker_stats):
+        failures.append('some transactions ran out of attempts')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if not failures:
+        print('OK: every nonce was used exactly once')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag and concurrent request latency while signing, per SIGNER_BACKEND.
+
+Signs --transactions `resolveMarket` transactions carrying Pyth-sized
+price_update_data, --concurrency at a time, through each signing backend from
+`tx_signer.create_signer` (inline, thread, process). Meanwhile the same event
+loop runs:
+
+- a ticker that sleeps 1 ms in a loop and records how late it wakes up, i.e.
+  how long the loop was blocked;
+- a stream of light requests (one due every 2 ms, each a few awaits long,
+  like a cached read endpoint) whose latency is measured from when each was
+  due, so requests held up by a blocked loop count with their full delay.
+
+Reports signing throughput, loop lag p50/p99/max and request p50/p99.
+
+Usage:
+    python bench/bench_signer.py
+    python bench/bench_signer.py --transactions 2000 --concurrency 32 --workers 4 --updates 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+from typing import List
+
+from eth_account import Account
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from tx_signer import create_signer  # noqa: E402
+
+PRICE_UPDATE_BYTES = 1050
+ORACLE_ADDRESS = '0x000000000000000000000000000000000000bEEF'
+REQUEST_INTERVAL = 0.002  # Seconds between light requests
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def resolve_calls(count: int, updates: int) -> List[list]:
+    rng = random.Random(1)
+    return [
+        [
+            rng.randbytes(32),
+            [b'PNAU\x01\x00' + rng.randbytes(PRICE_UPDATE_BYTES - 6) for _ in range(updates)],
+            f'bafy{index:055d}',
+        ]
+        for index in range(count)
+    ]
+
+
+async def run(backend: str, args, fn_abi: Dict, calls: List[list]) -> Dict:
+    signer = create_signer(backend, args.workers)
+    account = Account.create()
+    transaction = {
+        'from': account.address, 'to': ORACLE_ADDRESS, 'value': 0, 'chainId': 11155111,
+        'gas': 500000, 'maxFeePerGas': 2 * 10 ** 9, 'maxPriorityFeePerGas': 10 ** 6,
+    }
+    # Warm up the pool so process start-up is not measured
+    await asyncio.gather(*[
+        signer.sign(fn_abi, calls[0], dict(transaction, nonce=0), account.key.hex()) for _ in range(args.workers)
+    ])
+
+    done = asyncio.Event()
+    lags = []
+    latencies = []
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    async def light_request(due: float):
+        for _ in range(3):
+            await asyncio.sleep(0)
+        latencies.append(time.perf_counter() - due)
+
+    async def requests():
+        pending = set()
+        next_due = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            # Requests that fell due while the loop was blocked arrive late, not never
+            while next_due <= now:
+                task = asyncio.ensure_future(light_request(next_due))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                next_due += REQUEST_INTERVAL
+            if done.is_set():
+                break
+            await asyncio.sleep(next_due - now)
+        await asyncio.gather(*pending)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def sign(nonce: int, call: list):
+        async with semaphore:
+            await signer.sign(fn_abi, call, dict(transaction, nonce=nonce), account.key.hex())
+
+    background = [asyncio.ensure_future(ticker()), asyncio.ensure_future(requests())]
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*[sign(nonce, call) for nonce, call in enumerate(calls)])
+        elapsed = time.perf_counter() - started
+    finally:
+        done.set()
+        await asyncio.gather(*background)
+        await signer.close()
+
+    return {
+        'backend': backend,
+        'tx_per_s': round(len(calls) / elapsed),
+        'lag_p50_ms': round(statistics.median(lags) * 1000, 2),
+        'lag_p99_ms': round(percentile(lags, 0.99) * 1000, 2),
+        'lag_max_ms': round(max(lags) * 1000, 2),
+        'request_p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'request_p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transactions', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16, help='Signatures in flight at once')
+    parser.add_argument('--workers', type=int, default=2, help='SIGNER_POOL_WORKERS for thread and process')
+    parser.add_argument('--updates', type=int, default=1, help='Price updates per transaction')
+    parser.add_argument('--backends', nargs='+', default=['inline', 'thread', 'process'])
+    args = parser.parse_args()
+
+    with open(BACKEND_DIR / 'static' / 'oracle_abi.json') as f:
+        fn_abi = next(entry for entry in json.load(f) if entry.get('name') == 'resolveMarket')
+    calls = resolve_calls(args.transactions, args.updates)
+
+    results = [await run(backend, args, fn_abi, calls) for backend in args.backends]
+
+    print(
+        f'{args.transactions} resolveMarket transactions, {args.concurrency} in flight, '
+        f'{args.updates} x {PRICE_UPDATE_BYTES} B price updates, {args.workers} pool workers',
+    )
+    print(
+        f"{'backend':>8} {'tx/s':>7} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} "
+        f"{'req p50':>8} {'req p99':>8}  (ms)",
+    )
+    for result in results:
+        print(
+            f"{result['backend']:>8} {result['tx_per_s']:>7} {result['lag_p50_ms']:>8} "
+            f"{result['lag_p99_ms']:>8} {result['lag_max_ms']:>8} "
+            f"{result['request_p50_ms']:>8} {result['request_p99_ms']:>8}",
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the write endpoints against a local mock chain.
+
+Starts a mock JSON-RPC chain (bench/mock_chain.py) and the FastAPI app
+pointed at it, drives concurrent /initializeMarket or /resolveMarket requests
+with Pyth-sized price_update_data, waits for the mock chain to mine what was
+sent and reports throughput, latency percentiles, nonce writer lock
+contention (from /metrics) and the transactions that reached the chain.
+
+Results are written as JSON to bench/results/<label>_<endpoint>.json, where
+the label defaults to the current git commit; pass --compare with an earlier
+result file to print the differences and flag regressions.
+
+The app runs under uvicorn in a subprocess by default; --transport asgi runs
+it in-process through the ASGI interface (no HTTP server, shares the event
+loop with the load generator and the mock chain).
+
+Usage:
+    python bench/bench_writes.py --endpoint initializeMarket --requests 500 --concurrency 32
+    python bench/bench_writes.py --endpoint resolveMarket --nonce-error-rate 0.02 --revert-rate 0.05
+    python bench/bench_writes.py --workers 4
+    python bench/bench_writes.py --wait --signers 4 --sender-block-limit 8
+    python bench/bench_writes.py --compare bench/results/abc1234_initializeMarket.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from eth_account import Account
+from eth_utils import to_checksum_address
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from bench.mock_chain import ORACLE_ADDRESS  # noqa: E402
+from bench.mock_chain import MockChain  # noqa: E402
+from bench.mock_chain import MockChainConfig  # noqa: E402
+from bench.mock_chain import MockChainServer  # noqa: E402
+
+RESULTS_DIR = BACKEND_DIR / 'bench' / 'results'
+RESULT_SCHEMA = 1
+AUTH_TOKEN = 'iwasbored'
+# Deterministic throwaway key; the mock chain accepts any signer
+BENCH_PRIVATE_KEY = '0x' + hashlib.sha256(b'iwasbored-bench-signer').hexdigest()
+# A Hermes accumulator update (PNAU) for one feed is about 1 KB
+PRICE_UPDATE_BYTES = 1050
+
+# Metric name -> True if higher is better; used by --compare
+COMPARED_METRICS = {
+    'throughput_rps': True,
+    'latency_ms.p50': False,
+    'latency_ms.p99': False,
+    'errors': False,
+    'lock.wait_ms_p99': False,
+    'lock.hold_ms_p99': False,
+    'chain.mined_ok': True,
+    'chain.stuck_behind_gap': False,
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_metrics(text: str) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    """
+    Parse Prometheus text into {sample name: [(labels, value)]}.
+    """
+    samples: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = re.match(r'([a-zA-Z_:][\w:]*)(?:\{(.*)\})? (\S+)$', line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        parsed = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or ''))
+        samples.setdefault(name, []).append((parsed, float(value)))
+    return samples
+
+
+def histogram_quantile(samples, name: str, q: float) -> Optional[float]:
+    """
+    Estimate a quantile from cumulative histogram buckets, like PromQL's histogram_quantile.
+    """
+    buckets = sorted(
+        (float(labels['le'].replace('+Inf', 'inf')), value)
+        for labels, value in samples.get(f'{name}_bucket', [])
+    )
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = q * buckets[-1][1]
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def metric_value(samples, name: str) -> float:
+    return sum(value for _, value in samples.get(name, []))
+
+
+def price_update_data(rng: random.Random, count: int) -> List[str]:
+    return [
+        '0x' + (b'PNAU\x01\x00' + rng.randbytes(PRICE_UPDATE_BYTES - 6)).hex()
+        for _ in range(count)
+    ]
+
+
+def build_payload(endpoint: str, rng: random.Random, question_id: str, updates: int) -> Dict:
+    if endpoint == 'initializeMarket':
+        return {
+            'question_id': question_id,
+            'random_index': rng.randrange(4),
+            'market_end_timestamp': int(time.time()) + 3600,
+            'price_update_data': price_update_data(rng, updates),
+            'value': 10000000000,
+            'auth_token': AUTH_TOKEN,
+        }
+    return {
+        'question_id': question_id,
+        'price_update_data': price_update_data(rng, updates),
+        'answer_cid': f'resolved-{int(time.time())}',
+        'value': 10000000000,
+        'auth_token': AUTH_TOKEN,
+    }
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL,
+        ).strip()
+        dirty = subprocess.call(
+            ['git', 'diff', '--quiet', 'HEAD', '--', '.'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL,
+        )
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class UvicornApp:
+    """
+    The app under uvicorn in a subprocess, reached over HTTP.
+    """
+
+    def __init__(self, env: Dict[str, str], port: int, concurrency: int, show_logs: bool, workers: int = 1):
+        self.env = env
+        self.port = port
+        self.workers = workers
+        self.concurrency = concurrency
+        self.show_logs = show_logs
+        self.process: Optional[subprocess.Popen] = None
+        self.session = None
+
+    async def start(self):
+        import aiohttp
+
+        output = None if self.show_logs else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'uvicorn', 'backend:app', '--host', '127.0.0.1',
+                '--port', str(self.port), '--log-level', 'warning', '--no-access-log',
+                '--workers', str(self.workers),
+            ],
+            cwd=BACKEND_DIR, env={**os.environ, **self.env}, stdout=output, stderr=output,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency + 4),
+            timeout=aiohttp.ClientTimeout(total=600),
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'uvicorn exited with {self.process.returncode}; rerun with --app-logs')
+            try:
+                status, _ = await self.request('GET', '/metrics')
+                if status == 200:
+                    return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError('The app did not start within 60 seconds')
+
+    async def request(self, method: str, path: str, body: Optional[Dict] = None, params: Optional[Dict] = None):
+        async with self.session.request(
+            method, f'http://127.0.0.1:{self.port}{path}', json=body, params=params,
+        ) as response:
+            return response.status, await response.read()
+
+    async def stop(self):
+        if self.session is not None:
+            await self.session.close()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class AsgiApp:
+    """
+    The app called in-process through ASGI, including its lifespan events.
+    """
+
+    def __init__(self, env: Dict[str, str]):
+        self.env = env
+        self.app = None
+        self._lifespan_task = None
+        self._lifespan_queue: Optional[asyncio.Queue] = None
+        self._lifespan_events: Optional[asyncio.Queue] = None
+
+    async def _lifespan(self, message_type: str):
+        await self._lifespan_queue.put({'type': message_type})
+        event = await self._lifespan_events.get()
+        if event['type'].endswith('.failed'):
+            raise RuntimeError(event.get('message', f'{message_type} failed'))
+
+    async def start(self):
+        os.environ.update(self.env)
+        os.chdir(BACKEND_DIR)
+        from backend import app
+
+        self.app = app
+        self._lifespan_queue, self._lifespan_events = asyncio.Queue(), asyncio.Queue()
+        self._lifespan_task = asyncio.create_task(app(
+            {'type': 'lifespan', 'asgi': {'version': '3.0'}},
+            self._lifespan_queue.get, self._lifespan_events.put,
+        ))
+        await self._lifespan('lifespan.startup')
+
+    async def request(self, method: str, path: str, body: Optional[Dict] = None, params: Optional[Dict] = None):
+        raw_body = json.dumps(body).encode() if body is not None else b''
+        headers = [(b'content-type', b'application/json')] if body is not None else []
+        query = '&'.join(f'{key}={value}' for key, value in (params or {}).items())
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': headers, 'server': ('127.0.0.1', 80), 'client': ('127.0.0.1', 1),
+        }
+        response = {'status': None, 'body': b''}
+        received = False
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': raw_body, 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'] += message.get('body', b'')
+
+        await self.app(scope, receive, send)
+        disconnected.set()
+        return response['status'], response['body']
+
+    async def stop(self):
+        if self._lifespan_task is not None:
+            await self._lifespan('lifespan.shutdown')
+            await self._lifespan_task
+
+
+def bench_signer_keys(count: int) -> List[str]:
+    """The primary bench key followed by `count - 1` more deterministic keys."""
+    return [BENCH_PRIVATE_KEY] + [
+        '0x' + hashlib.sha256(f'iwasbored-bench-signer-{index}'.encode()).hexdigest() for index in range(1, count)
+    ]
+
+
+def app_environment(
+    chain_url: str, block_time: float, overrides: Dict[str, str], signers: int = 1,
+) -> Dict[str, str]:
+    poll_interval = str(max(0.1, min(1.0, block_time / 2)))
+    env = {
+        'INFURA_URL': chain_url,
+        'RPC_URLS': '',
+        'ORACLE_CONTRACT_ADDRESS': to_checksum_address(ORACLE_ADDRESS),
+        'TOKEN_CONTRACT_ADDRESS': to_checksum_address('0x' + '33' * 20),
+        'SIGNER_ACCOUNT': Account.from_key(BENCH_PRIVATE_KEY).address,
+        'SIGNER_PRIVATE_KEY': BENCH_PRIVATE_KEY,
+        'SIGNER_PRIVATE_KEYS': ','.join(bench_signer_keys(signers)[1:]),
+        'RECEIPT_POLL_INTERVAL': poll_interval,
+        'FEE_ORACLE_POLL_INTERVAL': poll_interval,
+        'MARKET_CACHE_POLL_INTERVAL': poll_interval,
+        'LOG_LEVEL': 'WARNING',
+    }
+    env.update(overrides)
+    return env
+
+
+async def drive_load(app, args, question_ids: List[str], rng: random.Random) -> Dict:
+    # Payloads are built up front so the load generator measures the app, not itself
+    payloads = [build_payload(args.endpoint, rng, question_id, args.price_updates) for question_id in question_ids]
+    params = {'wait': 'true' if args.wait else 'false'}
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < len(payloads):
+            payload = payloads[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                status, body = await app.request('POST', f'/{args.endpoint}', payload, params)
+                success = status == 200 and json.loads(body).get('info', {}).get('success', False)
+            except Exception as e:
+                status, success = type(e).__name__, False
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if not success:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(payloads),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(payloads) / elapsed, 2),
+        'errors': errors,
+        'status_codes': statuses,
+        'latency_ms': {
+            name: round(percentile(latencies, q) * 1000, 2)
+            for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+        },
+    }
+
+
+async def wait_for_chain(chain: MockChain, timeout: float):
+    """Wait until the mock chain has mined every contiguous transaction it accepted."""
+    deadline = time.monotonic() + timeout
+    while chain.summary()['pending'] and time.monotonic() < deadline:
+        await asyncio.sleep(min(0.5, chain.config.block_time / 2))
+
+
+def lock_stats(samples) -> Dict:
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    acquisitions = metric_value(samples, 'writer_lock_wait_seconds_count')
+    return {
+        'acquisitions': int(acquisitions),
+        'wait_ms_mean': ms(metric_value(samples, 'writer_lock_wait_seconds_sum') / acquisitions) if acquisitions else None,
+        'wait_ms_p99': ms(histogram_quantile(samples, 'writer_lock_wait_seconds', 0.99)),
+        'hold_ms_p99': ms(histogram_quantile(samples, 'writer_lock_hold_seconds', 0.99)),
+    }
+
+
+async def run_benchmark(args) -> Dict:
+    rng = random.Random(args.seed)
+    config = MockChainConfig(
+        block_time=args.block_time,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.jitter_ms,
+        nonce_error_rate=args.nonce_error_rate,
+        revert_rate=args.revert_rate,
+        sender_block_limit=args.sender_block_limit,
+        # The last accounts of the pool never get a transaction mined
+        stalled_senders=tuple(
+            Account.from_key(key).address.lower()
+            for key in bench_signer_keys(args.signers)[args.signers - args.stalled_signers:]
+        ) if args.stalled_signers else (),
+    )
+    random.seed(args.seed)
+    chain = MockChain(config)
+    server = MockChainServer(chain)
+    await server.start()
+
+    question_ids = ['0x' + rng.randbytes(32).hex() for _ in range(args.requests)]
+    if args.endpoint == 'resolveMarket':
+        for question_id in question_ids:
+            chain.seed_market(question_id, int(time.time()) - 60)
+
+    overrides = dict(item.split('=', 1) for item in args.env)
+    if args.workers > 1:
+        # Workers share nonces and jobs through a fresh coordinator database
+        overrides.setdefault('NONCE_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='bench-writes-'), 'nonces.db'))
+    env = app_environment(server.url, args.block_time, overrides, args.signers)
+    if args.transport == 'asgi':
+        app = AsgiApp(env)
+    else:
+        app = UvicornApp(env, args.port, args.concurrency, args.app_logs, args.workers)
+    try:
+        await app.start()
+        load = await drive_load(app, args, question_ids, rng)
+        await wait_for_chain(chain, args.settle_timeout)
+        _, metrics_text = await app.request('GET', '/metrics')
+    finally:
+        await app.stop()
+        await server.stop()
+
+    samples = parse_metrics(metrics_text.decode())
+    return {
+        'schema': RESULT_SCHEMA,
+        'label': args.label,
+        'endpoint': args.endpoint,
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'wait': args.wait,
+            'transport': args.transport,
+            'workers': args.workers,
+            'price_updates': args.price_updates,
+            'seed': args.seed,
+            'block_time': args.block_time,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'nonce_error_rate': args.nonce_error_rate,
+            'revert_rate': args.revert_rate,
+            'signers': args.signers,
+            'stalled_signers': args.stalled_signers,
+            'sender_block_limit': args.sender_block_limit,
+            'env': overrides,
+        },
+        **load,
+        'lock': lock_stats(samples),
+        'app': {
+            'tx_submit_retries': int(metric_value(samples, 'tx_submit_retries_total')),
+            'nonce_resets': int(metric_value(samples, 'nonce_resets_total')),
+            'nonce_errors': int(metric_value(samples, 'nonce_errors_total')),
+            'rpc_errors': int(metric_value(samples, 'rpc_errors_total')),
+        },
+        'chain': chain.summary(),
+    }
+
+
+def lookup(result: Dict, dotted: str):
+    value = result
+    for key in dotted.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(result: Dict, baseline: Dict, threshold: float) -> bool:
+    """
+    Print each compared metric next to the baseline.
+
+    Returns:
+        bool: True if any metric got worse by more than `threshold`.
+    """
+    if baseline.get('config') != result.get('config'):
+        print('Warning: the baseline was recorded with a different configuration')
+    print(f"\n{'metric':24} {baseline.get('label', 'baseline'):>14} {result['label']:>14} {'change':>9}")
+    regressed = False
+    for name, higher_is_better in COMPARED_METRICS.items():
+        before, after = lookup(baseline, name), lookup(result, name)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else (0.0 if after == before else math.inf)
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f'{name:24} {before:>14} {after:>14} {change:>+8.1%}{flag}')
+    return regressed
+
+
+def print_summary(result: Dict):
+    latency = result['latency_ms']
+    lock = result['lock']
+    chain = result['chain']
+    print(
+        f"{result['endpoint']}: {result['requests']} requests at concurrency {result['config']['concurrency']} "
+        f"in {result['elapsed_s']} s -> {result['throughput_rps']} req/s, {result['errors']} errors"
+    )
+    print(f"latency ms: p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  max {latency['max']}")
+    print(
+        f"writer lock: {lock['acquisitions']} acquisitions, wait mean {lock['wait_ms_mean']} ms, "
+        f"wait p99 {lock['wait_ms_p99']} ms, hold p99 {lock['hold_ms_p99']} ms"
+    )
+    print(
+        f"chain: {chain['mined_ok']} mined ok, {chain['reverted']} reverted, {chain['pending']} pending, "
+        f"{chain['stalled']} stalled, {chain['stuck_behind_gap']} stuck behind a nonce gap, {chain['nonce_too_low']} nonce too low "
+        f"(+{chain['injected_nonce_errors']} injected)"
+    )
+    print(f"mined per signer: {chain['mined_by_sender']}")
+    print(f"app: {result['app']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load benchmark for the write endpoints against a mock chain.')
+    parser.add_argument('--endpoint', choices=('initializeMarket', 'resolveMarket'), default='initializeMarket')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--wait', action='store_true', help='Wait for receipts (wait=true) instead of returning the job')
+    parser.add_argument('--price-updates', type=int, default=1, help='Price update blobs per request')
+    parser.add_argument('--block-time', type=float, default=2.0)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Mock RPC latency per HTTP request')
+    parser.add_argument('--jitter-ms', type=float, default=5.0)
+    parser.add_argument('--nonce-error-rate', type=float, default=0.0)
+    parser.add_argument('--revert-rate', type=float, default=0.0)
+    parser.add_argument('--signers', type=int, default=1, help='Signer accounts in the app pool')
+    parser.add_argument('--stalled-signers', type=int, default=0, help='Signers whose transactions are never mined')
+    parser.add_argument(
+        '--sender-block-limit', type=int, default=0, help='Transactions the mock chain mines per sender per block',
+    )
+    parser.add_argument('--settle-timeout', type=float, default=60.0, help='Seconds to wait for the chain to mine')
+    parser.add_argument('--transport', choices=('uvicorn', 'asgi'), default='uvicorn')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='uvicorn workers (uvicorn transport); /metrics then shows the worker that answered the scrape',
+    )
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='Extra app environment')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', default=None, help='Result label; defaults to the git revision')
+    parser.add_argument('--output', type=Path, default=RESULTS_DIR)
+    parser.add_argument('--compare', type=Path, default=None, help='Earlier result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change flagged as a regression')
+    parser.add_argument('--app-logs', action='store_true', help='Show the uvicorn subprocess output')
+    args = parser.parse_args()
+    if args.workers > 1 and args.transport == 'asgi':
+        parser.error('--workers needs the uvicorn transport')
+    args.label = args.label or git_revision()
+
+    result = asyncio.run(run_benchmark(args))
+    print_summary(result)
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    path = args.output / f"{args.label}_{args.endpoint}.json"
+    path.write_text(json.dumps(result, indent=2, sort_keys=True) + '\n')
+    print(f'Saved {path}')
+
+    if args.compare is not None:
+        regressed = compare(result, json.loads(args.compare.read_text()), args.threshold)
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+"""
+Local mock JSON-RPC chain for benchmarks.
+
+Implements the subset of the Ethereum JSON-RPC API the backend uses, with
+the oracle contract's market functions backed by an in-memory market table.
+Blocks advance on a fixed block time; sent transactions are mined in the next
+block once every lower nonce of the sender has arrived, so out-of-order and
+gapped nonces behave like a node's pending pool. Latency, nonce errors and
+reverts can be injected to exercise the backend's recovery paths.
+"""
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from aiohttp import web
+from eth_abi import decode
+from eth_abi import encode
+from eth_account import Account
+from eth_account._utils.typed_transactions import TypedTransaction
+from eth_utils import function_abi_to_4byte_selector
+from eth_utils.abi import collapse_if_tuple
+from hexbytes import HexBytes
+
+ORACLE_ABI = json.loads((Path(__file__).resolve().parent.parent / 'static' / 'oracle_abi.json').read_text())
+ORACLE_ADDRESS = '0x' + '11' * 20
+MULTICALL3_ADDRESS = '0xca11bde05977b3631167028862be2a173976ca11'
+AGGREGATE3_SELECTOR = function_abi_to_4byte_selector({
+    'name': 'aggregate3', 'type': 'function',
+    'inputs': [{'type': 'tuple[]', 'components': [
+        {'type': 'address'}, {'type': 'bool'}, {'type': 'bytes'},
+    ]}],
+})
+CHAIN_ID = 11155111
+BASE_FEE = 10 ** 9
+GAS_ESTIMATE = 250000
+STALLED_BLOCK = 2 ** 62  # Never reached
+
+
+@dataclass
+class MockChainConfig:
+    block_time: float = 2.0  # Seconds per block
+    latency_ms: float = 0.0  # Added to every HTTP request
+    latency_jitter_ms: float = 0.0
+    nonce_error_rate: float = 0.0  # Share of sends whose nonce another sender takes first ("nonce too low")
+    revert_rate: float = 0.0  # Share of mined transactions that revert
+    sender_block_limit: int = 0  # Transactions per sender per block (0 = unlimited); later ones wait for later blocks
+    stalled_senders: Tuple[str, ...] = ()  # Lowercase senders whose transactions are accepted but never mined
+
+
+@dataclass
+class MockTransaction:
+    tx_hash: str
+    sender: str
+    nonce: int
+    function: str
+    args: tuple
+    received_at: float
+    block_number: Optional[int] = None
+    status: int = 1
+
+
+@dataclass
+class MockChainStats:
+    http_requests: int = 0
+    rpc_calls: Dict[str, int] = field(default_factory=dict)
+    sends: int = 0
+    injected_nonce_errors: int = 0
+    nonce_too_low: int = 0
+    duplicate_sends: int = 0
+
+
+class MockChain:
+    """
+    In-memory chain state plus the JSON-RPC method handlers.
+    """
+
+    def __init__(self, config: MockChainConfig):
+        self.config = config
+        self.started_at = time.monotonic()
+        self.genesis_block = 1000
+        self.functions = {
+            function_abi_to_4byte_selector(item): item
+            for item in ORACLE_ABI if item.get('type') == 'function'
+        }
+        self.markets: Dict[bytes, Dict] = {}  # question id -> market
+        self.transactions: Dict[str, MockTransaction] = {}  # tx hash -> transaction
+        self.mined_nonce: Dict[str, int] = {}  # sender -> next nonce to be mined
+        self.pending_nonce: Dict[str, int] = {}  # sender -> next nonce after the contiguous pending ones
+        self.queued: Dict[str, Dict[int, MockTransaction]] = {}  # sender -> gapped transactions by nonce
+        self.pending: List[MockTransaction] = []  # contiguous, waiting for the next block
+        self.sender_slots: Dict[str, Tuple[int, int]] = {}  # sender -> (last block assigned, transactions in it)
+        self.stats = MockChainStats()
+
+    # Blocks and mining
+
+    @property
+    def block_number(self) -> int:
+        return self.genesis_block + int((time.monotonic() - self.started_at) / self.config.block_time)
+
+    def _mine(self):
+        block_number = self.block_number
+        still_pending = []
+        for tx in self.pending:
+            if tx.block_number <= block_number:
+                self._execute(tx)
+                self.mined_nonce[tx.sender] = max(self.mined_nonce.get(tx.sender, 0), tx.nonce + 1)
+            else:
+                still_pending.append(tx)
+        self.pending = still_pending
+
+    def _execute(self, tx: MockTransaction):
+        if random.random() < self.config.revert_rate:
+            tx.status = 0
+            return
+        if tx.function == 'external':
+            return
+        if tx.function == 'createMarket':
+            question_id, _, end_timestamp, _ = tx.args
+            if question_id in self.markets:
+                tx.status = 0
+                return
+            self.markets[question_id] = {'end': end_timestamp, 'answered': False}
+        elif tx.function == 'resolveMarket':
+            market = self.markets.get(tx.args[0])
+            if market is None or market['answered']:
+                tx.status = 0
+                return
+            market['answered'] = True
+
+    def _promote(self, sender: str):
+        """Move gapped transactions that became contiguous into the next block."""
+        queued = self.queued.get(sender, {})
+        next_nonce = self.pending_nonce.get(sender, 0)
+        while next_nonce in queued:
+            tx = queued.pop(next_nonce)
+            tx.block_number = self._next_slot(sender)
+            self.pending.append(tx)
+            next_nonce += 1
+        self.pending_nonce[sender] = next_nonce
+
+    def _next_slot(self, sender: str) -> int:
+        """The block a newly pending transaction of `sender` is mined in."""
+        if sender in self.config.stalled_senders:
+            return STALLED_BLOCK
+        block = self.block_number + 1
+        if not self.config.sender_block_limit:
+            return block
+        last_block, used = self.sender_slots.get(sender, (0, 0))
+        if last_block >= block:
+            block = last_block
+        else:
+            used = 0
+        if used >= self.config.sender_block_limit:
+            block, used = block + 1, 0
+        self.sender_slots[sender] = (block, used + 1)
+        return block
+
+    def seed_market(self, question_id: str, end_timestamp: int):
+        self.markets[bytes.fromhex(question_id[2:])] = {'end': end_timestamp, 'answered': False}
+
+    # Oracle contract views
+
+    def _market_tuple(self, question_id: bytes):
+        market = self.markets[question_id]
+        return (
+            (1, market['end'], '0x' + '22' * 20, b'\x01' * 32, b'\x02' * 32, 100, 0, 0),
+            ([], 1 if market['answered'] else 0, ''),
+            0,
+            [5 * 10 ** 17, 5 * 10 ** 17],
+            [10 ** 20, 10 ** 20],
+        )
+
+    def _oracle_call(self, data: bytes) -> bytes:
+        fn_abi = self.functions[data[:4]]
+        args = decode([collapse_if_tuple(arg) for arg in fn_abi['inputs']], data[4:])
+        output_types = [collapse_if_tuple(output) for output in fn_abi['outputs']]
+        name = fn_abi['name']
+        if name == 'getActiveMarketIds':
+            return encode(output_types, [[qid for qid, market in self.markets.items() if not market['answered']]])
+        if name == 'getMarketData':
+            return encode(output_types, [self._market_tuple(args[0])])
+        if name in ('getUserOpenPositions', 'getUserClosedPositions'):
+            return encode(output_types, [[]])
+        if name == 'getPositionBalances':
+            return encode(output_types, [[0] * len(args[1])])
+        raise ValueError(f'execution reverted: {name} is not mocked')
+
+    def eth_call(self, transaction: Dict, _block=None) -> str:
+        data = bytes.fromhex(transaction['data'][2:])
+        if transaction['to'].lower() == MULTICALL3_ADDRESS and data[:4] == AGGREGATE3_SELECTOR:
+            (calls,) = decode(['(address,bool,bytes)[]'], data[4:])
+            results = []
+            for _, _, call_data in calls:
+                try:
+                    results.append((True, self._oracle_call(call_data)))
+                except Exception:
+                    results.append((False, b''))
+            return '0x' + encode(['(bool,bytes)[]'], [results]).hex()
+        return '0x' + self._oracle_call(data).hex()
+
+    # Transactions
+
+    def eth_sendRawTransaction(self, raw_transaction: str) -> str:
+        self.stats.sends += 1
+        raw = HexBytes(raw_transaction)
+        typed_transaction = TypedTransaction.from_bytes(raw)
+        tx_fields = typed_transaction.as_dict()
+        sender = Account.recover_transaction(raw).lower()
+        tx_hash = '0x' + typed_transaction.hash().hex()
+        nonce = tx_fields['nonce']
+
+        if tx_hash in self.transactions:
+            self.stats.duplicate_sends += 1
+            raise ValueError('already known')
+        if nonce < self.pending_nonce.get(sender, 0):
+            self.stats.nonce_too_low += 1
+            raise ValueError('nonce too low')
+        if nonce in self.queued.get(sender, {}):
+            self.stats.duplicate_sends += 1
+            raise ValueError('already known')
+        if random.random() < self.config.nonce_error_rate:
+            # Another process using the same account got this nonce in first
+            self.stats.injected_nonce_errors += 1
+            external = MockTransaction(f'{tx_hash}-external', sender, nonce, 'external', (), time.monotonic())
+            self.queued.setdefault(sender, {})[nonce] = external
+            self._promote(sender)
+            raise ValueError('nonce too low')
+
+        data = tx_fields['data']
+        fn_abi = self.functions[data[:4]]
+        args = decode([collapse_if_tuple(arg) for arg in fn_abi['inputs']], data[4:])
+        tx = MockTransaction(tx_hash, sender, nonce, fn_abi['name'], args, time.monotonic())
+        self.transactions[tx_hash] = tx
+        self.queued.setdefault(sender, {})[nonce] = tx
+        self._promote(sender)
+        return tx_hash
+
+    def eth_getTransactionReceipt(self, tx_hash: str) -> Optional[Dict]:
+        tx = self.transactions.get(tx_hash.lower())
+        if tx is None or tx.block_number is None or tx.block_number > self.block_number:
+            return None
+        return {
+            'transactionHash': tx.tx_hash,
+            'transactionIndex': '0x0',
+            'blockHash': '0x' + tx.block_number.to_bytes(32, 'big').hex(),
+            'blockNumber': hex(tx.block_number),
+            'from': tx.sender,
+            'to': ORACLE_ADDRESS,
+            'cumulativeGasUsed': hex(GAS_ESTIMATE),
+            'gasUsed': hex(GAS_ESTIMATE),
+            'effectiveGasPrice': hex(BASE_FEE),
+            'contractAddress': None,
+            'logs': [],
+            'logsBloom': '0x' + '00' * 256,
+            'status': hex(tx.status),
+            'type': '0x2',
+        }
+
+    def eth_getTransactionCount(self, address: str, block: str = 'latest') -> str:
+        address = address.lower()
+        if block == 'pending':
+            return hex(self.pending_nonce.get(address, 0))
+        return hex(self.mined_nonce.get(address, 0))
+
+    def eth_feeHistory(self, block_count, newest_block, percentiles) -> Dict:
+        count = int(block_count, 16) if isinstance(block_count, str) else block_count
+        return {
+            'oldestBlock': hex(self.block_number - count + 1),
+            'baseFeePerGas': [hex(BASE_FEE)] * (count + 1),
+            'gasUsedRatio': [0.5] * count,
+            'reward': [[hex(10 ** 8)] for _ in range(count)],
+        }
+
+    def handle(self, method: str, params: list):
+        self.stats.rpc_calls[method] = self.stats.rpc_calls.get(method, 0) + 1
+        self._mine()
+        if method == 'eth_chainId':
+            return hex(CHAIN_ID)
+        if method == 'net_version':
+            return str(CHAIN_ID)
+        if method == 'eth_blockNumber':
+            return hex(self.block_number)
+        if method == 'eth_estimateGas':
+            return hex(GAS_ESTIMATE)
+        if method == 'eth_gasPrice':
+            return hex(BASE_FEE)
+        if method == 'eth_maxPriorityFeePerGas':
+            return hex(10 ** 8)
+        if method == 'eth_getLogs':
+            return []
+        handler = getattr(self, method, None)
+        if handler is None:
+            raise ValueError(f'the method {method} does not exist/is not available')
+        return handler(*params)
+
+    # Results
+
+    def summary(self) -> Dict:
+        self._mine()
+        transactions = list(self.transactions.values())
+        mined = [
+            tx for tx in transactions
+            if tx.block_number is not None and tx.block_number <= self.block_number and tx.function != 'external'
+        ]
+        return {
+            'block_number': self.block_number,
+            'sent': self.stats.sends,
+            'accepted': len(transactions),
+            'mined': len(mined),
+            'mined_ok': sum(tx.status == 1 for tx in mined),
+            'reverted': sum(tx.status == 0 for tx in mined),
+            'pending': sum(tx.block_number != STALLED_BLOCK for tx in self.pending),
+            'stalled': sum(tx.block_number == STALLED_BLOCK for tx in self.pending),
+            'stuck_behind_gap': sum(len(queued) for queued in self.queued.values()),
+            'nonce_too_low': self.stats.nonce_too_low,
+            'injected_nonce_errors': self.stats.injected_nonce_errors,
+            'duplicate_sends': self.stats.duplicate_sends,
+            'markets': len(self.markets),
+            'http_requests': self.stats.http_requests,
+            'rpc_calls': dict(sorted(self.stats.rpc_calls.items())),
+            'mined_by_sender': {
+                sender: sum(tx.sender == sender for tx in mined) for sender in sorted({tx.sender for tx in transactions})
+            },
+        }
+
+
+class MockChainServer:
+    """
+    Serves a MockChain over HTTP JSON-RPC, including batch requests.
+    """
+
+    def __init__(self, chain: MockChain, host: str = '127.0.0.1', port: int = 0):
+        self.chain = chain
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def _call(self, request: Dict) -> Dict:
+        try:
+            result = self.chain.handle(request['method'], request.get('params') or [])
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+        except Exception as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32000, 'message': str(e)}}
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.chain.stats.http_requests += 1
+        body = await request.json()
+        config = self.chain.config
+        if config.latency_ms or config.latency_jitter_ms:
+            await asyncio.sleep(max(0.0, config.latency_ms + random.uniform(-1, 1) * config.latency_jitter_ms) / 1000)
+        if isinstance(body, list):
+            return web.json_response([self._call(item) for item in body])
+        return web.json_response(self._call(body))
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post('/', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -4,18 +4,18 @@ Python script to create markets by calling the backend /createMarket endpoint
 """
 import random
 import hashlib
-import base64
 import asyncio
-import json
 import logging
 import os
 import sys
 from datetime import datetime
 from typing import Optional
 
-import aiohttp
 from dotenv import load_dotenv
 
+from http_session import HttpSessionManager
+from pyth_client import PythPriceClient
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,31 +35,17 @@ load_dotenv()
 
 AUTH_TOKEN = "iwasbored"  # Same as backend
 
+# One pooled session for every backend and Hermes call made by the creator loop
+http_sessions = HttpSessionManager()
+pyth_client = PythPriceClient(session_manager=http_sessions)
+
 
 async def get_pyth_update_data(price_feed_id: str) -> list[str]:
-    """Get Pyth update data from the Hermes API (exact same as Hardhat script)"""
-    url = f"https://hermes.pyth.network/api/latest_vaas?ids[]={price_feed_id}"
-    
-    logger.info(f"Fetching Pyth data from: {url}")
-    
+    """Get Pyth update data from the shared, cached Hermes client"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                logger.info(f"Pyth API response status: {response.status}")
-                if response.status == 200:
-                    data = await response.text()
-                    logger.info(f"Raw Pyth data: {data}")
-                    
-                    parsed = json.loads(data)
-                    logger.info(f"Parsed Pyth data: {parsed}")
-                    
-                    price_update_data = ['0x' + base64.b64decode(d).hex() for d in parsed]
-                    logger.info(f"Converted price update data: {price_update_data}")
-                    return price_update_data
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to fetch Pyth data: {response.status} - {error_text}")
-                    raise Exception(f"Failed to fetch Pyth data: {response.status} - {error_text}")
+        price_update_data = await pyth_client.get_price_update_data([price_feed_id])
+        logger.info(f"Converted price update data: {price_update_data}")
+        return price_update_data
     except Exception as e:
         logger.error(f"Error fetching Pyth update data: {e}")
         raise
@@ -68,18 +54,18 @@ async def get_pyth_update_data(price_feed_id: str) -> list[str]:
 async def call_create_market_backend(url: str, market_data: dict) -> dict:
     """Call the backend /createMarket endpoint"""
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {'Content-Type': 'application/json'}
-            
-            async with session.post(url, json=market_data, headers=headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    logger.info(f"✅ Backend call successful: {result}")
-                    return result
-                else:
-                    error_text = await response.text()
-                    logger.error(f"❌ Backend call failed: {response.status} - {error_text}")
-                    raise Exception(f"Backend call failed: {response.status} - {error_text}")
+        session = await http_sessions.get_session()
+        headers = {'Content-Type': 'application/json'}
+        
+        async with session.post(url, json=market_data, headers=headers) as response:
+            if response.status == 200:
+                result = await response.json()
+                logger.info(f"✅ Backend call successful: {result}")
+                return result
+            else:
+                error_text = await response.text()
+                logger.error(f"❌ Backend call failed: {response.status} - {error_text}")
+                raise Exception(f"Backend call failed: {response.status} - {error_text}")
     except Exception as e:
         logger.error(f"❌ Error calling backend: {e}")
         raise
@@ -156,7 +142,12 @@ async def run_continuously():
 async def main():
     """Main function to start continuous market creation"""
     logger.info("🎲 Starting continuous market creator...")
-    await run_continuously()
+    await http_sessions.start()
+    try:
+        await run_continuously()
+    finally:
+        await pyth_client.close()
+        await http_sessions.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,95 @@
+"""
+Deadline-driven scheduler for market resolution.
+
+Markets are kept in a min-heap keyed by their resolution time, so the monitor
+can sleep until the next deadline instead of scanning every open market.
+"""
+import asyncio
+import heapq
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+
+class ExpiryScheduler:
+    """
+    Priority queue of market deadlines with an early-wakeup signal.
+
+    Rescheduled or discarded entries are left in the heap and skipped lazily
+    when popped, so every operation costs O(log n) and `pop_due` only touches
+    the markets that are actually due.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, str]] = []
+        self._deadlines: Dict[str, int] = {}  # question_id -> resolution time
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, question_id: str) -> bool:
+        return question_id in self._deadlines
+
+    def schedule(self, question_id: str, due_time: int):
+        """
+        Schedule (or reschedule) a market for resolution at `due_time`.
+
+        Wakes any waiter if this becomes the earliest deadline.
+        """
+        if self._deadlines.get(question_id) == due_time:
+            return
+        next_due = self.next_due_time()
+        self._deadlines[question_id] = due_time
+        heapq.heappush(self._heap, (due_time, question_id))
+        if next_due is None or due_time < next_due:
+            self._wakeup.set()
+
+    def discard(self, question_id: str):
+        """Stop tracking a market, e.g. once it has been resolved."""
+        self._deadlines.pop(question_id, None)
+
+    def _drop_stale(self):
+        while self._heap:
+            due_time, question_id = self._heap[0]
+            if self._deadlines.get(question_id) == due_time:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due_time(self) -> Optional[int]:
+        """Return the earliest scheduled resolution time, if any."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """
+        Remove and return every market whose resolution time has passed.
+        """
+        now = time.time() if now is None else now
+        # Clear before popping so a schedule() racing with the caller still wakes it
+        self._wakeup.clear()
+
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, question_id = heapq.heappop(self._heap)
+            del self._deadlines[question_id]
+            due.append(question_id)
+            self._drop_stale()
+        return due
+
+    async def wait(self, max_sleep: float):
+        """
+        Sleep until the next deadline, `max_sleep` seconds, or an earlier market is scheduled.
+        """
+        timeout = max_sleep
+        next_due = self.next_due_time()
+        if next_due is not None:
+            timeout = min(timeout, max(0, next_due - time.time()))
+
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,119 @@
+"""
+Fee and gas oracle for transaction building.
+
+Fees are refreshed once per new block from `eth_feeHistory` in the background
+and the chain id is read once at startup, so building a transaction on the hot
+path costs a single `eth_estimateGas`. Gas is estimated for every transaction
+with its own arguments: the cost of a call depends on them and on contract
+state, so a cached estimate can run a later transaction out of gas.
+"""
+import asyncio
+import os
+from typing import Dict
+from typing import Optional
+
+from logger import logger
+
+fee_logger = logger.bind(
+    service='I Was BORED|Fee Oracle',
+)
+
+FEE_ORACLE_POLL_INTERVAL = 2  # Seconds between new-block checks
+FEE_HISTORY_BLOCKS = 5
+FEE_REWARD_PERCENTILE = 50
+BASE_FEE_MULTIPLIER = 2  # Headroom for base fee increases over the next blocks
+MIN_PRIORITY_FEE = 1000000  # 0.001 gwei
+GAS_LIMIT_MULTIPLIER = 1.2
+
+
+class FeeOracle:
+    """
+    Caches chain id and EIP-1559 fee parameters, and estimates gas limits.
+    """
+
+    def __init__(self, w3, poll_interval: Optional[float] = None):
+        self.w3 = w3
+        self.poll_interval = poll_interval or float(
+            os.getenv('FEE_ORACLE_POLL_INTERVAL', FEE_ORACLE_POLL_INTERVAL),
+        )
+        self.history_blocks = int(os.getenv('FEE_HISTORY_BLOCKS', FEE_HISTORY_BLOCKS))
+        self.reward_percentile = int(os.getenv('FEE_REWARD_PERCENTILE', FEE_REWARD_PERCENTILE))
+        self.base_fee_multiplier = float(os.getenv('BASE_FEE_MULTIPLIER', BASE_FEE_MULTIPLIER))
+        self.min_priority_fee = int(os.getenv('MIN_PRIORITY_FEE', MIN_PRIORITY_FEE))
+        self.gas_limit_multiplier = float(os.getenv('GAS_LIMIT_MULTIPLIER', GAS_LIMIT_MULTIPLIER))
+
+        self.chain_id: Optional[int] = None
+        self.max_fee_per_gas: Optional[int] = None
+        self.max_priority_fee_per_gas: Optional[int] = None
+        self._last_block: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        Cache the chain id, load the current fees and keep them fresh in the background.
+        """
+        self.chain_id = await self.w3.eth.chain_id
+        await self.refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self):
+        """
+        Recompute fees from the recent fee history.
+        """
+        fee_history = await self.w3.eth.fee_history(
+            self.history_blocks, 'latest', [self.reward_percentile],
+        )
+        # The last base fee entry is the base fee of the next block
+        next_base_fee = fee_history['baseFeePerGas'][-1]
+        rewards = sorted(reward[0] for reward in fee_history['reward'] if reward)
+        priority_fee = rewards[len(rewards) // 2] if rewards else 0
+
+        self.max_priority_fee_per_gas = max(priority_fee, self.min_priority_fee)
+        self.max_fee_per_gas = int(next_base_fee * self.base_fee_multiplier) + self.max_priority_fee_per_gas
+
+    async def _run(self):
+        while True:
+            try:
+                block_number = await self.w3.eth.block_number
+                if block_number != self._last_block:
+                    await self.refresh()
+                    self._last_block = block_number
+            except Exception as e:
+                fee_logger.error(f'Fee refresh failed: {e}')
+            await asyncio.sleep(self.poll_interval)
+
+    async def gas_limit(self, function: str, transaction: Dict) -> int:
+        """
+        Estimate the gas limit of `transaction`, with GAS_LIMIT_MULTIPLIER headroom.
+
+        Args:
+            function (str): The contract function called, for logs.
+            transaction (dict): `from`, `to`, `value` and the already encoded `data`.
+        """
+        estimate = await self.w3.eth.estimate_gas(transaction)
+        gas_limit = int(estimate * self.gas_limit_multiplier)
+        fee_logger.debug(f'Gas limit for {function}: {gas_limit}')
+        return gas_limit
+
+    async def transaction_params(self, function: str, transaction: Dict) -> Dict:
+        """
+        Fee, gas and chain parameters completing `transaction` ({from, to, value, data}).
+
+        The call data is estimated as it will be signed, so it is never encoded twice.
+        """
+        return {
+            'chainId': self.chain_id,
+            'maxFeePerGas': self.max_fee_per_gas,
+            'maxPriorityFeePerGas': self.max_priority_fee_per_gas,
+            'gas': await self.gas_limit(function, transaction),
+        }
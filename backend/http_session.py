@@ -0,0 +1,79 @@
+"""
+Long-lived, pooled aiohttp session shared by the monitor and the market creator.
+
+Reusing one session keeps TCP/TLS connections alive between backend and Hermes
+calls instead of paying a new handshake per request.
+"""
+import os
+from typing import Optional
+
+import aiohttp
+
+from logger import logger
+
+session_logger = logger.bind(
+    service='I Was BORED|HTTP Session',
+)
+
+HTTP_POOL_LIMIT = 100
+HTTP_POOL_LIMIT_PER_HOST = 20
+HTTP_DNS_CACHE_TTL = 300  # Seconds
+HTTP_KEEPALIVE_TIMEOUT = 30  # Seconds an idle connection is kept open
+
+
+class HttpSessionManager:
+    """
+    Owns a single pooled `aiohttp.ClientSession` and its connector.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        limit_per_host: Optional[int] = None,
+        dns_cache_ttl: Optional[int] = None,
+        keepalive_timeout: Optional[float] = None,
+    ):
+        self.limit = limit or int(os.getenv('HTTP_POOL_LIMIT', HTTP_POOL_LIMIT))
+        self.limit_per_host = limit_per_host or int(
+            os.getenv('HTTP_POOL_LIMIT_PER_HOST', HTTP_POOL_LIMIT_PER_HOST),
+        )
+        self.dns_cache_ttl = dns_cache_ttl or int(os.getenv('HTTP_DNS_CACHE_TTL', HTTP_DNS_CACHE_TTL))
+        self.keepalive_timeout = keepalive_timeout or float(
+            os.getenv('HTTP_KEEPALIVE_TIMEOUT', HTTP_KEEPALIVE_TIMEOUT),
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        """
+        Create the pooled session if it does not exist yet.
+
+        Returns:
+            aiohttp.ClientSession: The shared session.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            session_logger.info(
+                f'Opened pooled HTTP session (limit={self.limit}, per_host={self.limit_per_host})',
+            )
+        return self._session
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared session, opening it on first use.
+        """
+        return await self.start()
+
+    async def close(self):
+        """
+        Close the session and every pooled connection.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            session_logger.info('Closed pooled HTTP session')
+        self._session = None
@@ -1,9 +1,27 @@
 """
 This module configures a custom logger using the loguru library.
-It sets up logging to stdout for DEBUG level and stderr for WARNING and ERROR levels.
+
+Records are formatted by the caller and handed to a bounded in-memory queue;
+a background thread writes them out in batches, so terminal and pipe writes
+never block the event loop. Every record goes to exactly one stream: stdout
+below WARNING, stderr from WARNING up. Output is one JSON object per line
+(LOG_FORMAT=json) or the human-readable FORMAT below (LOG_FORMAT=text).
 """
+import atexit
+import json
+import logging
+import os
+import queue
+import random
 import sys
+import threading
+import traceback
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TextIO
 
+from dotenv import load_dotenv
 from loguru import logger
 
 # Define the log format
@@ -13,15 +31,153 @@ from loguru import logger
 # {extra} - Additional context that can be passed to the logger using .bind()
 FORMAT = '{time:MMMM D, YYYY > HH:mm:ss!UTC} | {level} | {message}| {extra}'
 
-# Remove the default logger
-logger.remove(0)
+LOG_LEVEL = 'DEBUG'
+LOG_FORMAT = 'json'  # json or text
+LOG_QUEUE_SIZE = 10000  # Records buffered before new ones are dropped
+LOG_BATCH_SIZE = 512  # Records written per stream write
+# Share of requests whose end-of-request record is logged, per route template
+# (e.g. "/metrics=0,/markets=0.1"); errors are always logged
+LOG_SAMPLE_RATES = ''
+LOG_SAMPLE_DEFAULT = 1.0
+
+WARNING_LEVEL = logger.level('WARNING').no
+
+
+def format_json(record) -> str:
+    """
+    Render a record as one JSON line; loguru then formats the returned template.
+    """
+    extra = dict(record['extra'])
+    entry = {
+        'time': record['time'].isoformat(),
+        'level': record['level'].name,
+        'service': extra.pop('service', None),
+        'message': record['message'],
+        **extra,
+    }
+    if record['exception'] is not None:
+        entry['exception'] = ''.join(traceback.format_exception(*record['exception'])).rstrip()
+    record['extra']['_json'] = json.dumps(entry, default=str)
+    return '{extra[_json]}\n'
+
+
+class QueuedStreamSink:
+    """
+    loguru sink that queues formatted records for a background writer thread.
+
+    Putting a record never blocks: when the queue is full the record is dropped
+    and counted, and the writer reports the number dropped once it catches up.
+    """
+
+    def __init__(self, stream: TextIO, queue_size: int = LOG_QUEUE_SIZE, batch_size: int = LOG_BATCH_SIZE):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def __call__(self, message: str):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, lines: List[str]):
+        try:
+            self.stream.write(''.join(lines))
+            self.stream.flush()
+        except Exception:
+            pass  # Nowhere left to report a broken log stream
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            lines = [message]
+            stop = False
+            # Drain whatever else is queued so one write covers a burst of records
+            while len(lines) < self.batch_size:
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    stop = True
+                    break
+                lines.append(message)
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                lines.append(f'Log queue full, dropped {dropped} records\n')
+            self._write(lines)
+            if stop:
+                return
+
+    def stop(self):
+        """Write everything still queued and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class InterceptHandler(logging.Handler):
+    """
+    Route standard `logging` records (scripts, libraries) into the queued loguru sinks.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        logger.bind(service=record.name).opt(exception=record.exc_info).log(level, record.getMessage())
+
+
+class RequestLogSampler:
+    """
+    Decides per route whether a request's end-of-request record is written.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: Optional[float] = None):
+        if rates is None:
+            rates = {}
+            for item in os.getenv('LOG_SAMPLE_RATES', LOG_SAMPLE_RATES).split(','):
+                route, _, rate = item.strip().rpartition('=')
+                if route:
+                    rates[route] = float(rate)
+        self.rates = rates
+        self.default_rate = default_rate if default_rate is not None else float(
+            os.getenv('LOG_SAMPLE_DEFAULT', LOG_SAMPLE_DEFAULT),
+        )
+
+    def should_log(self, route: str, status_code: int) -> bool:
+        if status_code >= 400:
+            return True
+        rate = self.rates.get(route, self.default_rate)
+        return rate >= 1 or random.random() < rate
+
+
+def configure_logging():
+    # Logging is configured on first import, before the services load their .env
+    load_dotenv()
+    level = os.getenv('LOG_LEVEL', LOG_LEVEL)
+    log_format = format_json if os.getenv('LOG_FORMAT', LOG_FORMAT) == 'json' else FORMAT
+    queue_size = int(os.getenv('LOG_QUEUE_SIZE', LOG_QUEUE_SIZE))
+
+    # Remove the default logger
+    logger.remove()
 
-# Add a new logger for stdout (console output) with DEBUG level
-logger.add(sys.stdout, level='DEBUG', format=FORMAT)
+    sinks = [QueuedStreamSink(sys.stdout, queue_size), QueuedStreamSink(sys.stderr, queue_size)]
+    # DEBUG and INFO go to stdout, WARNING and above to stderr; no record is written twice
+    logger.add(
+        sinks[0], level=level, format=log_format, colorize=False,
+        filter=lambda record: record['level'].no < WARNING_LEVEL,
+    )
+    logger.add(
+        sinks[1], level=max(WARNING_LEVEL, logger.level(level).no), format=log_format, colorize=False,
+    )
+    for sink in sinks:
+        atexit.register(sink.stop)
 
-# Add a new logger for stderr (error output) with WARNING level
-logger.add(sys.stderr, level='WARNING', format=FORMAT)
 
-# Add another logger for stderr with ERROR level
-# This ensures that ERROR logs are captured separately from WARNINGs
-logger.add(sys.stderr, level='ERROR', format=FORMAT)
+configure_logging()
@@ -0,0 +1,123 @@
+"""
+Block-synchronized in-memory snapshot of all active markets.
+
+The read endpoints are served from this snapshot instead of the RPC. A
+background loop re-reads every active market through the multicall reader
+once per new block, so one batched chain read serves every client. Each
+snapshot carries content hashes that the endpoints use as ETags.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from logger import logger
+from market_reader import MarketSnapshotReader
+
+cache_logger = logger.bind(
+    service='I Was BORED|Market Cache',
+)
+
+MARKET_CACHE_POLL_INTERVAL = 2  # Seconds between new-block checks
+
+
+def _content_hash(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+class MarketSnapshot:
+    """
+    An immutable view of the active markets at one block.
+    """
+
+    def __init__(self, block_number: int, records: Dict):
+        self.block_number = block_number
+        self.fetched_at = time.time()
+        self.market_ids: List[str] = list(records)  # getActiveMarketIds order
+        self.markets: Dict[str, Dict] = {
+            market_id: record.to_dict() for market_id, record in records.items()
+        }
+        self.etags: Dict[str, str] = {
+            market_id: _content_hash(market) for market_id, market in self.markets.items()
+        }
+        # Covers ids and contents, so it only changes when some market changed
+        self.version = _content_hash([[market_id, self.etags[market_id]] for market_id in self.market_ids])
+
+
+class MarketSnapshotCache:
+    """
+    Keeps a `MarketSnapshot` refreshed once per new block.
+    """
+
+    def __init__(self, app_state, reader: Optional[MarketSnapshotReader] = None, poll_interval: Optional[float] = None):
+        self.app_state = app_state
+        self.reader = reader or MarketSnapshotReader(app_state)
+        self.poll_interval = poll_interval or float(
+            os.getenv('MARKET_CACHE_POLL_INTERVAL', MARKET_CACHE_POLL_INTERVAL),
+        )
+        self.snapshot: Optional[MarketSnapshot] = None
+        self._listeners: List[Callable[[Optional[MarketSnapshot], MarketSnapshot], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: Callable[[Optional[MarketSnapshot], MarketSnapshot], Awaitable[None]]):
+        """
+        Register a coroutine called with (previous, current) after every new snapshot.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Optional[MarketSnapshot], MarketSnapshot], Awaitable[None]]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def start(self):
+        """
+        Load the first snapshot and keep it fresh in the background.
+        """
+        try:
+            await self.refresh()
+        except Exception as e:
+            cache_logger.error(f'Initial market snapshot failed: {e}')
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self, block_number: Optional[int] = None):
+        """
+        Read every active market at `block_number` and swap in the new snapshot.
+        """
+        if block_number is None:
+            block_number = await self.app_state.w3.eth.block_number
+        market_ids = await self.reader.fetch_active_market_ids(block_identifier=block_number)
+        records = await self.reader.fetch_market_records(market_ids, block_identifier=block_number)
+        previous, self.snapshot = self.snapshot, MarketSnapshot(block_number, records)
+        cache_logger.debug(f'Market snapshot at block {block_number}: {len(records)} markets')
+
+        for listener in self._listeners:
+            try:
+                await listener(previous, self.snapshot)
+            except Exception as e:
+                cache_logger.error(f'Market snapshot listener failed: {e}')
+
+    async def _run(self):
+        while True:
+            try:
+                block_number = await self.app_state.w3.eth.block_number
+                if self.snapshot is None or block_number != self.snapshot.block_number:
+                    await self.refresh(block_number)
+            except Exception as e:
+                cache_logger.error(f'Market snapshot refresh failed: {e}')
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,181 @@
+"""
+Incremental event-log indexer for oracle markets.
+
+The indexer bootstraps once from a full market snapshot and from then on
+follows `MarketCreated`, `MarketResolved`, `BuyPosition` and `RedeemPosition`
+logs with `eth_getLogs`, advancing a block cursor in adaptive block ranges.
+Per-sync cost depends on the number of new events, not on the number of markets.
+"""
+import os
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from eth_utils import event_abi_to_log_topic
+
+from logger import logger
+from market_reader import MarketRecord
+from market_reader import MarketSnapshotReader
+
+indexer_logger = logger.bind(
+    service='I Was BORED|Market Indexer',
+)
+
+INDEXED_EVENTS = ('MarketCreated', 'MarketResolved', 'BuyPosition', 'RedeemPosition')
+INDEXER_BLOCK_RANGE = 2000
+INDEXER_MAX_BLOCK_RANGE = 10000
+
+
+class OracleEventLog:
+    """
+    Fetches and decodes oracle contract logs for a set of events.
+
+    Block ranges adapt to the provider: a rejected query halves the range and
+    each successful one doubles it again, up to INDEXER_MAX_BLOCK_RANGE.
+    """
+
+    def __init__(self, app_state, event_names=INDEXED_EVENTS):
+        self.app_state = app_state
+        self.event_names = event_names
+        self.block_range = int(os.getenv('INDEXER_BLOCK_RANGE', INDEXER_BLOCK_RANGE))
+        self.max_block_range = int(os.getenv('INDEXER_MAX_BLOCK_RANGE', INDEXER_MAX_BLOCK_RANGE))
+        self._events_by_topic = None
+
+    def _ensure_topics(self):
+        """
+        Map each followed event's topic0 to its contract event class.
+        """
+        if self._events_by_topic is None:
+            self._events_by_topic = {}
+            for item in self.app_state.oracle_abi:
+                if item.get('type') == 'event' and item['name'] in self.event_names:
+                    topic = '0x' + event_abi_to_log_topic(item).hex()
+                    self._events_by_topic[topic] = getattr(
+                        self.app_state.oracle_contract.events, item['name'],
+                    )()
+
+    async def _get_logs(self, from_block: int, to_block: int) -> List[Dict]:
+        return await self.app_state.w3.eth.get_logs({
+            'address': self.app_state.oracle_contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': [list(self._events_by_topic.keys())],
+        })
+
+    async def fetch(self, from_block: int, to_block: int) -> List[Dict]:
+        """
+        Fetch the decoded events between two blocks (inclusive), oldest first.
+        """
+        self._ensure_topics()
+        logs = []
+        while from_block <= to_block:
+            chunk_end = min(from_block + self.block_range - 1, to_block)
+            try:
+                logs.extend(await self._get_logs(from_block, chunk_end))
+            except Exception as e:
+                if self.block_range == 1:
+                    raise
+                self.block_range = max(1, self.block_range // 2)
+                indexer_logger.warning(
+                    f'eth_getLogs failed for {from_block}-{chunk_end}, '
+                    f'shrinking range to {self.block_range}: {e}',
+                )
+                continue
+
+            from_block = chunk_end + 1
+            self.block_range = min(self.block_range * 2, self.max_block_range)
+
+        events = []
+        for log in logs:
+            topic = '0x' + bytes(log['topics'][0]).hex()
+            events.append(self._events_by_topic[topic].process_log(log))
+        return events
+
+
+class MarketEventIndexer:
+    """
+    Keeps the set of active markets up to date from oracle contract events.
+    """
+
+    def __init__(self, app_state, market_reader: Optional[MarketSnapshotReader] = None):
+        self.app_state = app_state
+        self.market_reader = market_reader or MarketSnapshotReader(app_state)
+        self.markets: Dict[str, MarketRecord] = {}  # question_id -> MarketRecord
+        self.resolved_market_ids: Set[str] = set()
+        self.last_block: Optional[int] = None
+
+        self.confirmations = int(os.getenv('INDEXER_CONFIRMATIONS', 0))
+        self.event_log = OracleEventLog(app_state)
+
+    async def bootstrap(self):
+        """
+        Load every active market from a one-off snapshot and start the cursor there.
+        """
+        block_number = await self.app_state.w3.eth.block_number - self.confirmations
+        market_ids = await self.market_reader.fetch_active_market_ids(block_identifier=block_number)
+        self.markets = await self.market_reader.fetch_market_records(
+            market_ids, block_identifier=block_number,
+        )
+        self.last_block = block_number
+        indexer_logger.info(
+            f'Bootstrapped {len(self.markets)} markets at block {block_number}',
+        )
+
+    def restore(self, markets: Dict[str, MarketRecord], resolved_market_ids: Set[str], last_block: int):
+        """
+        Resume from saved state; the next sync only applies events after `last_block`.
+        """
+        self.markets = markets
+        self.resolved_market_ids = set(resolved_market_ids)
+        self.last_block = last_block
+        indexer_logger.info(
+            f'Restored {len(self.markets)} markets at block {last_block}',
+        )
+
+    async def sync(self) -> List[Dict]:
+        """
+        Apply all events since the last synced block.
+
+        Returns:
+            list: The decoded events that were applied, oldest first.
+        """
+        if self.last_block is None:
+            await self.bootstrap()
+            return []
+
+        head = await self.app_state.w3.eth.block_number - self.confirmations
+        if head <= self.last_block:
+            return []
+
+        # The cursor only moves once the events have been applied
+        events = await self.event_log.fetch(self.last_block + 1, head)
+
+        touched = {}
+        for event in events:
+            question_id = '0x' + event['args']['questionId'].hex()
+            if event['event'] == 'MarketResolved':
+                self.markets.pop(question_id, None)
+                self.resolved_market_ids.add(question_id)
+            else:
+                touched[question_id] = True
+
+        # Refresh only the markets touched by new events, in one batched read
+        touched = [
+            question_id for question_id in touched
+            if question_id not in self.resolved_market_ids
+        ]
+        if touched:
+            self.markets.update(
+                await self.market_reader.fetch_market_records(
+                    touched, block_identifier=head,
+                ),
+            )
+        self.last_block = head
+
+        if events:
+            indexer_logger.info(
+                f'Applied {len(events)} events up to block {self.last_block}, '
+                f'tracking {len(self.markets)} markets',
+            )
+        return events
@@ -4,22 +4,34 @@ Script to fetch active market IDs, monitor end timestamps, and resolve expired m
 """
 import asyncio
 import logging
-import json
-import base64
 import os
 import time
-from datetime import datetime, timedelta
 from typing import List, Dict
 
-import aiohttp
 from dotenv import load_dotenv
 
 from app_state import AppState
+from expiry_scheduler import ExpiryScheduler
+from http_session import HttpSessionManager
+from market_indexer import MarketEventIndexer
+from market_reader import MarketRecord
+from logger import InterceptHandler
+from market_reader import MarketSnapshotReader
+from metrics import MONITOR_BACKLOG
+from metrics import MONITOR_CYCLE_DURATION
+from metrics import MONITOR_RESOLUTIONS
+from metrics import start_metrics_server
+from monitor_store import MonitorStateStore
+from pyth_client import PythPriceClient
+from resolution_pipeline import PipelineResult
+from resolution_pipeline import PipelineStage
+from resolution_pipeline import ResolutionPipeline
+from tracing import tracer
 
-# Configure logging
+# Route logging through the queued loguru pipeline, so log writes never block the loop
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    handlers=[InterceptHandler()],
 )
 logger = logging.getLogger(__name__)
 
@@ -27,22 +39,56 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # Constants
-CHECK_INTERVAL = 300  # Check every minute
+CHECK_INTERVAL = 300  # Longest sleep when no market is due sooner
+SYNC_INTERVAL = 12  # Poll for new market events about once per block
 RESOLVE_DELAY = 0 
+RESOLVE_RETRY_DELAY = 30  # Retry a failed resolution after this many seconds
+RESOLVE_FETCH_CONCURRENCY = int(os.getenv('RESOLVE_FETCH_CONCURRENCY', 4))
+RESOLVE_SUBMIT_CONCURRENCY = int(os.getenv('RESOLVE_SUBMIT_CONCURRENCY', 8))
+RESOLVE_CONFIRM_CONCURRENCY = int(os.getenv('RESOLVE_CONFIRM_CONCURRENCY', 16))
+CONFIRM_POLL_INTERVAL = 4  # Seconds between job status checks
+RESOLVE_STAGE_TIMEOUT = int(os.getenv('RESOLVE_STAGE_TIMEOUT', 180))  # Seconds per stage per market
+MONITOR_METRICS_PORT = int(os.getenv('MONITOR_METRICS_PORT', 9101))  # 0 disables the /metrics server
 AUTH_TOKEN = "iwasbored"
 
 
 class MarketMonitor:
     def __init__(self):
         self.app_state = AppState()
-        self.active_markets = {}  # question_id -> {'end_timestamp': int, 'fpmm_address': str}
+        self.market_reader = MarketSnapshotReader(self.app_state)
+        self.indexer = MarketEventIndexer(self.app_state, self.market_reader)
+        self.scheduler = ExpiryScheduler()
+        self.store = MonitorStateStore()
+        self.http_sessions = HttpSessionManager()
+        self.pyth_client = PythPriceClient(session_manager=self.http_sessions)
+        self.resolution_pipeline = ResolutionPipeline([
+            PipelineStage('fetch_price_data', self._fetch_resolution_data, RESOLVE_FETCH_CONCURRENCY, RESOLVE_STAGE_TIMEOUT),
+            PipelineStage('submit', self._submit_resolution, RESOLVE_SUBMIT_CONCURRENCY, RESOLVE_STAGE_TIMEOUT),
+            PipelineStage('confirm', self._confirm_resolution, RESOLVE_CONFIRM_CONCURRENCY, RESOLVE_STAGE_TIMEOUT),
+        ], on_result=self._on_resolution_result)
+        self.active_markets: Dict[str, MarketRecord] = {}  # question_id -> MarketRecord
         self.resolved_markets = set()
         self.last_check_time = 0
+        self.metrics_server = None
 
     async def initialize(self):
         """Initialize the market monitor"""
         logger.info("🚀 Initializing market monitor...")
-        await self.app_state.initialize()
+        # Resolutions are submitted through the backend, so only the chain reader is needed
+        await self.app_state.initialize_reader()
+        await self.http_sessions.start()
+        await self.resolution_pipeline.start()
+        self.app_state.register_metrics()
+        tracer.configure('iwasbored-monitor')
+        if MONITOR_METRICS_PORT:
+            self.metrics_server = await start_metrics_server('0.0.0.0', MONITOR_METRICS_PORT)
+            logger.info(f"📏 Serving metrics on port {MONITOR_METRICS_PORT}")
+        
+        # Warm restart: resume from the saved markets and block instead of re-reading everything
+        state = await self.store.open()
+        if state.last_block is not None:
+            self.indexer.restore(state.markets, state.resolved_market_ids, state.last_block)
+            self.resolved_markets = set(state.resolved_market_ids)
         logger.info("✅ Market monitor initialized successfully")
 
     async def fetch_active_market_ids(self) -> List[str]:
@@ -50,12 +96,7 @@ class MarketMonitor:
         logger.info("📊 Fetching active market IDs...")
         
         try:
-            # Get the number of active markets
-            market_count = await self.app_state.oracle_contract.functions.getActiveMarketIds().call()
-            logger.info(f"Found {len(market_count)} active market IDs")
-            
-            # Filter out None/empty values
-            valid_markets = ['0x'+market.hex() for market in market_count if market]
+            valid_markets = await self.market_reader.fetch_active_market_ids()
             logger.info(f"Valid active markets: {len(valid_markets)}")
             
             return valid_markets
@@ -63,188 +104,225 @@ class MarketMonitor:
             logger.error(f"❌ Failed to fetch active market IDs: {e}")
             return []
 
-    async def get_market_data(self, market_id: str) -> Dict:
+    async def get_market_data(self, market_id: str) -> MarketRecord:
         """Get detailed market data for a specific market"""
         try:
-            market_data = await self.app_state.oracle_contract.functions.getMarketData(market_id).call()
-            return market_data
+            records = await self.market_reader.fetch_market_records([market_id])
+            return records.get(market_id)
         except Exception as e:
             logger.error(f"❌ Failed to get market data for {market_id}: {e}")
             return None
 
-    async def resolve_expired_market(self, market_id: str, market_data: Dict):
-        """Resolve an expired market using the /resolveMarket backend endpoint"""
+    async def _fetch_resolution_data(self, market: MarketRecord, _=None) -> List[str]:
+        """Pipeline stage: fetch the Pyth price update data for a market"""
+        price_update_data = await self._get_pyth_update_data(market.price_feed_id)
+        if not price_update_data:
+            raise Exception(f"Failed to get Pyth data for market {market.question_id}")
+        return price_update_data
+
+    async def _submit_resolution(self, market: MarketRecord, price_update_data: List[str]) -> Dict:
+        """Pipeline stage: submit the resolution through the backend /resolveMarket endpoint"""
+        # Get current time for answer CID
+        answer_cid = f"resolved-{int(time.time())}"
+        
+        # Use backend /resolveMarket endpoint
+        backend_url = os.getenv('BACKEND_URL', 'http://localhost:8000/resolveMarket')
+        
+        payload = {
+            "question_id": market.question_id,
+            "price_update_data": price_update_data,
+            "answer_cid": answer_cid,
+            "value": 10000000000,
+            "auth_token": AUTH_TOKEN
+        }
+        
+        logger.info(f"📡 Calling backend /resolveMarket endpoint for market {market.question_id}")
+        
+        session = await self.http_sessions.get_session()
+        # The traceparent header links the backend's spans to this market's resolution trace
+        headers = tracer.inject({'Content-Type': 'application/json'})
+        
+        # Return as soon as the transaction is sent; the confirm stage tracks the receipt
+        async with session.post(backend_url, json=payload, headers=headers, params={'wait': 'false'}) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"Backend call failed: {response.status} - {error_text}")
+            result = await response.json()
+        
+        if not result.get('info', {}).get('success', False):
+            raise Exception(f"Backend resolution failed for market {market.question_id}: {result}")
+        return result
+
+    async def _confirm_resolution(self, market: MarketRecord, result: Dict) -> Dict:
+        """Pipeline stage: poll the backend job status until the resolution is confirmed"""
+        job_id = result['job']['job_id']
+        backend_url = os.getenv('BACKEND_URL', 'http://localhost:8000/resolveMarket')
+        job_url = f"{backend_url.rsplit('/', 1)[0]}/jobs/{job_id}"
+        session = await self.http_sessions.get_session()
+        
+        while True:
+            async with session.get(job_url, headers=tracer.inject()) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(f"Job status call failed: {response.status} - {error_text}")
+                job = (await response.json())['job']
+            
+            if job['status'] == 'confirmed':
+                logger.info(f"✅ Successfully resolved market {market.question_id} via backend")
+                logger.info(f"Job: {job}")
+                return job
+            if job['status'] == 'failed':
+                raise Exception(f"Resolution tx {job['tx_hash']} failed for market {market.question_id}: {job['error']}")
+            # 'pending' and 'unknown' (no receipt yet, may still be mined) are not final
+            await asyncio.sleep(CONFIRM_POLL_INTERVAL)
+
+    async def resolve_expired_market(self, market_id: str, market: MarketRecord):
+        """Resolve a single expired market using the /resolveMarket backend endpoint"""
         logger.info(f"🔍 Attempting to resolve expired market: {market_id}")
         
         try:
-            # Get Pyth price feed data
-            price_feed_id = '0x' + market_data[0][3].hex()  # priceFeedId from questionData
-            price_update_data = await self._get_pyth_update_data(price_feed_id)
-            
-            if not price_update_data:
-                logger.error(f"❌ Failed to get Pyth data for market {market_id}")
-                return False
-            
-            # Get current time for answer CID
-            answer_cid = f"resolved-{int(time.time())}"
-            
-            # Use backend /resolveMarket endpoint
-            backend_url = os.getenv('BACKEND_URL', 'http://localhost:8000/resolveMarket')
-            
-            payload = {
-                "question_id": market_id,
-                "price_update_data": price_update_data,
-                "answer_cid": answer_cid,
-                "value": 10000000000,
-                "auth_token": AUTH_TOKEN
-            }
-            
-            logger.info(f"📡 Calling backend /resolveMarket endpoint for market {market_id}")
-            
-            async with aiohttp.ClientSession() as session:
-                headers = {'Content-Type': 'application/json'}
-                
-                async with session.post(backend_url, json=payload, headers=headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get('info', {}).get('success', False):
-                            logger.info(f"✅ Successfully resolved market {market_id} via backend")
-                            logger.info(f"Response: {result}")
-                            return True
-                        else:
-                            logger.error(f"❌ Backend resolution failed for market {market_id}: {result}")
-                            return False
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"❌ Backend call failed: {response.status} - {error_text}")
-                        return False
-            
+            price_update_data = await self._fetch_resolution_data(market)
+            result = await self._submit_resolution(market, price_update_data)
+            await self._confirm_resolution(market, result)
+            return True
         except Exception as e:
             logger.error(f"❌ Failed to resolve market {market_id}: {e}")
             return False
 
     async def _get_pyth_update_data(self, price_feed_id: str) -> List[str]:
-        """Get Pyth update data from the Hermes API"""
-        url = f"https://hermes.pyth.network/api/latest_vaas?ids[]={price_feed_id}"
-        
-        logger.info(f"Fetching Pyth data from: {url}")
-        
+        """Get Pyth update data from the shared, cached Hermes client"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.text()
-                        parsed = json.loads(data)
-                        price_update_data = ['0x' + base64.b64decode(d).hex() for d in parsed]
-                        logger.info(f"✅ Pyth data retrieved for {price_feed_id}")
-                        return price_update_data
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"❌ Failed to fetch Pyth data: {response.status} - {error_text}")
-                        return None
+            price_update_data = await self.pyth_client.get_price_update_data([price_feed_id])
+            logger.info(f"✅ Pyth data retrieved for {price_feed_id}")
+            return price_update_data
         except Exception as e:
             logger.error(f"❌ Error fetching Pyth update data: {e}")
             return None
 
     async def update_active_markets(self):
-        """Update the list of active markets and their end timestamps"""
+        """Sync market events and schedule the expiry of new or changed markets"""
         current_time = int(time.time())
-        logger.info(f"⏰ Updating active markets at {datetime.fromtimestamp(current_time)}")
-        
-        # Fetch current active market IDs
-        active_market_ids = await self.fetch_active_market_ids()
+        started = time.perf_counter()
         
-        # Update our local tracking
-        new_markets = {}
-        
-        for market_id in active_market_ids:
-            try:
-                market_data = await self.get_market_data(market_id)
-                
-                if market_data:
-                    end_timestamp = market_data[0][1]  # endTimestamp from questionData
-                    fpmm_address = market_data[0][2]   # fpmm address from questionData
-                    
-                    new_markets[market_id] = {
-                        'end_timestamp': end_timestamp,
-                        'fpmm_address': fpmm_address
-                    }
-                    
-                    # Log market info
-                    current_status = "EXPIRED" if end_timestamp < current_time else "ACTIVE"
-                    logger.info(f"📊 Market {market_id}: {current_status} - Ends in {end_timestamp - current_time} seconds")
-                    
-            except Exception as e:
-                logger.error(f"❌ Failed to process market {market_id}: {e}")
+        # Apply new oracle events; only markets touched since the last cycle are re-read
+        try:
+            events = await self.indexer.sync()
+        except Exception as e:
+            logger.error(f"❌ Failed to sync market events: {e}")
+            return
         
-        # Update our tracking
-        self.active_markets = new_markets
+        event_ids = list(dict.fromkeys('0x' + event['args']['questionId'].hex() for event in events))
+        if self.last_check_time == 0:
+            # First sync bootstraps (or restores) every active market
+            touched_ids = list(dict.fromkeys(list(self.indexer.markets) + event_ids))
+        else:
+            touched_ids = event_ids
+        self.last_check_time = current_time
+        self.active_markets = self.indexer.markets
         
-        # Log summary
-        logger.info(f"📈 Tracking {len(self.active_markets)} active markets")
+        # Buffer the changes for the next batched write, together with the block they reach
+        for market_id in touched_ids:
+            if market_id in self.active_markets:
+                self.store.save_market(self.active_markets[market_id])
+            else:
+                self.store.remove_market(market_id)
+        self.store.set_last_block(self.indexer.last_block)
         
-        # Find expired markets
-        expired_markets = []
-        for market_id, market_info in self.active_markets.items():
-            if (market_info['end_timestamp'] < current_time and 
-                market_id not in self.resolved_markets):
-                expired_markets.append((market_id, market_info))
+        for market_id in touched_ids:
+            market = self.active_markets.get(market_id)
+            if market is None or market.is_resolved or market_id in self.resolved_markets:
+                self.scheduler.discard(market_id)
+                continue
+            
+            # Log market info
+            current_status = "EXPIRED" if market.has_expired(current_time) else "ACTIVE"
+            logger.debug(f"📊 Market {market_id}: {current_status} - Ends in {market.end_timestamp - current_time} seconds")
+            self.scheduler.schedule(market_id, market.end_timestamp + RESOLVE_DELAY)
         
-        return expired_markets
+        if touched_ids:
+            logger.info(f"📈 Tracking {len(self.active_markets)} active markets, {len(self.scheduler)} awaiting resolution")
+        MONITOR_BACKLOG.labels('tracked').set(len(self.active_markets))
+        MONITOR_BACKLOG.labels('scheduled').set(len(self.scheduler))
+        MONITOR_CYCLE_DURATION.labels('sync').observe(time.perf_counter() - started)
 
     async def check_and_resolve_expired_markets(self):
-        """Check for expired markets and resolve them"""
-        logger.info("🔍 Checking for expired markets...")
-        
-        expired_markets = await self.update_active_markets()
-        
-        if not expired_markets:
-            logger.info("✅ No expired markets found")
-            return
-        
-        logger.info(f"🚨 Found {len(expired_markets)} expired markets")
+        """Feed the markets whose resolution time has passed into the running pipeline"""
+        current_time = int(time.time())
+        queued = 0
+        for market_id in self.scheduler.pop_due(current_time):
+            market = self.active_markets.get(market_id)
+            # A BuyPosition during a resolution reschedules the market; it is already on its way
+            if market is None or market_id in self.resolved_markets or market_id in self.resolution_pipeline:
+                continue
+            self.resolution_pipeline.submit(market)
+            queued += 1
         
-        for market_id, market_info in expired_markets:
-            resolution_time = market_info['end_timestamp'] + RESOLVE_DELAY
-            current_time = int(time.time())
-            
-            if current_time >= resolution_time:
-                logger.info(f"🎯 Market {market_id} is ready for resolution")
-                
-                try:
-                    market_data = await self.get_market_data(market_id)
-                    if market_data and await self.resolve_expired_market(market_id, market_data):
-                        self.resolved_markets.add(market_id)
-                        logger.info(f"✅ Successfully resolved market {market_id}")
-                except Exception as e:
-                    logger.error(f"❌ Failed to resolve market {market_id}: {e}")
-            else:
-                time_until_resolution = resolution_time - current_time
-                minutes_until = time_until_resolution // 60
-                logger.info(f"⏰ Market {market_id} expires in {minutes_until} minutes")
+        if queued:
+            logger.info(f"🚨 Queued {queued} expired markets, {len(self.resolution_pipeline)} resolving")
+        MONITOR_BACKLOG.labels('resolving').set(len(self.resolution_pipeline))
+        MONITOR_BACKLOG.labels('scheduled').set(len(self.scheduler))
 
-    async def run_continuously(self):
-        """Run the market monitor continuously"""
-        logger.info(f"🔄 Starting continuous market monitoring every {CHECK_INTERVAL} seconds...")
-        
+    def _on_resolution_result(self, result: PipelineResult):
+        """Record a finished resolution, or schedule a retry if it failed"""
+        MONITOR_RESOLUTIONS.labels('success' if result.success else 'failed').inc()
+        MONITOR_CYCLE_DURATION.labels('resolve').observe(sum(result.timings.values()))
+        self.store.record_attempt(
+            result.question_id, result.success, result.failed_stage,
+            tx_hash=result.value.get('tx_hash') if result.success else None,
+            error=str(result.error) if result.error else None,
+        )
+        if result.success:
+            self.resolved_markets.add(result.question_id)
+            self.store.mark_resolved(result.question_id)
+            self.scheduler.discard(result.question_id)
+        else:
+            logger.error(f"❌ Failed to resolve market {result.question_id} at {result.failed_stage}: {result.error}")
+            self.scheduler.schedule(result.question_id, int(time.time()) + RESOLVE_RETRY_DELAY)
+        MONITOR_BACKLOG.labels('resolving').set(len(self.resolution_pipeline))
+        MONITOR_BACKLOG.labels('scheduled').set(len(self.scheduler))
+
+    async def _sync_continuously(self):
+        """Poll for new market events; new deadlines wake the resolver early"""
         while True:
             try:
-                logger.info(f"⏰ Running market check at {datetime.now()}")
-                await self.check_and_resolve_expired_markets()
-                logger.info(f"💤 Waiting {CHECK_INTERVAL/60} minutes before next check...")
-                await asyncio.sleep(CHECK_INTERVAL)
-            except KeyboardInterrupt:
-                logger.info("👋 Market monitor interrupted by user")
-                break
+                await self.update_active_markets()
             except Exception as e:
-                logger.error(f"❌ Error in continuous execution: {e}")
-                # Wait before retrying to avoid spamming on errors
-                await asyncio.sleep(CHECK_INTERVAL)
+                logger.error(f"❌ Error syncing markets: {e}")
+            await asyncio.sleep(SYNC_INTERVAL)
+
+    async def run_continuously(self):
+        """Run the market monitor continuously"""
+        logger.info(f"🔄 Starting deadline-driven market monitoring, syncing events every {SYNC_INTERVAL} seconds...")
+        
+        await self.update_active_markets()
+        sync_task = asyncio.create_task(self._sync_continuously())
+        try:
+            while True:
+                try:
+                    await self.check_and_resolve_expired_markets()
+                    # Sleep until the next deadline, or until an earlier market is scheduled
+                    await self.scheduler.wait(CHECK_INTERVAL)
+                except KeyboardInterrupt:
+                    logger.info("👋 Market monitor interrupted by user")
+                    break
+                except Exception as e:
+                    logger.error(f"❌ Error in continuous execution: {e}")
+                    # Wait before retrying to avoid spamming on errors
+                    await asyncio.sleep(SYNC_INTERVAL)
+        finally:
+            sync_task.cancel()
 
     async def cleanup(self):
         """Clean up resources"""
         logger.info("🧹 Cleaning up market monitor...")
+        await self.resolution_pipeline.stop()
+        await self.pyth_client.close()
+        await self.http_sessions.close()
+        await self.store.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.cleanup()
         await self.app_state.cleanup()
+        tracer.shutdown()
 
 
 async def main():
@@ -264,8 +342,6 @@ async def main():
 
 
 if __name__ == "__main__":
-    import base64  # Add for base64 decoding
-    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,305 @@
+"""
+Batched market snapshot reads through a Multicall3 aggregate contract.
+
+Instead of issuing one `getMarketData` eth_call per market, the reader packs
+many calls into a single `aggregate3` call and decodes the results into
+`MarketRecord` objects that the monitor and the resolver can share.
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from eth_utils import to_checksum_address
+from eth_utils.abi import collapse_if_tuple
+
+from logger import logger
+
+reader_logger = logger.bind(
+    service='I Was BORED|Market Reader',
+)
+
+# Multicall3 is deployed at the same address on Sepolia and most EVM chains
+# ref: https://github.com/mds1/multicall
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+MULTICALL_CHUNK_SIZE = 100
+
+MULTICALL3_ABI = [
+    {
+        'inputs': [
+            {
+                'components': [
+                    {'internalType': 'address', 'name': 'target', 'type': 'address'},
+                    {'internalType': 'bool', 'name': 'allowFailure', 'type': 'bool'},
+                    {'internalType': 'bytes', 'name': 'callData', 'type': 'bytes'},
+                ],
+                'internalType': 'struct Multicall3.Call3[]',
+                'name': 'calls',
+                'type': 'tuple[]',
+            },
+        ],
+        'name': 'aggregate3',
+        'outputs': [
+            {
+                'components': [
+                    {'internalType': 'bool', 'name': 'success', 'type': 'bool'},
+                    {'internalType': 'bytes', 'name': 'returnData', 'type': 'bytes'},
+                ],
+                'internalType': 'struct Multicall3.Result[]',
+                'name': 'returnData',
+                'type': 'tuple[]',
+            },
+        ],
+        'stateMutability': 'payable',
+        'type': 'function',
+    },
+]
+
+
+@dataclass
+class MarketRecord:
+    """
+    Typed view of the `MarketData` struct returned by `getMarketData`.
+    """
+    question_id: str
+    begin_timestamp: int
+    end_timestamp: int
+    fpmm_address: str
+    price_feed_id: str
+    condition_id: str
+    initial_price: int
+    final_price: int
+    final_price_timestamp: int
+    answer_timestamp: int
+    answer_cid: str
+    unique_buys: int
+    payouts: List[int] = field(default_factory=list)
+    probabilities: List[int] = field(default_factory=list)
+    buy_amounts: List[int] = field(default_factory=list)
+
+    @property
+    def is_resolved(self) -> bool:
+        """Mirrors `getDetailedMarketData`: a market is resolved once answered."""
+        return self.answer_timestamp > 0
+
+    def has_expired(self, now: int) -> bool:
+        return self.end_timestamp < now
+
+    def to_dict(self) -> Dict:
+        """
+        JSON-ready view of the record.
+
+        Wei amounts are returned as strings since they exceed the integers
+        JavaScript clients can represent exactly.
+        """
+        return {
+            'question_id': self.question_id,
+            'begin_timestamp': self.begin_timestamp,
+            'end_timestamp': self.end_timestamp,
+            'fpmm_address': self.fpmm_address,
+            'price_feed_id': self.price_feed_id,
+            'condition_id': self.condition_id,
+            'initial_price': self.initial_price,
+            'final_price': self.final_price,
+            'final_price_timestamp': self.final_price_timestamp,
+            'answer_timestamp': self.answer_timestamp,
+            'answer_cid': self.answer_cid,
+            'unique_buys': self.unique_buys,
+            'payouts': [str(payout) for payout in self.payouts],
+            'probabilities': [str(probability) for probability in self.probabilities],
+            'buy_amounts': [str(amount) for amount in self.buy_amounts],
+            'is_resolved': self.is_resolved,
+        }
+
+    @classmethod
+    def from_market_data(cls, question_id: str, market_data) -> 'MarketRecord':
+        """
+        Build a record from the decoded `getMarketData` tuple.
+
+        Args:
+            question_id (str): The 0x-prefixed question id.
+            market_data (tuple): (questionData, answerData, uniqueBuys, probabilities, buyAmounts)
+
+        Returns:
+            MarketRecord: The typed market record.
+        """
+        question_data, answer_data, unique_buys, probabilities, buy_amounts = market_data
+        (
+            begin_timestamp, end_timestamp, fpmm_address, price_feed_id,
+            condition_id, initial_price, final_price, final_price_timestamp,
+        ) = question_data
+        payouts, answer_timestamp, answer_cid = answer_data
+
+        return cls(
+            question_id=question_id,
+            begin_timestamp=begin_timestamp,
+            end_timestamp=end_timestamp,
+            fpmm_address=to_checksum_address(fpmm_address),
+            price_feed_id='0x' + bytes(price_feed_id).hex(),
+            condition_id='0x' + bytes(condition_id).hex(),
+            initial_price=initial_price,
+            final_price=final_price,
+            final_price_timestamp=final_price_timestamp,
+            answer_timestamp=answer_timestamp,
+            answer_cid=answer_cid,
+            unique_buys=unique_buys,
+            payouts=list(payouts),
+            probabilities=list(probabilities),
+            buy_amounts=list(buy_amounts),
+        )
+
+
+class MarketSnapshotReader:
+    """
+    Reads market snapshots for many markets in a handful of aggregated calls.
+    """
+
+    def __init__(self, app_state, chunk_size: Optional[int] = None, multicall_address: Optional[str] = None):
+        self.app_state = app_state
+        self.chunk_size = chunk_size or int(
+            os.getenv('MULTICALL_CHUNK_SIZE', MULTICALL_CHUNK_SIZE),
+        )
+        self.multicall_address = multicall_address or os.getenv(
+            'MULTICALL_ADDRESS', MULTICALL3_ADDRESS,
+        )
+        self._multicall = None
+        self._output_types: Dict[str, List[str]] = {}  # oracle function name -> output types
+
+    def _ensure_contracts(self):
+        """
+        Lazily build the multicall contract.
+        """
+        if self._multicall is None:
+            w3 = self.app_state.w3
+            self._multicall = w3.eth.contract(
+                address=w3.to_checksum_address(self.multicall_address),
+                abi=MULTICALL3_ABI,
+            )
+
+    def _function_output_types(self, fn_name: str) -> List[str]:
+        if fn_name not in self._output_types:
+            fn_abi = next(
+                item for item in self.app_state.oracle_abi
+                if item.get('type') == 'function' and item.get('name') == fn_name
+            )
+            self._output_types[fn_name] = [collapse_if_tuple(output) for output in fn_abi['outputs']]
+        return self._output_types[fn_name]
+
+    async def fetch_active_market_ids(self, block_identifier='latest') -> List[str]:
+        """
+        Fetch all active market ids from the oracle contract.
+
+        Returns:
+            list: 0x-prefixed question ids.
+        """
+        market_ids = await self.app_state.oracle_contract.functions.getActiveMarketIds().call(
+            block_identifier=block_identifier,
+        )
+        return ['0x' + market_id.hex() for market_id in market_ids if market_id]
+
+    async def _aggregate_chunk(self, fn_name: str, args_list: List[list], block_identifier) -> List[Optional[tuple]]:
+        oracle = self.app_state.oracle_contract
+        calls = [
+            (oracle.address, True, oracle.encodeABI(fn_name=fn_name, args=args))
+            for args in args_list
+        ]
+        results = await self._multicall.functions.aggregate3(calls).call(
+            block_identifier=block_identifier,
+        )
+
+        output_types = self._function_output_types(fn_name)
+        return [
+            self.app_state.w3.codec.decode(output_types, return_data) if success else None
+            for success, return_data in results
+        ]
+
+    async def aggregate(self, fn_name: str, args_list: List[list], block_identifier='latest') -> List[Optional[tuple]]:
+        """
+        Call an oracle view function once per argument list, `chunk_size` calls per aggregated call.
+
+        Args:
+            fn_name (str): The oracle view function.
+            args_list (list): The arguments of each call.
+            block_identifier: Block to read at, so every chunk sees the same state.
+
+        Returns:
+            list: The decoded outputs of each call, or None where the call reverted.
+        """
+        if not args_list:
+            return []
+        self._ensure_contracts()
+
+        chunks = [
+            args_list[i:i + self.chunk_size]
+            for i in range(0, len(args_list), self.chunk_size)
+        ]
+        results = await asyncio.gather(
+            *[self._aggregate_chunk(fn_name, chunk, block_identifier) for chunk in chunks],
+        )
+        return [output for chunk_outputs in results for output in chunk_outputs]
+
+    async def fetch_market_records(
+        self, market_ids: List[str], block_identifier='latest',
+    ) -> Dict[str, MarketRecord]:
+        """
+        Fetch market records for the given ids in aggregated `getMarketData` calls.
+
+        Args:
+            market_ids (list): 0x-prefixed question ids.
+            block_identifier: Block to read at, so every chunk sees the same state.
+
+        Returns:
+            dict: question_id -> MarketRecord. Markets whose call reverted are omitted.
+        """
+        outputs = await self.aggregate(
+            'getMarketData', [[market_id] for market_id in market_ids], block_identifier,
+        )
+
+        records = {}
+        for market_id, output in zip(market_ids, outputs):
+            if output is None:
+                reader_logger.warning(f'getMarketData reverted for {market_id}')
+                continue
+            (market_data,) = output
+            records[market_id] = MarketRecord.from_market_data(market_id, market_data)
+        return records
+
+    async def fetch_position_balances(
+        self, market_ids: List[str], holder: str, index_sets: List[int], block_identifier='latest',
+    ) -> Dict[str, List[int]]:
+        """
+        Fetch `holder`'s outcome token balances in aggregated `getPositionBalances` calls.
+
+        Args:
+            market_ids (list): 0x-prefixed question ids.
+            holder (str): The position holder's address.
+            index_sets (list): Outcome index sets to read balances for.
+            block_identifier: Block to read at.
+
+        Returns:
+            dict: question_id -> balance per index set. Markets whose call reverted are omitted.
+        """
+        outputs = await self.aggregate(
+            'getPositionBalances',
+            [[market_id, index_sets, holder] for market_id in market_ids],
+            block_identifier,
+        )
+        return {
+            market_id: list(output[0])
+            for market_id, output in zip(market_ids, outputs)
+            if output is not None
+        }
+
+    async def fetch_snapshot(self) -> Dict[str, MarketRecord]:
+        """
+        Fetch the active market ids and all of their records pinned to one block.
+
+        Returns:
+            dict: question_id -> MarketRecord for every active market.
+        """
+        block_number = await self.app_state.w3.eth.block_number
+        market_ids = await self.fetch_active_market_ids(block_identifier=block_number)
+        return await self.fetch_market_records(market_ids, block_identifier=block_number)
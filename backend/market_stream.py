@@ -0,0 +1,156 @@
+"""
+Push stream of per-market changes.
+
+After every new market snapshot the changes since the previous snapshot are
+computed once, serialized once and fanned out to every subscriber's queue,
+so the cost per block does not depend on how many clients are connected.
+Subscribers that fall too far behind are disconnected and are expected to
+reconnect and re-read `/markets`.
+"""
+import asyncio
+import json
+import os
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from logger import logger
+from market_cache import MarketSnapshot
+
+stream_logger = logger.bind(
+    service='I Was BORED|Market Stream',
+)
+
+STREAM_QUEUE_SIZE = 32  # Undelivered updates kept per subscriber before it is dropped
+STREAM_KEEPALIVE_INTERVAL = 15  # Seconds between keepalives on an idle stream
+
+# Market fields that change while a market is live
+STREAM_FIELDS = ('probabilities', 'buy_amounts', 'unique_buys', 'is_resolved')
+
+
+class MarketUpdate:
+    """
+    One block's market changes, serialized once for every subscriber.
+    """
+
+    def __init__(self, block_number: int, changes: List[Dict]):
+        self.block_number = block_number
+        self.json = json.dumps({'block_number': block_number, 'markets': changes}, separators=(',', ':'))
+        self.sse = f'id: {block_number}\nevent: markets\ndata: {self.json}\n\n'
+
+
+def diff_snapshots(previous: Optional[MarketSnapshot], current: MarketSnapshot) -> List[Dict]:
+    """
+    Compute compact per-market changes between two snapshots.
+
+    Returns:
+        list: One entry per changed market with only the changed fields; new
+            markets carry the full market and removed ones `removed: true`.
+    """
+    previous_markets = previous.markets if previous is not None else {}
+    changes = []
+    for market_id in current.market_ids:
+        if previous is not None and current.etags[market_id] == previous.etags.get(market_id):
+            continue
+        market = current.markets[market_id]
+        before = previous_markets.get(market_id)
+        if before is None:
+            changes.append({'question_id': market_id, 'market': market})
+            continue
+        changed = {name: market[name] for name in STREAM_FIELDS if market[name] != before[name]}
+        if changed:
+            changes.append({'question_id': market_id, **changed})
+
+    for market_id in previous_markets:
+        if market_id not in current.markets:
+            changes.append({'question_id': market_id, 'removed': True})
+    return changes
+
+
+class MarketStreamSubscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def updates(self, keepalive_interval: float):
+        """
+        Yield updates as they arrive, or None after `keepalive_interval` idle seconds.
+
+        Stops when the broadcaster drops the subscriber.
+        """
+        while True:
+            try:
+                update = await asyncio.wait_for(self.queue.get(), keepalive_interval)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if update is None:
+                return
+            yield update
+
+
+class MarketUpdateBroadcaster:
+    """
+    Fans out snapshot diffs to all stream subscribers.
+    """
+
+    def __init__(self, queue_size: Optional[int] = None, keepalive_interval: Optional[float] = None):
+        self.queue_size = queue_size or int(os.getenv('STREAM_QUEUE_SIZE', STREAM_QUEUE_SIZE))
+        self.keepalive_interval = keepalive_interval or float(
+            os.getenv('STREAM_KEEPALIVE_INTERVAL', STREAM_KEEPALIVE_INTERVAL),
+        )
+        self.subscribers: Set[MarketStreamSubscriber] = set()
+        self.stats = {'updates': 0, 'delivered': 0, 'dropped_subscribers': 0}
+
+    def subscribe(self) -> MarketStreamSubscriber:
+        subscriber = MarketStreamSubscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: MarketStreamSubscriber):
+        self.subscribers.discard(subscriber)
+
+    def _drop(self, subscriber: MarketStreamSubscriber):
+        # Free the queue so the end-of-stream marker fits
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+        self.subscribers.discard(subscriber)
+        self.stats['dropped_subscribers'] += 1
+
+    def close(self):
+        """
+        End every open stream, e.g. on shutdown, after the updates already queued for it.
+        """
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+            self.subscribers.discard(subscriber)
+
+    def publish(self, update: MarketUpdate):
+        """
+        Queue `update` for every subscriber without waiting on any of them.
+        """
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(update)
+                self.stats['delivered'] += 1
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+        self.stats['updates'] += 1
+
+    async def on_snapshot(self, previous: Optional[MarketSnapshot], snapshot: MarketSnapshot):
+        """
+        Publish the changes between two snapshots; the first snapshot is not published.
+        """
+        if previous is None or previous.version == snapshot.version:
+            return
+        changes = diff_snapshots(previous, snapshot)
+        if changes:
+            self.publish(MarketUpdate(snapshot.block_number, changes))
+            stream_logger.debug(
+                f'Published {len(changes)} market changes at block {snapshot.block_number} '
+                f'to {len(self.subscribers)} subscribers',
+            )
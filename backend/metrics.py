@@ -0,0 +1,345 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are plain Python objects updated in place:
+recording a value is a dict lookup and a couple of additions (a bisect for
+histograms), with no locks, I/O or allocation on the hot path, so the metrics
+stay on in production. The text is only rendered when `/metrics` is scraped.
+Gauges that mirror state kept elsewhere (limiters, caches, queues) are read by
+callbacks at scrape time instead of being updated on every change.
+"""
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; from sub-millisecond cache hits up to slow RPCs
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Seconds; from one block up to the receipt timeout
+CONFIRMATION_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        Return the child for one combination of label values, creating it on first use.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}, got {values}')
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+            *self._samples(),
+        ]
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def _samples(self):
+        for values, child in self._children.items():
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._children[()].dec(amount)
+
+    def _samples(self):
+        for values, child in self._children.items():
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}'
+
+
+class CallbackGauge(_Metric):
+    """
+    Gauge whose samples are read from `callback` at scrape time.
+
+    The callback returns (label values, value) pairs; it replaces any earlier one.
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.callback: Optional[Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]] = None
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return None
+
+    def set_callback(self, callback: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self.callback = callback
+
+    def _samples(self):
+        if self.callback is None:
+            return
+        for values, value in self.callback():
+            if value is not None:
+                yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}'
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Per bucket, not cumulative; the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def _samples(self):
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}'
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_format_value(child.sum)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def callback_gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> CallbackGauge:
+    return REGISTRY.register(CallbackGauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+async def start_metrics_server(host: str, port: int):
+    """
+    Serve `/metrics` for processes without an HTTP API of their own, e.g. the market monitor.
+
+    Returns:
+        aiohttp.web.AppRunner: Call `cleanup()` on it to stop the server.
+    """
+    from aiohttp import web
+
+    async def handle(_request):
+        return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    server = web.Application()
+    server.router.add_get('/metrics', handle)
+    runner = web.AppRunner(server, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+@asynccontextmanager
+async def timed_lock(lock: asyncio.Lock, wait: Histogram, hold: Histogram):
+    """
+    Acquire `lock`, recording the time spent waiting for it and holding it.
+    """
+    started = time.perf_counter()
+    async with lock:
+        acquired = time.perf_counter()
+        wait.observe(acquired - started)
+        try:
+            yield
+        finally:
+            hold.observe(time.perf_counter() - acquired)
+
+
+# HTTP API
+HTTP_REQUEST_DURATION = histogram(
+    'http_request_duration_seconds', 'Time to serve an HTTP request.', ('method', 'route'),
+)
+HTTP_REQUESTS = counter('http_requests_total', 'HTTP requests served.', ('method', 'route', 'status'))
+
+# Outbound JSON-RPC
+RPC_REQUEST_DURATION = histogram(
+    'rpc_request_duration_seconds', 'Time for one JSON-RPC call to an endpoint, including batching and queueing.',
+    ('method',),
+)
+RPC_ERRORS = counter('rpc_errors_total', 'JSON-RPC calls an endpoint failed to serve.', ('method',))
+RPC_FAILOVERS = counter('rpc_failovers_total', 'JSON-RPC calls retried on another endpoint.')
+RPC_BATCH_RESENDS = counter(
+    'rpc_overload_retries_total', 'JSON-RPC batches resent after the provider reported overload.',
+)
+
+RPC_ENDPOINT_LIMIT = callback_gauge(
+    'rpc_endpoint_concurrency_limit', 'Adaptive concurrency limit per RPC endpoint.', ('endpoint',),
+)
+RPC_ENDPOINT_IN_FLIGHT = callback_gauge('rpc_endpoint_in_flight', 'HTTP requests in flight per RPC endpoint.', ('endpoint',))
+RPC_ENDPOINT_QUEUED = callback_gauge(
+    'rpc_endpoint_queued', 'Requests waiting for the outbound limiter per RPC endpoint.', ('endpoint',),
+)
+RPC_ENDPOINT_LATENCY = callback_gauge('rpc_endpoint_latency_seconds', 'EWMA latency per RPC endpoint.', ('endpoint',))
+
+# Transactions
+WRITER_LOCK_WAIT = histogram('writer_lock_wait_seconds', 'Time spent waiting for the nonce writer lock.')
+WRITER_LOCK_HOLD = histogram('writer_lock_hold_seconds', 'Time the nonce writer lock was held.')
+NONCE_RESETS = counter('nonce_resets_total', 'Nonce resyncs against the pending transaction count.')
+NONCE_ERRORS = counter('nonce_errors_total', 'Transaction sends rejected with a nonce error.')
+TX_SUBMIT_RETRIES = counter('tx_submit_retries_total', 'Transaction submissions retried.', ('function',))
+NONCE_RESERVED = callback_gauge(
+    'nonce_reserved', 'Nonces reserved but not yet sent or released, per signer account.', ('account',),
+)
+SIGNER_LOAD = callback_gauge(
+    'signer_load', 'Submissions in progress plus transactions pending per signer account.', ('account',),
+)
+SIGNER_HEALTHY = callback_gauge(
+    'signer_healthy', 'Whether a signer account takes new submissions (not stuck or cooling down).',
+    ('account', 'lane'),
+)
+TX_PENDING = callback_gauge('tx_pending', 'Sent transactions waiting for a receipt.')
+TX_RECEIPT_LATENCY = histogram(
+    'tx_receipt_latency_seconds', 'Time from sending a transaction to its receipt or failure.',
+    ('function', 'status'), CONFIRMATION_BUCKETS,
+)
+
+# Read path
+MARKET_SNAPSHOT_BLOCK = callback_gauge('market_snapshot_block', 'Block number of the served market snapshot.')
+STREAM_SUBSCRIBERS = callback_gauge('market_stream_subscribers', 'Connected market stream subscribers.')
+
+# Market monitor
+MONITOR_CYCLE_DURATION = histogram(
+    'monitor_cycle_duration_seconds', 'Duration of a market monitor cycle.', ('cycle',),
+    LATENCY_BUCKETS + (30, 60, 120, 300),
+)
+MONITOR_BACKLOG = gauge('monitor_backlog_markets', 'Markets waiting in the market monitor.', ('state',))
+MONITOR_RESOLUTIONS = counter('monitor_resolutions_total', 'Market resolution attempts.', ('result',))
@@ -0,0 +1,225 @@
+"""
+Persistent state store for the market monitor.
+
+Market records, resolved markets, resolution attempts and the last processed
+block are kept in SQLite (WAL mode), so a restarted monitor restores its state
+in one read and only reconciles the blocks it missed. Writes are buffered in
+memory and flushed in one transaction per interval on a dedicated thread, so
+the store never blocks the event loop or the resolution path.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from logger import logger
+from market_reader import MarketRecord
+
+store_logger = logger.bind(
+    service='I Was BORED|Monitor Store',
+)
+
+MONITOR_DB_PATH = 'monitor_state.db'
+MONITOR_STORE_FLUSH_INTERVAL = 1  # Seconds between batched writes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS markets (
+    question_id TEXT PRIMARY KEY,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resolved_markets (
+    question_id TEXT PRIMARY KEY,
+    resolved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resolution_attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question_id TEXT NOT NULL,
+    attempted_at REAL NOT NULL,
+    success INTEGER NOT NULL,
+    stage TEXT,
+    tx_hash TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS resolution_attempts_question_id ON resolution_attempts (question_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class MonitorState:
+    markets: Dict[str, MarketRecord] = field(default_factory=dict)
+    resolved_market_ids: Set[str] = field(default_factory=set)
+    last_block: Optional[int] = None
+
+
+class MonitorStateStore:
+    """
+    SQLite-backed store with write-behind batching.
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_interval: Optional[float] = None):
+        self.path = path or os.getenv('MONITOR_DB_PATH', MONITOR_DB_PATH)
+        self.flush_interval = flush_interval or float(
+            os.getenv('MONITOR_STORE_FLUSH_INTERVAL', MONITOR_STORE_FLUSH_INTERVAL),
+        )
+        # All database access happens on this one thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='monitor-store')
+        self._connection: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self._upserts: Dict[str, MarketRecord] = {}
+        self._deletes: Set[str] = set()
+        self._resolved: Dict[str, float] = {}
+        self._attempts: List[Tuple] = []
+        self._meta: Dict[str, str] = {}
+
+    async def _run_in_thread(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _open(self):
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+
+    def _load(self) -> MonitorState:
+        state = MonitorState()
+        for question_id, record in self._connection.execute('SELECT question_id, record FROM markets'):
+            state.markets[question_id] = MarketRecord(**json.loads(record))
+        state.resolved_market_ids = {
+            question_id for (question_id,) in self._connection.execute('SELECT question_id FROM resolved_markets')
+        }
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        state.last_block = int(row[0]) if row else None
+        return state
+
+    async def open(self) -> MonitorState:
+        """
+        Open the database, load the saved state and start the background writer.
+
+        Returns:
+            MonitorState: The restored state; empty on the first run.
+        """
+        started = time.perf_counter()
+        await self._run_in_thread(self._open)
+        state = await self._run_in_thread(self._load)
+        store_logger.info(
+            f'Restored {len(state.markets)} markets, {len(state.resolved_market_ids)} resolved, '
+            f'last block {state.last_block} from {self.path} in '
+            f'{(time.perf_counter() - started) * 1000:.1f} ms',
+        )
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return state
+
+    def save_market(self, record: MarketRecord):
+        self._deletes.discard(record.question_id)
+        self._upserts[record.question_id] = record
+
+    def remove_market(self, question_id: str):
+        self._upserts.pop(question_id, None)
+        self._deletes.add(question_id)
+
+    def mark_resolved(self, question_id: str):
+        self._resolved[question_id] = time.time()
+
+    def record_attempt(
+        self, question_id: str, success: bool, stage: Optional[str] = None,
+        tx_hash: Optional[str] = None, error: Optional[str] = None,
+    ):
+        self._attempts.append((question_id, time.time(), int(success), stage, tx_hash, error))
+
+    def set_last_block(self, block_number: int):
+        self._meta['last_block'] = str(block_number)
+
+    def _write(self, upserts, deletes, resolved, attempts, meta):
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO markets (question_id, record) VALUES (?, ?)',
+                [(question_id, json.dumps(asdict(record))) for question_id, record in upserts.items()],
+            )
+            self._connection.executemany(
+                'DELETE FROM markets WHERE question_id = ?', [(question_id,) for question_id in deletes],
+            )
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO resolved_markets (question_id, resolved_at) VALUES (?, ?)',
+                list(resolved.items()),
+            )
+            self._connection.executemany(
+                'INSERT INTO resolution_attempts (question_id, attempted_at, success, stage, tx_hash, error) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                attempts,
+            )
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', list(meta.items()),
+            )
+
+    async def flush(self):
+        """
+        Write every buffered change in one transaction.
+
+        Changes are swapped out before writing, so the last block is always
+        stored together with the market changes that led up to it.
+        """
+        if not (self._upserts or self._deletes or self._resolved or self._attempts or self._meta):
+            return
+        upserts, deletes, resolved, attempts, meta = batch = (
+            self._upserts, self._deletes, self._resolved, self._attempts, self._meta,
+        )
+        self._upserts, self._deletes, self._resolved, self._attempts, self._meta = {}, set(), {}, [], {}
+        try:
+            await self._run_in_thread(self._write, *batch)
+        except Exception:
+            # Put the batch back under any changes buffered since, so nothing is lost
+            for question_id in self._deletes:
+                upserts.pop(question_id, None)
+            deletes.difference_update(self._upserts)
+            upserts.update(self._upserts)
+            deletes.update(self._deletes)
+            resolved.update(self._resolved)
+            attempts.extend(self._attempts)
+            meta.update(self._meta)
+            self._upserts, self._deletes, self._resolved, self._attempts, self._meta = batch
+            raise
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                store_logger.error(f'Monitor store flush failed: {e}')
+
+    async def close(self):
+        """
+        Stop the background writer, write what is left and close the database.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            if self._connection is not None:
+                await self.flush()
+        finally:
+            # Closed even when the last flush fails; its error still reaches the caller
+            if self._connection is not None:
+                await self._run_in_thread(self._connection.close)
+                self._connection = None
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,183 @@
+"""
+Pipelined nonce allocation for the signer account.
+
+Nonces are reserved atomically under a short lock that never spans an RPC, so
+building, signing and sending several transactions can run concurrently.
+Nonces that were reserved but never reached the chain (failed sends, dropped
+transactions) are tracked as gaps and handed out again before new ones, and
+resyncing against the pending transaction count happens in the background
+instead of stalling every writer.
+"""
+import asyncio
+import heapq
+from contextlib import asynccontextmanager
+from typing import List
+from typing import Optional
+from typing import Set
+
+from logger import logger
+from metrics import NONCE_ERRORS
+from metrics import NONCE_RESETS
+from metrics import WRITER_LOCK_HOLD
+from metrics import WRITER_LOCK_WAIT
+from metrics import timed_lock
+from tracing import tracer
+
+nonce_logger = logger.bind(
+    service='I Was BORED|Nonce Manager',
+)
+
+# Send errors meaning another transaction already holds the nonce
+USED_NONCE_ERRORS = ('nonce too low', 'already known', 'replacement transaction underpriced')
+
+
+class NonceManager:
+    """
+    Hands out nonces for one account and keeps them consistent with the chain.
+    """
+
+    def __init__(self, w3, account: str, lock: Optional[asyncio.Lock] = None):
+        self.w3 = w3
+        self.account = account
+        self._lock = lock or asyncio.Lock()
+        self._next_nonce: Optional[int] = None
+        self._gaps: List[int] = []  # min-heap of nonces to reuse before new ones
+        self._reserved: Set[int] = set()  # handed out, not yet sent or released
+        self._sent_during_resync: Optional[Set[int]] = None  # marked sent while a resync reads the chain
+        self._resync_task: Optional[asyncio.Task] = None
+        self.stats = {'reserved': 0, 'gaps_filled': 0, 'resyncs': 0}
+
+    @property
+    def next_nonce(self) -> Optional[int]:
+        return self._next_nonce
+
+    @property
+    def reserved_count(self) -> int:
+        return len(self._reserved)
+
+    @asynccontextmanager
+    async def _locked(self):
+        # Wait and hold times of the shared writer lock are recorded as histograms and spans
+        wait_span = tracer.child_span('writer_lock.wait')
+        async with timed_lock(self._lock, WRITER_LOCK_WAIT, WRITER_LOCK_HOLD):
+            wait_span.end()
+            with tracer.child_span('writer_lock.hold'):
+                yield
+
+    async def initialize(self):
+        """
+        Start from the account's pending transaction count.
+        """
+        self._next_nonce = await self.w3.eth.get_transaction_count(self.account, 'pending')
+        nonce_logger.info(f'Nonce manager for {self.account} starting at {self._next_nonce}')
+
+    async def reserve(self) -> int:
+        """
+        Reserve the lowest free nonce, filling gaps before allocating new ones.
+
+        Returns:
+            int: The reserved nonce. Call `mark_sent` or `release` when done with it.
+        """
+        async with self._locked():
+            if self._gaps:
+                nonce = heapq.heappop(self._gaps)
+                self.stats['gaps_filled'] += 1
+            else:
+                nonce = self._next_nonce
+                self._next_nonce += 1
+            self._reserved.add(nonce)
+            self.stats['reserved'] += 1
+            return nonce
+
+    async def reserve_many(self, count: int) -> List[int]:
+        """
+        Reserve `count` nonces in one step: gaps first, then a contiguous range.
+
+        Returns:
+            list: The reserved nonces in ascending order.
+        """
+        async with self._locked():
+            nonces = []
+            while self._gaps and len(nonces) < count:
+                nonces.append(heapq.heappop(self._gaps))
+            self.stats['gaps_filled'] += len(nonces)
+            while len(nonces) < count:
+                nonces.append(self._next_nonce)
+                self._next_nonce += 1
+            self._reserved.update(nonces)
+            self.stats['reserved'] += count
+            return nonces
+
+    def mark_sent(self, nonce: int):
+        """The transaction using `nonce` was accepted by the node."""
+        self._reserved.discard(nonce)
+        if self._sent_during_resync is not None:
+            self._sent_during_resync.add(nonce)
+
+    def release(self, nonce: int):
+        """The transaction using `nonce` never reached the node; reuse the nonce."""
+        if nonce in self._reserved:
+            self._reserved.discard(nonce)
+            heapq.heappush(self._gaps, nonce)
+
+    def handle_send_error(self, nonce: int, error: Exception):
+        """
+        Classify a failed send and update the allocator accordingly.
+
+        A "nonce too low", "already known" or "replacement transaction underpriced"
+        error means a transaction with this nonce is already mined or pending, so
+        it must not be reused. Any other failure, "nonce too high" included, frees
+        the nonce. Nonce errors also trigger a background resync with the pending
+        count, which fills whatever gap made the node reject a too-high nonce.
+        """
+        message = str(error).lower()
+        if any(used in message for used in USED_NONCE_ERRORS):
+            self.mark_sent(nonce)  # Used on chain, like a sent one
+        else:
+            self.release(nonce)
+
+        if 'nonce' in message or 'underpriced' in message:
+            NONCE_ERRORS.inc()
+            self.schedule_resync()
+
+    def schedule_resync(self):
+        """
+        Resync with the chain in the background; concurrent requests share one resync.
+        """
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = asyncio.ensure_future(self.resync())
+
+    async def resync(self):
+        """
+        Reconcile the allocator with the account's pending transaction count.
+
+        Nonces below the pending count are used, so stale gaps are dropped and the
+        allocator jumps forward if other senders used the account. If the pending
+        count is behind the allocator and that nonce is not currently reserved, the
+        node dropped the transaction using it and everything after it is stuck in
+        the queue; it becomes a gap so the next transaction fills it.
+
+        The count is read outside the lock, so a nonce that was reserved or sent
+        while the read was in flight may not be counted yet; such nonces are
+        never turned into gaps.
+        """
+        self._sent_during_resync = set()
+        try:
+            pending_count = await self.w3.eth.get_transaction_count(self.account, 'pending')
+        except Exception:
+            self._sent_during_resync = None
+            raise
+        async with self._locked():
+            sent_during_read, self._sent_during_resync = self._sent_during_resync, None
+            self.stats['resyncs'] += 1
+            NONCE_RESETS.inc()
+            gaps = {nonce for nonce in self._gaps if nonce >= pending_count}
+            if pending_count >= self._next_nonce:
+                self._next_nonce = pending_count
+            elif pending_count not in self._reserved and pending_count not in sent_during_read:
+                gaps.add(pending_count)
+            self._gaps = sorted(gaps)
+            nonce_logger.info(
+                f'Nonce resync for {self.account}: pending={pending_count}, '
+                f'next={self._next_nonce}, gaps={len(self._gaps)}',
+            )
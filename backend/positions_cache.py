@@ -0,0 +1,181 @@
+"""
+Per-user positions with event-driven invalidation.
+
+A user's open and closed position ids and their outcome token balances are
+read in one round (two id lookups plus one aggregated `getPositionBalances`
+call) and cached per address. Entries stay valid until a `BuyPosition` or
+`RedeemPosition` event for that address is seen. Market details are merged in
+from the block-synchronized market snapshot when the response is built, so
+only markets that are no longer active are read, once, and kept in a shared
+store.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from logger import logger
+from market_cache import MarketSnapshot
+from market_cache import MarketSnapshotCache
+from market_indexer import OracleEventLog
+from single_flight import SingleFlight
+
+positions_logger = logger.bind(
+    service='I Was BORED|Positions Cache',
+)
+
+POSITION_EVENTS = ('BuyPosition', 'RedeemPosition')
+POSITION_INDEX_SETS = [1, 2]  # Markets always have two outcomes: 0b01 and 0b10
+POSITIONS_CACHE_SIZE = 10000
+POSITIONS_CACHE_TTL = 3600  # Safety net; entries are normally invalidated by events
+
+
+class UserPositionsCache:
+    """
+    Caches each address's positions until an event shows they changed.
+    """
+
+    def __init__(self, app_state, market_cache: MarketSnapshotCache):
+        self.app_state = app_state
+        self.market_cache = market_cache
+        self.event_log = OracleEventLog(app_state, POSITION_EVENTS)
+        self.last_block: Optional[int] = None
+
+        self.max_entries = int(os.getenv('POSITIONS_CACHE_SIZE', POSITIONS_CACHE_SIZE))
+
+        # address -> block of the newest position event not reflected in its entry
+        self._dirty: Dict[str, int] = {}
+        self._entries = SingleFlight(
+            ttl=float(os.getenv('POSITIONS_CACHE_TTL', POSITIONS_CACHE_TTL)),
+            max_entries=self.max_entries,
+            reusable=lambda entry: entry['block_number'] >= self._dirty.get(entry['address'], -1),
+        )
+        # question_id -> market dict for markets no longer in the snapshot, LRU first
+        self._inactive_markets: OrderedDict[str, Dict] = OrderedDict()
+
+    async def start(self):
+        """
+        Start following position events from the current block.
+        """
+        self.last_block = await self.app_state.w3.eth.block_number
+        self.market_cache.add_listener(self.on_snapshot)
+
+    async def stop(self):
+        """
+        Stop following position events.
+        """
+        self.market_cache.remove_listener(self.on_snapshot)
+
+    def _store_inactive_markets(self, records: Dict):
+        for question_id, record in records.items():
+            self._inactive_markets[question_id] = record.to_dict()
+            self._inactive_markets.move_to_end(question_id)
+        while len(self._inactive_markets) > self.max_entries:
+            self._inactive_markets.popitem(last=False)
+
+    async def on_snapshot(self, previous: Optional[MarketSnapshot], snapshot: MarketSnapshot):
+        """
+        Invalidate the entries of every address with position events up to the snapshot block.
+
+        Markets that dropped out of the snapshot (resolved) are read once more
+        so positions in them keep their final details.
+        """
+        if snapshot.block_number <= self.last_block:
+            return
+
+        if previous is not None:
+            retired_ids = [question_id for question_id in previous.market_ids if question_id not in snapshot.markets]
+            self._store_inactive_markets(
+                await self.market_cache.reader.fetch_market_records(
+                    retired_ids, block_identifier=snapshot.block_number,
+                ),
+            )
+
+        events = await self.event_log.fetch(self.last_block + 1, snapshot.block_number)
+        for event in events:
+            address = event['args']['wallet'].lower()
+            # Only addresses with a cached or in-flight entry need invalidating
+            if address in self._entries:
+                self._dirty[address] = max(self._dirty.get(address, -1), event['blockNumber'])
+        self.last_block = snapshot.block_number
+
+        if len(self._dirty) > self.max_entries:
+            self._dirty = {address: block for address, block in self._dirty.items() if address in self._entries}
+
+        if events:
+            positions_logger.debug(f'{len(events)} position events up to block {self.last_block}')
+
+    async def _fetch(self, address: str) -> Dict:
+        """
+        Read `address`'s position ids, balances and inactive market details at one block.
+        """
+        w3 = self.app_state.w3
+        reader = self.market_cache.reader
+        functions = self.app_state.oracle_contract.functions
+        holder = w3.to_checksum_address(address)
+
+        block_number = max(await w3.eth.block_number, self.last_block or 0)
+        open_ids, closed_ids = await asyncio.gather(
+            functions.getUserOpenPositions(holder).call(block_identifier=block_number),
+            functions.getUserClosedPositions(holder).call(block_identifier=block_number),
+        )
+        open_ids = ['0x' + question_id.hex() for question_id in open_ids]
+        closed_ids = ['0x' + question_id.hex() for question_id in closed_ids]
+
+        snapshot = self.market_cache.snapshot
+        inactive_ids = [
+            question_id for question_id in open_ids + closed_ids
+            if (snapshot is None or question_id not in snapshot.markets)
+            and question_id not in self._inactive_markets
+        ]
+        balances, inactive_records = await asyncio.gather(
+            reader.fetch_position_balances(
+                open_ids + closed_ids, holder, POSITION_INDEX_SETS, block_identifier=block_number,
+            ),
+            reader.fetch_market_records(inactive_ids, block_identifier=block_number),
+        )
+
+        self._store_inactive_markets(inactive_records)
+
+        if self._dirty.get(address, -1) <= block_number:
+            self._dirty.pop(address, None)
+        return {
+            'address': address,
+            'block_number': block_number,
+            'open_ids': open_ids,
+            'closed_ids': closed_ids,
+            'balances': balances,
+        }
+
+    def _positions(self, entry: Dict, question_ids: List[str]) -> List[Dict]:
+        snapshot = self.market_cache.snapshot
+        positions = []
+        for question_id in question_ids:
+            market = snapshot.markets.get(question_id) if snapshot is not None else None
+            positions.append({
+                'question_id': question_id,
+                'balances': [str(balance) for balance in entry['balances'].get(question_id, [])],
+                'market': market or self._inactive_markets.get(question_id),
+            })
+        return positions
+
+    async def get_positions(self, address: str) -> Dict:
+        """
+        Return `address`'s open and closed positions with balances and market details.
+
+        Args:
+            address (str): The user's address.
+
+        Returns:
+            dict: The positions and the block the user data was read at.
+        """
+        address = address.lower()
+        entry = await self._entries.do(address, lambda: self._fetch(address))
+        return {
+            'address': address,
+            'block_number': entry['block_number'],
+            'open_positions': self._positions(entry, entry['open_ids']),
+            'closed_positions': self._positions(entry, entry['closed_ids']),
+        }
@@ -0,0 +1,113 @@
+"""
+Shared Pyth Hermes client for price update data.
+
+Requests are keyed on their whole set of feed ids: concurrent requests for
+the same set attach to the one `latest_vaas` request in flight, and the
+returned update data is cached per set for a short, configurable freshness
+TTL. Hermes may pack the updates of several accumulator (PNAU) feeds into a
+single blob, so the data is passed through as returned instead of being
+split per feed.
+"""
+import asyncio
+import base64
+import os
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from http_session import HttpSessionManager
+from logger import logger
+
+pyth_logger = logger.bind(
+    service='I Was BORED|Pyth Client',
+)
+
+PYTH_HERMES_URL = 'https://hermes.pyth.network'
+PYTH_CACHE_TTL = 2  # Seconds fetched update data is reused before fetching fresh data
+
+
+class PythPriceClient:
+    """
+    Cached and de-duplicated access to Hermes `latest_vaas`.
+    """
+
+    def __init__(
+        self,
+        hermes_url: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        session_manager: Optional[HttpSessionManager] = None,
+    ):
+        self.hermes_url = (hermes_url or os.getenv('PYTH_HERMES_URL', PYTH_HERMES_URL)).rstrip('/')
+        self.cache_ttl = float(os.getenv('PYTH_CACHE_TTL', PYTH_CACHE_TTL)) if cache_ttl is None else cache_ttl
+
+        # Only close the session manager on shutdown if this client created it
+        self._owns_sessions = session_manager is None
+        self.session_manager = session_manager or HttpSessionManager()
+        self._cache: Dict[Tuple[str, ...], Tuple[float, List[str]]] = {}  # feed ids -> (fetched at, update data)
+        self._inflight: Dict[Tuple[str, ...], asyncio.Future] = {}  # feed ids -> pending update data
+        self.stats = {'requests': 0, 'cache_hits': 0, 'hermes_requests': 0}
+
+    @staticmethod
+    def _normalize(price_feed_id: str) -> str:
+        price_feed_id = price_feed_id.lower()
+        return price_feed_id if price_feed_id.startswith('0x') else '0x' + price_feed_id
+
+    async def get_price_update_data(self, price_feed_ids: List[str]) -> List[str]:
+        """
+        Get price update data for the given feeds.
+
+        Args:
+            price_feed_ids (list): Pyth price feed ids.
+
+        Returns:
+            list: 0x-prefixed update data as returned by Hermes. Accumulator feeds
+                may share one entry, so there can be fewer entries than feed ids.
+        """
+        key = tuple(sorted(set(map(self._normalize, price_feed_ids))))
+        self.stats['requests'] += 1
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] <= self.cache_ttl:
+            self.stats['cache_hits'] += 1
+            return list(cached[1])
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield the shared request so one cancelled caller does not cancel the others
+        return list(await asyncio.shield(future))
+
+    async def _fetch(self, key: Tuple[str, ...]) -> List[str]:
+        try:
+            update_data = await self._request_latest_vaas(list(key))
+        except Exception as e:
+            pyth_logger.error(f'Failed to fetch Pyth data for {len(key)} feeds: {e}')
+            raise
+        if not update_data:
+            raise Exception(f'Hermes returned no price update data for {len(key)} feeds')
+        self._cache[key] = (time.monotonic(), update_data)
+        return update_data
+
+    async def _request_latest_vaas(self, feed_ids: List[str]) -> List[str]:
+        self.stats['hermes_requests'] += 1
+        url = f'{self.hermes_url}/api/latest_vaas'
+        params = [('ids[]', feed_id) for feed_id in feed_ids]
+        pyth_logger.info(f'Fetching Pyth data for {len(feed_ids)} feeds from: {url}')
+
+        session = await self.session_manager.get_session()
+        async with session.get(url, params=params) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f'Failed to fetch Pyth data: {response.status} - {error_text}')
+            parsed = await response.json(content_type=None)
+        return ['0x' + base64.b64decode(vaa).hex() for vaa in parsed]
+
+    async def close(self):
+        """
+        Close the underlying HTTP session if this client owns it.
+        """
+        if self._owns_sessions:
+            await self.session_manager.close()
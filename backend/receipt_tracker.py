@@ -0,0 +1,323 @@
+"""
+Central transaction receipt tracker and job registry.
+
+Instead of every request polling for its own receipt, submitted transactions
+are registered as jobs and a single background loop fetches the receipts of
+all pending transactions together once per new block. With the batching
+provider those lookups go out as one JSON-RPC batch. With several workers, a
+shared store publishes every job so any worker can report its status.
+"""
+import asyncio
+import itertools
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from web3.exceptions import TransactionNotFound
+
+from logger import logger
+from metrics import TX_RECEIPT_LATENCY
+from tracing import SpanContext
+from tracing import tracer
+
+tracker_logger = logger.bind(
+    service='I Was BORED|Receipt Tracker',
+)
+
+RECEIPT_POLL_INTERVAL = 2  # Seconds between new-block checks while transactions are pending
+RECEIPT_TIMEOUT = 120  # Seconds before a pending transaction is reported as timed out
+JOB_HISTORY_SIZE = 10000
+
+
+class JobStatus:
+    PENDING = 'pending'
+    # No receipt within the timeout, but the transaction may still be mined; it is
+    # tracked until it is mined or its nonce is taken by another transaction
+    UNKNOWN = 'unknown'
+    CONFIRMED = 'confirmed'
+    FAILED = 'failed'
+
+
+@dataclass
+class TransactionJob:
+    job_id: str
+    function: str
+    question_id: str
+    tx_hash: str
+    account: Optional[str] = None  # Signer account that sent the transaction
+    nonce: Optional[int] = None
+    status: str = JobStatus.PENDING
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    block_number: Optional[int] = None
+    error: Optional[str] = None
+    receipt: Any = field(default=None, repr=False)
+    trace_context: Optional[SpanContext] = field(default=None, repr=False)  # Span that submitted the transaction
+    _done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'function': self.function,
+            'question_id': self.question_id,
+            'tx_hash': self.tx_hash,
+            'account': self.account,
+            'nonce': self.nonce,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+            'block_number': self.block_number,
+            'error': self.error,
+        }
+
+
+class ReceiptTracker:
+    """
+    Polls receipts for all pending transactions once per new block.
+    """
+
+    def __init__(
+        self,
+        w3,
+        poll_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        history_size: Optional[int] = None,
+        store=None,
+    ):
+        """
+        Args:
+            w3 (AsyncWeb3): The web3 instance used to fetch receipts.
+            poll_interval (float, optional): Seconds between new-block checks.
+            timeout (float, optional): Seconds before a pending transaction times out.
+            history_size (int, optional): Finished jobs kept for status lookups.
+            store (SubmissionCoordinator, optional): Shares jobs with other workers.
+        """
+        self.w3 = w3
+        self.store = store
+        self.poll_interval = poll_interval or float(os.getenv('RECEIPT_POLL_INTERVAL', RECEIPT_POLL_INTERVAL))
+        self.timeout = timeout or float(os.getenv('RECEIPT_TIMEOUT', RECEIPT_TIMEOUT))
+        self.history_size = history_size or int(os.getenv('JOB_HISTORY_SIZE', JOB_HISTORY_SIZE))
+
+        self._jobs: OrderedDict[str, TransactionJob] = OrderedDict()  # job_id -> job, oldest first
+        self._pending: Dict[str, TransactionJob] = {}  # tx_hash -> job
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_block: Optional[int] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def pending_by_account(self) -> Dict[str, Tuple[int, float]]:
+        """
+        Pending transactions per signer account (lowercase address).
+
+        Returns:
+            dict: address -> (pending count, submission time of the oldest one).
+        """
+        accounts = {}
+        for job in self._pending.values():
+            account = (job.account or '').lower()
+            count, oldest = accounts.get(account, (0, job.submitted_at))
+            accounts[account] = (count + 1, min(oldest, job.submitted_at))
+        return accounts
+
+    def add_job(
+        self,
+        function: str,
+        question_id: str,
+        tx_hash: str,
+        account: Optional[str] = None,
+        nonce: Optional[int] = None,
+    ) -> TransactionJob:
+        """
+        Register a submitted transaction for receipt tracking.
+
+        Only finished jobs are evicted from the history; jobs still waiting for a
+        receipt stay tracked however old they are.
+
+        Returns:
+            TransactionJob: The new pending job.
+        """
+        job = TransactionJob(
+            job_id=str(uuid.uuid4()),
+            function=function,
+            question_id=question_id,
+            tx_hash=tx_hash,
+            account=account,
+            nonce=nonce,
+            trace_context=tracer.current_context(),
+        )
+        self._jobs[job.job_id] = job
+        self._pending[tx_hash] = job
+        excess = len(self._jobs) - self.history_size
+        if excess > 0:
+            finished = (job_id for job_id, old in self._jobs.items() if old.tx_hash not in self._pending)
+            for job_id in list(itertools.islice(finished, excess)):
+                del self._jobs[job_id]
+        if self.store is not None:
+            self.store.save_job(job.to_dict())
+        self._wakeup.set()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[TransactionJob]:
+        return self._jobs.get(job_id)
+
+    async def find_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Look up a job submitted by this worker or, with a shared store, by any worker.
+
+        Returns:
+            dict: The job as returned by `TransactionJob.to_dict`, or None if unknown.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is not None:
+            return await self.store.load_job(job_id)
+        return None
+
+    def track(self, record: Dict) -> TransactionJob:
+        """
+        Adopt a job submitted by another worker, so this one can wait for it.
+
+        Its receipt is polled here as well until it is final; both workers
+        publish the same outcome to the shared store.
+
+        Args:
+            record (dict): The job as returned by `TransactionJob.to_dict`.
+
+        Returns:
+            TransactionJob: The local job, with the same job_id.
+        """
+        job = self._jobs.get(record['job_id'])
+        if job is not None:
+            return job
+        job = TransactionJob(**record)
+        self._jobs[job.job_id] = job
+        if job.status in (JobStatus.PENDING, JobStatus.UNKNOWN):
+            self._pending[job.tx_hash] = job
+            self._wakeup.set()
+        if job.status != JobStatus.PENDING:
+            job._done.set()
+        return job
+
+    async def wait_for_job(self, job: TransactionJob) -> TransactionJob:
+        """
+        Wait until the job is confirmed, failed or timed out (status UNKNOWN).
+        """
+        await job._done.wait()
+        return job
+
+    def _finish(self, job: TransactionJob, status: str, receipt=None, error: Optional[str] = None):
+        self._pending.pop(job.tx_hash, None)
+        job.status = status
+        job.receipt = receipt
+        job.error = error
+        job.finished_at = time.time()
+        TX_RECEIPT_LATENCY.labels(job.function, status).observe(job.finished_at - job.submitted_at)
+        if job.trace_context is not None:
+            tracer.record(
+                'tx.receipt_wait', int(job.submitted_at * 1e9), int(job.finished_at * 1e9),
+                parent=job.trace_context, error=error, tx_hash=job.tx_hash, status=status,
+            )
+        if receipt is not None:
+            job.block_number = receipt['blockNumber']
+        if self.store is not None:
+            self.store.save_job(job.to_dict())
+        job._done.set()
+
+    def _time_out(self, job: TransactionJob):
+        # Reported to waiters, but kept pending: a late receipt or the nonce moving on decides it
+        job.status = JobStatus.UNKNOWN
+        job.error = f'no receipt after {self.timeout:.0f} seconds'
+        tracker_logger.warning(f'Transaction {job.tx_hash} has no receipt after {self.timeout:.0f} seconds')
+        if self.store is not None:
+            self.store.save_job(job.to_dict())
+        job._done.set()
+
+    async def _confirmed_nonces(self, jobs) -> Dict[str, int]:
+        # Mined transaction count per account of timed-out jobs
+        accounts = list({job.account for job in jobs if job.account is not None and job.nonce is not None})
+        counts = await asyncio.gather(
+            *[self.w3.eth.get_transaction_count(account, 'latest') for account in accounts],
+            return_exceptions=True,
+        )
+        return {
+            account: count for account, count in zip(accounts, counts) if not isinstance(count, Exception)
+        }
+
+    async def _get_receipt(self, tx_hash: str):
+        try:
+            return await self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+        except Exception as e:
+            tracker_logger.warning(f'Failed to fetch receipt for {tx_hash}: {e}')
+            return None
+
+    async def poll(self):
+        """
+        Fetch receipts for every pending transaction in one round of concurrent calls.
+
+        A transaction without a receipt after the timeout becomes UNKNOWN rather
+        than FAILED, since it may still be mined and resubmitting it could send a
+        duplicate. It becomes FAILED once its account has mined a transaction
+        with its nonce and there is still no receipt for it, i.e. it was dropped
+        and its nonce reused.
+        """
+        jobs = list(self._pending.values())
+        # Read before the receipts, so a transaction mined in between is seen by its receipt
+        confirmed_nonces = await self._confirmed_nonces([job for job in jobs if job.status == JobStatus.UNKNOWN])
+        receipts = await asyncio.gather(*[self._get_receipt(job.tx_hash) for job in jobs])
+
+        now = time.time()
+        for job, receipt in zip(jobs, receipts):
+            if receipt is not None:
+                if receipt['status'] == 0:
+                    self._finish(job, JobStatus.FAILED, receipt, 'transaction reverted')
+                else:
+                    self._finish(job, JobStatus.CONFIRMED, receipt)
+            elif job.status == JobStatus.UNKNOWN:
+                if confirmed_nonces.get(job.account, -1) > job.nonce:
+                    self._finish(
+                        job, JobStatus.FAILED, error=f'dropped, nonce {job.nonce} was used by another transaction',
+                    )
+            elif now - job.submitted_at > self.timeout:
+                self._time_out(job)
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            try:
+                block_number = await self.w3.eth.block_number
+                if block_number != self._last_block:
+                    self._last_block = block_number
+                    await self.poll()
+            except Exception as e:
+                tracker_logger.error(f'Receipt polling failed: {e}')
+
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,171 @@
+"""
+Staged, bounded-concurrency pipeline for resolving expired markets.
+
+Each market flows through the stages in order (e.g. fetch price data, submit,
+confirm). Every stage has its own long-running worker pool and a bounded
+queue in front of it, so a slow stage applies backpressure instead of piling
+up work. Markets are fed in as they become due, while earlier ones are still
+moving through, so a market that is slow, fails or times out in one stage
+only occupies one of that stage's workers and never holds up the others.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from logger import logger
+from tracing import STATUS_ERROR
+from tracing import tracer
+
+pipeline_logger = logger.bind(
+    service='I Was BORED|Resolution Pipeline',
+)
+
+
+@dataclass
+class PipelineStage:
+    """
+    A named pipeline stage.
+
+    `handler` receives the market and the value returned by the previous stage
+    (None for the first stage) and returns the value for the next one.
+    """
+    name: str
+    handler: Callable[[Any, Any], Awaitable[Any]]
+    concurrency: int = 1
+    timeout: Optional[float] = None
+
+
+@dataclass
+class PipelineResult:
+    question_id: str
+    success: bool = False
+    failed_stage: Optional[str] = None
+    error: Optional[str] = None
+    value: Any = None
+    timings: Dict[str, float] = field(default_factory=dict)  # stage name -> seconds
+    span: Any = field(default=None, repr=False)  # Root span of the market's resolution trace
+
+
+class ResolutionPipeline:
+    """
+    Runs markets through a list of stages as they are submitted.
+    """
+
+    def __init__(
+        self,
+        stages: List[PipelineStage],
+        queue_size: int = 16,
+        on_result: Optional[Callable[[PipelineResult], None]] = None,
+    ):
+        """
+        Args:
+            stages (list): The stages, in order.
+            queue_size (int): Markets waiting in front of each stage after the first.
+            on_result (callable, optional): Called with the PipelineResult of every market
+                that finished or failed.
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_result = on_result
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._in_flight: Dict[str, PipelineResult] = {}  # question_id -> result
+
+    def __contains__(self, question_id: str) -> bool:
+        return question_id in self._in_flight
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def start(self):
+        """
+        Start every stage's workers.
+        """
+        if self._workers:
+            return
+        # Submitting never blocks: the first queue is unbounded, the ones between stages are not
+        self._queues = [asyncio.Queue()] + [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages[1:]]
+        for index, stage in enumerate(self.stages):
+            outbox = self._queues[index + 1] if index + 1 < len(self._queues) else None
+            self._workers.extend(
+                asyncio.create_task(self._worker(stage, self._queues[index], outbox))
+                for _ in range(stage.concurrency)
+            )
+
+    async def stop(self):
+        """
+        Cancel the workers; markets still in flight are dropped.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for result in self._in_flight.values():
+            result.span.set_status(STATUS_ERROR, 'pipeline stopped')
+            result.span.end()
+        self._in_flight.clear()
+
+    def submit(self, market: Any) -> bool:
+        """
+        Queue a market for the first stage.
+
+        Args:
+            market: An item with a `question_id` attribute, e.g. MarketRecord.
+
+        Returns:
+            bool: False if the market is already in flight.
+        """
+        if market.question_id in self._in_flight:
+            return False
+        result = PipelineResult(
+            question_id=market.question_id,
+            span=tracer.span('resolve_market', question_id=market.question_id),
+        )
+        self._in_flight[market.question_id] = result
+        self._queues[0].put_nowait((market, None, result))
+        return True
+
+    def _finish(self, result: PipelineResult):
+        self._in_flight.pop(result.question_id, None)
+        result.span.end()
+        if result.success:
+            timings = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in result.timings.items())
+            pipeline_logger.info(f'Resolved market {result.question_id} ({timings})')
+        if self.on_result is not None:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                pipeline_logger.error(f'Result handler failed for market {result.question_id}: {e}')
+
+    async def _worker(self, stage: PipelineStage, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue]):
+        while True:
+            market, value, result = await inbox.get()
+            start = time.monotonic()
+            try:
+                with tracer.span(f'stage {stage.name}', parent=result.span.context):
+                    value = await asyncio.wait_for(stage.handler(market, value), timeout=stage.timeout)
+            except Exception as e:
+                result.timings[stage.name] = time.monotonic() - start
+                result.failed_stage = stage.name
+                result.error = str(e) or type(e).__name__
+                pipeline_logger.error(
+                    f'Stage {stage.name} failed for market {result.question_id}: {result.error}',
+                )
+                result.span.set_status(STATUS_ERROR, f'{stage.name}: {result.error}')
+                self._finish(result)
+                continue
+            result.timings[stage.name] = time.monotonic() - start
+            if outbox is not None:
+                # Blocks while the next stage is saturated (backpressure)
+                await outbox.put((market, value, result))
+            else:
+                result.success = True
+                result.value = value
+                self._finish(result)
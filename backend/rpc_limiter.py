@@ -0,0 +1,185 @@
+"""
+Adaptive outbound limiter for RPC traffic.
+
+A token bucket caps the request rate, and an AIMD concurrency limit caps the
+number of HTTP requests in flight. While saturated, the limit grows by one
+per increase interval and halves when the provider answers with 429,
+rate-limit errors or timeouts; a Retry-After header pauses all traffic for
+the given time. Waiting requests are served by priority, so transaction
+submission is not stuck behind a backlog of reads.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from logger import logger
+
+limiter_logger = logger.bind(
+    service='I Was BORED|RPC Limiter',
+)
+
+RPC_RATE_LIMIT = 50  # Requests per second; 0 disables the token bucket
+RPC_RATE_BURST = 100
+RPC_INITIAL_CONCURRENCY = 8
+RPC_MIN_CONCURRENCY = 1
+RPC_MAX_CONCURRENCY = 64
+RPC_BACKOFF_FACTOR = 0.5
+RPC_INCREASE_INTERVAL = 1  # Seconds between additive concurrency increases
+RPC_DEFAULT_RETRY_AFTER = 1  # Seconds to pause on a 429 without Retry-After
+
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+
+
+class OutboundLimiter:
+    """
+    Token bucket plus AIMD concurrency limit with prioritized waiters.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        initial_concurrency: Optional[int] = None,
+        min_concurrency: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        self.name = name
+        self.rate = rate if rate is not None else float(os.getenv('RPC_RATE_LIMIT', RPC_RATE_LIMIT))
+        self.burst = burst or float(os.getenv('RPC_RATE_BURST', RPC_RATE_BURST))
+        self.min_concurrency = min_concurrency or int(os.getenv('RPC_MIN_CONCURRENCY', RPC_MIN_CONCURRENCY))
+        self.max_concurrency = max_concurrency or int(os.getenv('RPC_MAX_CONCURRENCY', RPC_MAX_CONCURRENCY))
+        self.backoff_factor = float(os.getenv('RPC_BACKOFF_FACTOR', RPC_BACKOFF_FACTOR))
+        self.increase_interval = float(os.getenv('RPC_INCREASE_INTERVAL', RPC_INCREASE_INTERVAL))
+        self.limit = float(initial_concurrency or int(os.getenv('RPC_INITIAL_CONCURRENCY', RPC_INITIAL_CONCURRENCY)))
+
+        self.tokens = self.burst
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_refill = time.monotonic()
+        self._last_backoff = 0.0
+        self._last_increase = 0.0
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []  # (priority, seq, cost, future)
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.stats = {'acquired': 0, 'waited': 0, 'wait_seconds': 0.0, 'backoffs': 0, 'retry_after_pauses': 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _schedule(self, delay: float):
+        if self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    def _dispatch(self):
+        """
+        Admit waiters in priority order while concurrency, tokens and pauses allow.
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            self._schedule(self.paused_until - now)
+            return
+        self._refill(now)
+
+        while self._waiters and self.in_flight < int(self.limit):
+            priority, sequence, cost, future = self._waiters[0]
+            if future.done():  # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self.rate > 0 and self.tokens < cost:
+                self._schedule((cost - self.tokens) / self.rate)
+                return
+            heapq.heappop(self._waiters)
+            if self.rate > 0:
+                self.tokens -= cost
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: int = PRIORITY_READ, cost: float = 1):
+        """
+        Wait for a concurrency slot and `cost` tokens; pair with `release`.
+
+        Args:
+            priority (int): PRIORITY_WRITE or PRIORITY_READ; lower is served first.
+            cost (float): Tokens to take, e.g. the number of requests in a batch.
+        """
+        cost = min(cost, self.burst)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), cost, future))
+        self._dispatch()
+        self.stats['acquired'] += 1
+        if future.done():
+            return
+
+        self.stats['waited'] += 1
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled; give the slot back
+                self.release()
+            raise
+        finally:
+            self.stats['wait_seconds'] += time.monotonic() - started
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def on_success(self):
+        """
+        Additive increase: +1 per increase interval, only while the limit is what holds requests back.
+
+        Call before `release`, so `in_flight` still counts the finished request.
+        """
+        now = time.monotonic()
+        saturated = self.in_flight >= int(self.limit) or self._waiters
+        if saturated and now - self._last_increase >= self.increase_interval:
+            self._last_increase = now
+            self.limit = min(self.max_concurrency, self.limit + 1)
+
+    def on_overload(self, retry_after: Optional[float] = None):
+        """
+        Multiplicative decrease on 429, rate-limit errors or timeouts.
+
+        Overloads within one backoff window count once, so a burst of failing
+        in-flight requests does not collapse the limit to the minimum.
+        """
+        now = time.monotonic()
+        if now - self._last_backoff >= 1:
+            self._last_backoff = now
+            self.limit = max(self.min_concurrency, self.limit * self.backoff_factor)
+            self.stats['backoffs'] += 1
+            limiter_logger.warning(f'{self.name}: provider overloaded, concurrency limit now {self.limit:.1f}')
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.stats['retry_after_pauses'] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'tokens': round(self.tokens, 1),
+            'paused_for': round(max(0.0, self.paused_until - time.monotonic()), 2),
+            **self.stats,
+        }
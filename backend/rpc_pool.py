@@ -0,0 +1,299 @@
+"""
+Latency-aware pool of JSON-RPC endpoints for AsyncWeb3.
+
+Every endpoint keeps an EWMA of its latency and error rate. Reads go to the
+fastest healthy endpoint and fail over to the next one on errors; with
+hedging enabled, a read that is slower than the hedge delay is also sent to
+the runner-up and the first answer wins. Transaction submission and nonce
+lookups stick to one endpoint until it fails, so consecutive nonces reach
+the same mempool in order. Each endpoint batches its own requests through
+`BatchingHTTPProvider`, behind its own outbound limiter.
+
+A raw transaction whose send failed at the transport level may still have
+reached the node, so before it is sent to the next endpoint it is looked up
+by hash; if it is found, or the next endpoint answers "already known", the
+send counts as successful instead of surfacing an error that would make the
+caller resubmit it with a new nonce.
+"""
+import asyncio
+import os
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from eth_utils import keccak
+from hexbytes import HexBytes
+from web3.providers.async_base import AsyncBaseProvider
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+from batch_provider import BatchingHTTPProvider
+from logger import logger
+from metrics import RPC_ERRORS
+from metrics import RPC_FAILOVERS
+from metrics import RPC_REQUEST_DURATION
+from rpc_limiter import OutboundLimiter
+from tracing import SPAN_KIND_CLIENT
+from tracing import tracer
+
+pool_logger = logger.bind(
+    service='I Was BORED|RPC Pool',
+)
+
+RPC_EWMA_ALPHA = 0.2
+RPC_MAX_ERROR_RATE = 0.5  # Endpoints above this EWMA error rate only serve as a last resort
+RPC_FAILURE_THRESHOLD = 3  # Consecutive failures before an endpoint is cooled down
+RPC_ENDPOINT_COOLDOWN = 10  # Seconds an endpoint is skipped after repeated failures
+RPC_HEDGE_DELAY_MS = 0  # 0 disables hedged reads
+
+# Routed to the sticky endpoint so nonces and submissions see one mempool
+STICKY_METHODS = {
+    'eth_sendRawTransaction',
+    'eth_sendTransaction',
+    'eth_getTransactionCount',
+}
+
+# JSON-RPC error codes and messages that mean the endpoint, not the request, failed.
+# -32603 (internal error) is left out: nodes also return it for reverts and bad requests.
+ENDPOINT_ERROR_CODES = {-32005, 429}
+ENDPOINT_ERROR_MESSAGES = (
+    'rate limit', 'too many requests', 'header not found', 'capacity exceeded',
+    'no response for request',  # Reply missing from a JSON-RPC batch
+)
+
+
+class EndpointError(Exception):
+    """
+    An endpoint failed to serve a request; `response` holds its error reply, if any.
+    """
+
+    def __init__(self, message: str, response: Optional[RPCResponse] = None):
+        super().__init__(message)
+        self.response = response
+
+
+class RpcEndpoint:
+    """
+    One JSON-RPC URL with its latency and health statistics.
+    """
+
+    def __init__(self, url: str, alpha: float):
+        self.url = url
+        self.limiter = OutboundLimiter(url)
+        self.provider = BatchingHTTPProvider(url, limiter=self.limiter)
+        self.alpha = alpha
+        self.latency: Optional[float] = None  # EWMA, seconds
+        self.error_rate = 0.0  # EWMA of failures per request
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.stats = {'requests': 0, 'failures': 0}
+
+    def record_success(self, latency: float):
+        self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+        self.error_rate *= 1 - self.alpha
+        self.consecutive_failures = 0
+        self.stats['requests'] += 1
+
+    def record_failure(self, failure_threshold: int, cooldown: float):
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        self.stats['requests'] += 1
+        self.stats['failures'] += 1
+        if self.consecutive_failures >= failure_threshold:
+            self.cooldown_until = time.monotonic() + cooldown
+
+    def is_healthy(self, max_error_rate: float) -> bool:
+        return time.monotonic() >= self.cooldown_until and self.error_rate <= max_error_rate
+
+    def score(self) -> float:
+        # Unmeasured endpoints score 0 so each gets tried early on
+        return (self.latency or 0.0) * (1 + 4 * self.error_rate)
+
+    def to_dict(self) -> Dict:
+        return {
+            'url': self.url,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'cooling_down': time.monotonic() < self.cooldown_until,
+            **self.stats,
+            'limiter': self.limiter.to_dict(),
+        }
+
+
+def is_endpoint_error(response: RPCResponse) -> bool:
+    error = response.get('error')
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get('message', '')).lower()
+    return error.get('code') in ENDPOINT_ERROR_CODES or any(text in message for text in ENDPOINT_ERROR_MESSAGES)
+
+
+class PooledRPCProvider(AsyncBaseProvider):
+    """
+    AsyncWeb3 provider spreading requests over several RPC endpoints.
+    """
+
+    def __init__(self, urls: List[str], hedge_delay_ms: Optional[float] = None):
+        super().__init__()
+        if not urls:
+            raise ValueError('PooledRPCProvider needs at least one RPC URL')
+        alpha = float(os.getenv('RPC_EWMA_ALPHA', RPC_EWMA_ALPHA))
+        self.endpoints = [RpcEndpoint(url, alpha) for url in urls]
+        self.max_error_rate = float(os.getenv('RPC_MAX_ERROR_RATE', RPC_MAX_ERROR_RATE))
+        self.failure_threshold = int(os.getenv('RPC_FAILURE_THRESHOLD', RPC_FAILURE_THRESHOLD))
+        self.cooldown = float(os.getenv('RPC_ENDPOINT_COOLDOWN', RPC_ENDPOINT_COOLDOWN))
+        if hedge_delay_ms is None:
+            hedge_delay_ms = float(os.getenv('RPC_HEDGE_DELAY_MS', RPC_HEDGE_DELAY_MS))
+        self.hedge_delay = hedge_delay_ms / 1000
+        self._sticky = self.endpoints[0]
+        self.stats = {'hedged': 0, 'hedge_wins': 0, 'failovers': 0}
+
+    def __str__(self) -> str:
+        return f'Pooled RPC connection to {len(self.endpoints)} endpoints'
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        for endpoint in self.endpoints:
+            if await endpoint.provider.is_connected(show_traceback):
+                return True
+        return False
+
+    async def close(self):
+        """
+        Wait for the requests in flight to every endpoint.
+        """
+        await asyncio.gather(*[endpoint.provider.close() for endpoint in self.endpoints])
+
+    def _read_order(self) -> List[RpcEndpoint]:
+        """
+        Healthy endpoints fastest first, then the unhealthy ones as a last resort.
+        """
+        return sorted(
+            self.endpoints,
+            key=lambda endpoint: (not endpoint.is_healthy(self.max_error_rate), endpoint.score()),
+        )
+
+    def _sticky_order(self) -> List[RpcEndpoint]:
+        """
+        The sticky endpoint first while it is healthy; otherwise move to the best healthy one.
+        """
+        order = self._read_order()
+        if not self._sticky.is_healthy(self.max_error_rate) and order[0] is not self._sticky:
+            pool_logger.warning(f'Moving sticky writes from {self._sticky.url} to {order[0].url}')
+            self._sticky = order[0]
+        return [self._sticky] + [endpoint for endpoint in order if endpoint is not self._sticky]
+
+    async def _call(self, endpoint: RpcEndpoint, method: RPCEndpoint, params: Any) -> RPCResponse:
+        started = time.monotonic()
+        try:
+            with tracer.child_span(f'rpc {method}', kind=SPAN_KIND_CLIENT, **{'rpc.endpoint': endpoint.url}):
+                response = await endpoint.provider.make_request(method, params)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            endpoint.record_failure(self.failure_threshold, self.cooldown)
+            RPC_ERRORS.labels(method).inc()
+            raise EndpointError(f'{endpoint.url}: {e}') from e
+
+        if is_endpoint_error(response):
+            endpoint.record_failure(self.failure_threshold, self.cooldown)
+            RPC_ERRORS.labels(method).inc()
+            raise EndpointError(f"{endpoint.url}: {response['error']}", response)
+
+        latency = time.monotonic() - started
+        endpoint.record_success(latency)
+        RPC_REQUEST_DURATION.labels(method).observe(latency)
+        return response
+
+    async def _hedged_call(self, primary: RpcEndpoint, backup: RpcEndpoint, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """
+        Send to `primary`, and also to `backup` if no answer arrives within the hedge delay.
+        """
+        primary_task = asyncio.ensure_future(self._call(primary, method, params))
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay)
+        except asyncio.CancelledError:
+            primary_task.cancel()
+            raise
+        if done:
+            if primary_task.exception() is None:
+                return primary_task.result()
+            return await self._call(backup, method, params)
+
+        self.stats['hedged'] += 1
+        backup_task = asyncio.ensure_future(self._call(backup, method, params))
+        pending = {primary_task, backup_task}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup_task:
+                            self.stats['hedge_wins'] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary_task, backup_task):
+                if task.done() and not task.cancelled():
+                    task.exception()  # Mark retrieved
+                task.cancel()
+
+    async def _find_transaction(self, endpoints: List[RpcEndpoint], tx_hash: str) -> bool:
+        """
+        Whether any of `endpoints` knows the transaction `tx_hash`; lookup failures count as unknown.
+        """
+        for endpoint in endpoints:
+            try:
+                response = await self._call(endpoint, RPCEndpoint('eth_getTransactionByHash'), [tx_hash])
+            except EndpointError:
+                continue
+            if response.get('result'):
+                return True
+        return False
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        sticky = method in STICKY_METHODS
+        candidates = self._sticky_order() if sticky else self._read_order()
+        tx_hash = '0x' + keccak(HexBytes(params[0])).hex() if method == 'eth_sendRawTransaction' else None
+
+        error = None
+        index = 0
+        while index < len(candidates):
+            endpoint = candidates[index]
+            hedge = not sticky and self.hedge_delay > 0 and index + 1 < len(candidates)
+            try:
+                if hedge:
+                    response = await self._hedged_call(endpoint, candidates[index + 1], method, params)
+                else:
+                    response = await self._call(endpoint, method, params)
+            except EndpointError as e:
+                error = e
+                index += 2 if hedge else 1
+                # The failed send may have been delivered; resending it could only
+                # fail with "already known", so look it up before failing over
+                if tx_hash is not None and await self._find_transaction(candidates[index - 1:], tx_hash):
+                    pool_logger.warning(f'{method} failed but {tx_hash} reached the node: {e}')
+                    return {'jsonrpc': '2.0', 'id': 0, 'result': tx_hash}
+                if index < len(candidates):
+                    self.stats['failovers'] += 1
+                    RPC_FAILOVERS.inc()
+                    pool_logger.warning(f'{method} failed, failing over: {e}')
+                continue
+
+            if sticky and endpoint is not self._sticky:
+                self._sticky = endpoint
+            if tx_hash is not None and error is not None and 'already known' in str(response.get('error', '')):
+                # An earlier attempt of this send was delivered after all
+                return {'jsonrpc': '2.0', 'id': 0, 'result': tx_hash}
+            return response
+
+        # Every endpoint failed; surface the last JSON-RPC error to web3 if there was one
+        if error.response is not None:
+            return error.response
+        raise error
+
+    def endpoint_stats(self) -> List[Dict]:
+        return [endpoint.to_dict() for endpoint in self.endpoints]
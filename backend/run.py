@@ -22,6 +22,11 @@ def main():
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
     reload = env == "dev"
+    # Workers share the signer's nonces through a SQLite coordinator file
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        reload = False  # uvicorn runs a single process when reloading
+        os.environ.setdefault("NONCE_DB_PATH", "nonce_coordinator.db")
     
     # Validate environment variables
     required_vars = ["INFURA_URL", "ORACLE_CONTRACT_ADDRESS", "SIGNER_ACCOUNT", "SIGNER_PRIVATE_KEY"]
@@ -35,6 +40,7 @@ def main():
     # Log startup information
     print(f"🚀 Starting backend in {env} mode")
     print(f"📍 Host: {host}:{port}")
+    print(f"👷 Workers: {workers}")
     print(f"🔗 Web3 Provider: {os.getenv('INFURA_URL', 'N/A')}")
     print(f"📱 Oracle Contract: {os.getenv('ORACLE_CONTRACT_ADDRESS', 'N/A')[:10]}...")
     
@@ -44,6 +50,9 @@ def main():
         host=host,
         port=port,
         reload=reload,
+        workers=workers,
+        # request_middleware writes the (sampled) per-request record
+        access_log=False,
     )
 
 if __name__ == "__main__":
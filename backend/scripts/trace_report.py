@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Latency breakdown of exported traces (TRACE_EXPORT_PATH files).
+
+Reads one or more OTLP/JSON span files written by the backend and the market
+monitor, joins them into traces and prints, per span name, the count, the
+p50/p95/max duration and the self time (duration not covered by child spans),
+which shows where slow requests actually spent their time. With --chrome it
+also writes the spans in the Chrome trace event format, for flame charts in
+Perfetto (ui.perfetto.dev) or chrome://tracing.
+
+Usage:
+    python scripts/trace_report.py traces-*.jsonl
+    python scripts/trace_report.py traces-*.jsonl --name 'POST /resolveMarket' --slowest 5
+    python scripts/trace_report.py traces-*.jsonl --chrome flame.json
+"""
+import argparse
+import json
+from collections import defaultdict
+from typing import Dict
+from typing import List
+
+
+def load_spans(paths: List[str]) -> List[Dict]:
+    spans = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for resource_spans in json.loads(line).get('resourceSpans', []):
+                    resource = {
+                        attribute['key']: next(iter(attribute['value'].values()))
+                        for attribute in resource_spans.get('resource', {}).get('attributes', [])
+                    }
+                    for scope_spans in resource_spans.get('scopeSpans', []):
+                        for span in scope_spans.get('spans', []):
+                            start = int(span['startTimeUnixNano'])
+                            spans.append({
+                                'trace_id': span['traceId'],
+                                'span_id': span['spanId'],
+                                'parent_id': span.get('parentSpanId'),
+                                'name': span['name'],
+                                'service': resource.get('service.name', ''),
+                                'pid': int(resource.get('process.pid', 0)),
+                                'start': start,
+                                'duration': int(span['endTimeUnixNano']) - start,
+                                'error': span.get('status', {}).get('code') == 2,
+                                'attributes': {
+                                    attribute['key']: next(iter(attribute['value'].values()))
+                                    for attribute in span.get('attributes', [])
+                                },
+                            })
+    return spans
+
+
+def covered_ns(intervals: List[tuple]) -> int:
+    """Total length of the union of (start, end) intervals."""
+    total = 0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def self_times(spans: List[Dict]) -> Dict[str, int]:
+    children = defaultdict(list)
+    for span in spans:
+        if span['parent_id']:
+            children[span['parent_id']].append(span)
+    result = {}
+    for span in spans:
+        end = span['start'] + span['duration']
+        # Clip children to the parent: receipt waits outlive the request that sent the transaction
+        intervals = [
+            (max(child['start'], span['start']), min(child['start'] + child['duration'], end))
+            for child in children[span['span_id']]
+        ]
+        result[span['span_id']] = span['duration'] - covered_ns([i for i in intervals if i[0] < i[1]])
+    return result
+
+
+def percentile(values: List[int], fraction: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def print_breakdown(spans: List[Dict]):
+    own = self_times(spans)
+    by_name = defaultdict(list)
+    for span in spans:
+        by_name[(span['service'], span['name'])].append(span)
+
+    print(f"{'service':<20} {'span':<36} {'count':>7} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'max ms':>9} {'self ms':>10}")
+    rows = sorted(by_name.items(), key=lambda item: -sum(own[span['span_id']] for span in item[1]))
+    for (service, name), group in rows:
+        durations = [span['duration'] for span in group]
+        print(
+            f'{service:<20} {name[:36]:<36} {len(group):>7} {sum(span["error"] for span in group):>6} '
+            f'{percentile(durations, 0.5) / 1e6:>9.1f} {percentile(durations, 0.95) / 1e6:>9.1f} '
+            f'{max(durations) / 1e6:>9.1f} {sum(own[span["span_id"]] for span in group) / 1e6:>10.1f}',
+        )
+
+
+def print_slowest(spans: List[Dict], name: str, count: int):
+    by_trace = defaultdict(list)
+    for span in spans:
+        by_trace[span['trace_id']].append(span)
+    matches = sorted((span for span in spans if span['name'] == name), key=lambda span: -span['duration'])
+    for root in matches[:count]:
+        print(f"\n{root['name']} {root['duration'] / 1e6:.1f} ms trace={root['trace_id']}")
+        children = defaultdict(list)
+        for span in by_trace[root['trace_id']]:
+            children[span['parent_id']].append(span)
+
+        def walk(span, depth):
+            for child in sorted(children[span['span_id']], key=lambda child: child['start']):
+                offset = (child['start'] - root['start']) / 1e6
+                flag = ' ERROR' if child['error'] else ''
+                print(f"{'  ' * depth}+{offset:>8.1f} ms {child['duration'] / 1e6:>8.1f} ms  {child['name']}{flag}")
+                walk(child, depth + 1)
+        walk(root, 1)
+
+
+def write_chrome_trace(spans: List[Dict], path: str):
+    events = [
+        {
+            'name': span['name'],
+            'cat': span['service'],
+            'ph': 'X',
+            'ts': span['start'] / 1000,
+            'dur': span['duration'] / 1000,
+            'pid': span['pid'],
+            # One row per trace keeps concurrent requests from overlapping
+            'tid': int(span['trace_id'][:7], 16),
+            'args': {**span['attributes'], 'trace_id': span['trace_id']},
+        }
+        for span in spans
+    ]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    print(f'Wrote {len(events)} events to {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency breakdown of exported traces')
+    parser.add_argument('files', nargs='+', help='OTLP/JSON span files')
+    parser.add_argument('--name', help='Print the span tree of the slowest spans with this name')
+    parser.add_argument('--slowest', type=int, default=3, help='Number of span trees to print with --name')
+    parser.add_argument('--chrome', help='Also write a Chrome trace event file to this path')
+    args = parser.parse_args()
+
+    spans = load_spans(args.files)
+    print(f'{len(spans)} spans in {len({span["trace_id"] for span in spans})} traces\n')
+    if spans:
+        print_breakdown(spans)
+    if args.name:
+        print_slowest(spans, args.name, args.slowest)
+    if args.chrome:
+        write_chrome_trace(spans, args.chrome)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Pool of signer accounts for transaction submission.
+
+Per-account nonce ordering caps what one account can push through: its
+transactions are mined strictly in nonce order, and one that is stuck blocks
+everything behind it. The pool spreads submissions over several accounts,
+each with its own nonce manager and its own pending transactions. A new
+submission goes to the least-loaded healthy account of its lane, where load
+is leased submissions plus transactions waiting for a receipt.
+
+Resolutions have their own lane (the first RESOLUTION_SIGNERS accounts), so a
+backlog of market creations never delays them; when every resolution account
+is unhealthy they borrow a healthy account from the default lane. Accounts
+whose oldest pending transaction is older than SIGNER_STUCK_TIMEOUT, or whose
+sends failed SIGNER_FAILURE_THRESHOLD times in a row, are skipped until they
+recover. Stuck accounts are also looked for every SIGNER_HEALTH_INTERVAL in
+the background, so a dropped transaction gets its nonces resynced without
+waiting for the next submission.
+"""
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from logger import logger
+
+accounts_logger = logger.bind(
+    service='I Was BORED|Signer Accounts',
+)
+
+RESOLUTION_SIGNERS = 1  # Accounts reserved for resolutions when the pool has more than this
+SIGNER_STUCK_TIMEOUT = 60  # Seconds a pending transaction may wait before its account is skipped
+SIGNER_FAILURE_THRESHOLD = 3  # Consecutive failed sends before an account is cooled down
+SIGNER_COOLDOWN = 30  # Seconds an account is skipped after repeated failures
+SIGNER_HEALTH_INTERVAL = 5  # Seconds between background checks for stuck accounts
+
+LANE_RESOLUTION = 'resolution'
+LANE_DEFAULT = 'default'
+RESOLUTION_FUNCTIONS = ('resolveMarket',)
+
+
+class SignerAccount:
+    """
+    One signing key with its nonce manager and health statistics.
+    """
+
+    def __init__(self, address: str, private_key: str, nonce_manager, lane: str):
+        self.address = address
+        self.private_key = private_key
+        self.nonce_manager = nonce_manager
+        self.lane = lane
+        self.leased = 0  # Submissions in progress
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.stuck = False
+        self.stats = {'sent': 0, 'failures': 0}
+
+    def __repr__(self) -> str:
+        return f'SignerAccount({self.address}, lane={self.lane})'
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.stats['sent'] += 1
+
+    def record_failure(self, failure_threshold: int, cooldown: float):
+        self.consecutive_failures += 1
+        self.stats['failures'] += 1
+        if self.consecutive_failures >= failure_threshold:
+            if not self.cooling_down:
+                accounts_logger.warning(
+                    f'Signer {self.address} failed {self.consecutive_failures} sends in a row, '
+                    f'skipping it for {cooldown:.0f} seconds',
+                )
+            self.cooldown_until = time.monotonic() + cooldown
+
+
+class SignerAccountPool:
+    """
+    Picks the signer account for each submission.
+    """
+
+    def __init__(
+        self,
+        accounts: List[Tuple[str, str, object]],
+        receipt_tracker,
+        resolution_signers: Optional[int] = None,
+        stuck_timeout: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        cooldown: Optional[float] = None,
+        health_interval: Optional[float] = None,
+    ):
+        """
+        Args:
+            accounts (list): (address, private key, nonce manager) per account, primary first.
+            receipt_tracker (ReceiptTracker): Source of the pending transactions per account.
+            resolution_signers (int, optional): Accounts dedicated to resolutions.
+            stuck_timeout (float, optional): Seconds before a pending transaction marks its account stuck.
+            failure_threshold (int, optional): Consecutive failed sends before a cooldown.
+            cooldown (float, optional): Seconds an account is skipped after repeated failures.
+            health_interval (float, optional): Seconds between background checks for stuck accounts.
+        """
+        resolution_signers = resolution_signers if resolution_signers is not None else int(
+            os.getenv('RESOLUTION_SIGNERS', RESOLUTION_SIGNERS),
+        )
+        self.receipt_tracker = receipt_tracker
+        self.stuck_timeout = stuck_timeout or float(os.getenv('SIGNER_STUCK_TIMEOUT', SIGNER_STUCK_TIMEOUT))
+        self.failure_threshold = failure_threshold or int(
+            os.getenv('SIGNER_FAILURE_THRESHOLD', SIGNER_FAILURE_THRESHOLD),
+        )
+        self.cooldown = cooldown or float(os.getenv('SIGNER_COOLDOWN', SIGNER_COOLDOWN))
+        self.health_interval = health_interval or float(os.getenv('SIGNER_HEALTH_INTERVAL', SIGNER_HEALTH_INTERVAL))
+        self._task: Optional[asyncio.Task] = None
+
+        # With too few accounts for separate lanes, both lanes share all of them
+        self.dedicated = 0 < resolution_signers < len(accounts)
+        self.accounts = [
+            SignerAccount(
+                address, private_key, nonce_manager,
+                LANE_RESOLUTION if self.dedicated and index < resolution_signers else LANE_DEFAULT,
+            )
+            for index, (address, private_key, nonce_manager) in enumerate(accounts)
+        ]
+        self.lanes = {
+            LANE_RESOLUTION: [a for a in self.accounts if a.lane == LANE_RESOLUTION] or self.accounts,
+            LANE_DEFAULT: [a for a in self.accounts if a.lane == LANE_DEFAULT],
+        }
+
+    def __iter__(self) -> Iterator[SignerAccount]:
+        return iter(self.accounts)
+
+    async def initialize(self):
+        for account in self.accounts:
+            await account.nonce_manager.initialize()
+        if self.dedicated:
+            accounts_logger.info(
+                f'{len(self.accounts)} signer accounts: {len(self.lanes[LANE_RESOLUTION])} for resolutions, '
+                f'{len(self.lanes[LANE_DEFAULT])} for everything else',
+            )
+        else:
+            accounts_logger.info(f'{len(self.accounts)} signer account(s), shared by every function')
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def check_health(self):
+        """
+        Update whether each account is stuck; a newly stuck account resyncs its nonces.
+        """
+        pending = self.receipt_tracker.pending_by_account()
+        now = time.time()
+        for account in self.accounts:
+            self._is_healthy(account, pending.get(account.address.lower(), (0, None))[1], now)
+
+    async def _run(self):
+        # Submissions check too, but with little traffic the next one may be far off
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                self.check_health()
+            except Exception as e:
+                accounts_logger.error(f'Signer health check failed: {e}')
+
+    @staticmethod
+    def lane_for(function: str) -> str:
+        return LANE_RESOLUTION if function in RESOLUTION_FUNCTIONS else LANE_DEFAULT
+
+    def loads(self) -> Dict[str, int]:
+        """Leased plus pending submissions per account address, for the metrics."""
+        pending = self.receipt_tracker.pending_by_account()
+        return {
+            account.address: account.leased + pending.get(account.address.lower(), (0, None))[0]
+            for account in self.accounts
+        }
+
+    def _is_healthy(self, account: SignerAccount, oldest_pending: Optional[float], now: float) -> bool:
+        stuck = oldest_pending is not None and now - oldest_pending > self.stuck_timeout
+        if stuck and not account.stuck:
+            accounts_logger.warning(
+                f'Signer {account.address} has a transaction pending for {now - oldest_pending:.0f} seconds, '
+                f'skipping it and resyncing its nonces',
+            )
+            # Fills the nonce gap if the node dropped the transaction
+            account.nonce_manager.schedule_resync()
+        elif account.stuck and not stuck:
+            accounts_logger.info(f'Signer {account.address} is no longer stuck')
+        account.stuck = stuck
+        return not stuck and not account.cooling_down
+
+    def _choose(self, function: str, count: int) -> List[SignerAccount]:
+        pending = self.receipt_tracker.pending_by_account()
+        now = time.time()
+        lane = self.lanes[self.lane_for(function)]
+        candidates = [
+            account for account in lane
+            if self._is_healthy(account, pending.get(account.address.lower(), (0, None))[1], now)
+        ]
+        if not candidates and lane is self.lanes[LANE_RESOLUTION]:
+            # Resolutions borrow from the default lane rather than wait behind a stuck account
+            candidates = [
+                account for account in self.lanes[LANE_DEFAULT]
+                if self._is_healthy(account, pending.get(account.address.lower(), (0, None))[1], now)
+            ]
+        if not candidates:
+            candidates = lane
+
+        chosen = []
+        loads = {
+            account.address: account.leased + pending.get(account.address.lower(), (0, None))[0]
+            for account in candidates
+        }
+        for _ in range(count):
+            account = min(candidates, key=lambda account: loads[account.address])
+            loads[account.address] += 1
+            account.leased += 1
+            chosen.append(account)
+        return chosen
+
+    @contextmanager
+    def lease(self, function: str):
+        """
+        Pick the account for one submission; it counts as load until the block exits.
+
+        Register the transaction with the receipt tracker inside the block, so the
+        account's load carries over from the lease to the pending transaction.
+        """
+        (account,) = self._choose(function, 1)
+        try:
+            yield account
+        finally:
+            account.leased -= 1
+
+    @contextmanager
+    def lease_many(self, function: str, count: int):
+        """
+        Spread `count` submissions over the least-loaded accounts.
+
+        Yields:
+            list: The account for each submission, in order.
+        """
+        accounts = self._choose(function, count)
+        try:
+            yield accounts
+        finally:
+            for account in accounts:
+                account.leased -= 1
+
+    def record_success(self, account: SignerAccount):
+        account.record_success()
+
+    def record_failure(self, account: SignerAccount):
+        account.record_failure(self.failure_threshold, self.cooldown)
@@ -0,0 +1,186 @@
+"""
+Single-flight and idempotency layer for write requests.
+
+Retries from clients, the monitor and tenacity can ask for the same
+transaction several times. Requests are keyed (e.g. by function and
+question_id): a request whose key is already being submitted attaches to
+that submission, and recent results are kept in a bounded TTL/LRU store so
+repeats return immediately instead of sending a duplicate transaction.
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from logger import logger
+
+single_flight_logger = logger.bind(
+    service='I Was BORED|Single Flight',
+)
+
+IDEMPOTENCY_TTL = 600  # Seconds a submission result is reused for
+IDEMPOTENCY_MAX_ENTRIES = 10000
+
+
+class SubmissionInFlightError(Exception):
+    """
+    The key is being submitted by another process, which did not publish a result in time.
+    """
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent and repeated submissions by key.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        reusable: Optional[Callable[[Any], bool]] = None,
+        pinned: Optional[Callable[[Any], bool]] = None,
+    ):
+        """
+        Args:
+            ttl (float, optional): Seconds a stored result stays valid.
+            max_entries (int, optional): Maximum number of stored results, least
+                recently used first out; pinned results are kept regardless.
+            reusable (callable, optional): Decides whether a stored result may be
+                returned again, e.g. to retry failed transactions.
+            pinned (callable, optional): Keeps a stored result past the TTL, e.g.
+                while its transaction may still be mined.
+        """
+        self.ttl = ttl or float(os.getenv('IDEMPOTENCY_TTL', IDEMPOTENCY_TTL))
+        self.max_entries = max_entries or int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', IDEMPOTENCY_MAX_ENTRIES))
+        self.reusable = reusable or (lambda value: True)
+        self.pinned = pinned or (lambda value: False)
+
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._results: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()  # key -> (stored_at, value), LRU first
+        self.stats = {'submitted': 0, 'attached': 0, 'cached': 0}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight or key in self._results
+
+    def _cached(self, key: Hashable) -> Optional[Any]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        expired = time.monotonic() - stored_at > self.ttl and not self.pinned(value)
+        if expired or not self.reusable(value):
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return value
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """
+        Return a reusable stored result, or the future of an in-flight submission.
+
+        Returns:
+            The stored value, an asyncio.Future, or None if the key is unknown.
+        """
+        value = self._cached(key)
+        if value is not None:
+            self.stats['cached'] += 1
+            return value
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['attached'] += 1
+        return future
+
+    def claim(self, key: Hashable) -> asyncio.Future:
+        """
+        Mark `key` as in flight; the caller must `resolve` or `fail` it.
+
+        Raises:
+            RuntimeError: If `key` is already in flight; `lookup` first and attach to it.
+        """
+        if key in self._inflight:
+            raise RuntimeError(f'Submission for {key} is already in flight')
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.stats['submitted'] += 1
+        return future
+
+    def resolve(self, key: Hashable, value: Any):
+        future = self._inflight.pop(key, None)
+        if future is None:
+            single_flight_logger.warning(f'Ignoring result for {key}, which is not in flight')
+            return
+        if not future.done():
+            future.set_result(value)
+        self._results[key] = (time.monotonic(), value)
+        self._results.move_to_end(key)
+        excess = len(self._results) - self.max_entries
+        if excess > 0:
+            # Pinned results are never evicted (a retry would resubmit); the store grows past the cap instead
+            evictable = (old_key for old_key, (_, old_value) in self._results.items() if not self.pinned(old_value))
+            for old_key in list(itertools.islice(evictable, excess)):
+                del self._results[old_key]
+
+    def fail(self, key: Hashable, error: BaseException):
+        future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+            return
+        future.set_exception(error)
+        # Mark the exception retrieved in case nobody attached
+        future.exception()
+
+    async def claimed_elsewhere(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Take the claim on freshly claimed keys beyond this process.
+
+        Subclasses sharing keys between processes return the results of the keys
+        another process has submitted; this process sends only the rest.
+
+        Returns:
+            dict: key -> result submitted elsewhere, or the exception (e.g.
+                SubmissionInFlightError) to fail the key with.
+        """
+        return {}
+
+    async def do(self, key: Hashable, submit: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `submit` once per key, sharing its result with concurrent and repeated callers.
+
+        Args:
+            key: The idempotency key.
+            submit (callable): Returns the awaitable doing the actual submission.
+
+        Returns:
+            The submission result.
+        """
+        existing = self.lookup(key)
+        if isinstance(existing, asyncio.Future):
+            single_flight_logger.info(f'Attaching to in-flight submission for {key}')
+            return await asyncio.shield(existing)
+        if existing is not None:
+            single_flight_logger.info(f'Returning stored submission for {key}')
+            return existing
+
+        self.claim(key)
+        try:
+            value = (await self.claimed_elsewhere([key])).get(key)
+            if isinstance(value, Exception):
+                raise value
+            if value is None:
+                value = await submit()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.resolve(key, value)
+        return value
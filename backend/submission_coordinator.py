@@ -0,0 +1,535 @@
+"""
+Cross-process nonce and job coordination for multi-worker deployments.
+
+With several uvicorn workers on one host, each worker has its own event loop
+and memory, so the in-process NonceManager would hand out the same nonces
+twice. SharedNonceManager keeps the allocator (next nonce, gaps and live
+reservations) in a SQLite file instead: every reservation runs in a
+write transaction under an exclusive lock on a file next to the database, so
+workers allocate from one sequence. (SQLite's own busy handler would also
+serialize them, but it polls with sleeps of up to 100 ms; retrying the flock
+every few milliseconds hands the lock over much sooner. The wait is bounded by
+NONCE_LOCK_TIMEOUT, so a stuck worker fails the others' transactions instead
+of hanging them.) Reservations record the worker's pid
+and, once the transaction is out, when it was sent. Unsent reservations left
+behind by a worker that died are recovered as gaps on the next resync; those of
+a live worker are never taken from it, however long it holds them.
+
+The same database holds submitted jobs, so `/jobs/{job_id}` answers for a
+transaction sent by any worker, and the idempotency keys of write requests
+(SharedSingleFlight), so a retry that lands on another worker attaches to the
+transaction already sent instead of sending a duplicate. All database access
+happens on one thread per process, so waiting for the file lock never blocks
+the event loop.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; SQLite's busy timeout still serializes the workers
+    fcntl = None
+
+from logger import logger
+from metrics import NONCE_RESETS
+from nonce_manager import NonceManager
+from single_flight import SingleFlight
+from single_flight import SubmissionInFlightError
+
+coordinator_logger = logger.bind(
+    service='I Was BORED|Submission Coordinator',
+)
+
+NONCE_DB_PATH = ''  # Empty keeps nonces in process (single worker)
+NONCE_LOCK_TIMEOUT = 10  # Seconds to wait for the file lock, and for SQLite's, held by another worker
+SHARED_JOB_RETENTION = 3600  # Seconds finished jobs stay visible to other workers
+SUBMISSION_POLL_INTERVAL = 0.1  # Seconds between checks on a submission claimed by another worker
+SUBMISSION_WAIT_TIMEOUT = 30  # Seconds to wait for another worker's submission before answering 409
+COORDINATOR_WRITE_RETRIES = 3  # Retries of a queued write (claim publish/withdraw) that failed
+SENT_NONCE_RETENTION = 600  # Seconds a sent nonce is remembered for resyncs reading the pending count
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nonce_state (
+    account TEXT PRIMARY KEY,
+    next_nonce INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nonce_gaps (
+    account TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    PRIMARY KEY (account, nonce)
+);
+CREATE TABLE IF NOT EXISTS nonce_reservations (
+    account TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    pid INTEGER NOT NULL,
+    reserved_at REAL NOT NULL,
+    sent_at REAL,
+    PRIMARY KEY (account, nonce)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at);
+CREATE TABLE IF NOT EXISTS submissions (
+    key TEXT PRIMARY KEY,
+    job_id TEXT,
+    pid INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+);
+"""
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SubmissionCoordinator:
+    """
+    SQLite database shared by the workers on one host.
+    """
+
+    def __init__(self, path: Optional[str] = None, lock_timeout: Optional[float] = None):
+        self.path = path or os.getenv('NONCE_DB_PATH', NONCE_DB_PATH)
+        self.lock_timeout = lock_timeout or float(os.getenv('NONCE_LOCK_TIMEOUT', NONCE_LOCK_TIMEOUT))
+        self.job_retention = float(os.getenv('SHARED_JOB_RETENTION', SHARED_JOB_RETENTION))
+        self.pid = os.getpid()
+        # All database access happens on this one thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='submission-coordinator')
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock_file = None
+        self._last_prune = 0.0
+
+    async def run(self, function, *args):
+        """
+        Run `function(connection, *args)` in one write transaction on the database thread.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._transaction, function, *args)
+
+    def submit(self, function, *args, retries: int = 0):
+        """
+        Queue a write transaction without waiting for it.
+
+        It runs after every transaction queued before it, so a release or
+        mark_sent always follows the reservation it refers to. A failed write
+        is queued again up to `retries` times.
+        """
+        try:
+            future = self._executor.submit(self._transaction, function, *args)
+        except RuntimeError as e:  # Closed
+            coordinator_logger.error(f'Coordinator write dropped: {e}')
+            return
+        future.add_done_callback(lambda done: self._after_write(done, function, args, retries))
+
+    def _after_write(self, future, function, args, retries: int):
+        error = future.exception()
+        if error is None:
+            return
+        if retries > 0:
+            coordinator_logger.warning(f'Coordinator write failed, retrying: {error}')
+            self.submit(function, *args, retries=retries - 1)
+        else:
+            coordinator_logger.error(f'Coordinator write failed: {error}')
+
+    def _lock(self):
+        # Non-blocking attempts until lock_timeout, so a stuck worker cannot hang this thread forever
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(
+                        f'Another worker has held {self.path}.lock for over {self.lock_timeout:.0f} seconds',
+                    ) from None
+                time.sleep(delay)
+                delay = min(delay * 2, 0.005)
+
+    def _transaction(self, function, *args):
+        if self._lock_file is not None:
+            self._lock()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front, so the reads below see the latest state
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                result = function(self._connection, *args)
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+            return result
+        finally:
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open(self):
+        # isolation_level=None leaves transaction control to _transaction
+        self._connection = sqlite3.connect(
+            self.path, timeout=self.lock_timeout, isolation_level=None, check_same_thread=False,
+        )
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        columns = {row[1] for row in self._connection.execute('PRAGMA table_info(nonce_reservations)')}
+        if 'sent_at' not in columns:  # Database created before sent nonces were recorded
+            self._connection.execute('ALTER TABLE nonce_reservations ADD COLUMN sent_at REAL')
+        if fcntl is not None:
+            self._lock_file = open(f'{self.path}.lock', 'a')
+
+    async def open(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        coordinator_logger.info(f'Coordinating nonces and jobs through {self.path} (pid {self.pid})')
+
+    async def close(self):
+        if self._connection is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._connection.close)
+            self._connection = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._executor.shutdown(wait=False)
+
+    def save_job(self, job: Dict):
+        """Publish a job's current state to the other workers."""
+        self.submit(self._save_job, job)
+
+    def _save_job(self, connection: sqlite3.Connection, job: Dict):
+        now = time.time()
+        connection.execute(
+            'INSERT OR REPLACE INTO jobs (job_id, record, updated_at) VALUES (?, ?, ?)',
+            (job['job_id'], json.dumps(job), now),
+        )
+        if now - self._last_prune > 60:
+            self._last_prune = now
+            connection.execute('DELETE FROM jobs WHERE updated_at < ?', (now - self.job_retention,))
+            connection.execute(
+                'DELETE FROM submissions WHERE job_id IS NOT NULL AND job_id NOT IN (SELECT job_id FROM jobs)',
+            )
+
+    async def load_job(self, job_id: str) -> Optional[Dict]:
+        """Look up a job submitted by any worker."""
+        row = await self.run(
+            lambda connection: connection.execute('SELECT record FROM jobs WHERE job_id = ?', (job_id,)).fetchone(),
+        )
+        return json.loads(row[0]) if row else None
+
+
+class SharedNonceManager(NonceManager):
+    """
+    NonceManager whose allocator state lives in the coordinator database.
+
+    The in-process lock still serializes this worker's reservations, so the
+    writer lock metrics and spans keep their meaning; the database transaction
+    inside it serializes the workers.
+    """
+
+    def __init__(self, w3, account: str, coordinator: SubmissionCoordinator, lock: Optional[asyncio.Lock] = None):
+        super().__init__(w3, account, lock)
+        self.coordinator = coordinator
+        self._last_prune = 0.0
+
+    async def initialize(self):
+        """
+        Join the shared sequence, or start it from the pending transaction count.
+        """
+        read_started = time.time()
+        pending_count = await self.w3.eth.get_transaction_count(self.account, 'pending')
+        async with self._locked():
+            self._next_nonce, gaps, recovered = await self.coordinator.run(
+                self._sync, pending_count, read_started, True,
+            )
+        coordinator_logger.info(
+            f'Shared nonce manager for {self.account} starting at {self._next_nonce}: '
+            f'pending={pending_count}, gaps={gaps}, recovered={recovered}',
+        )
+
+    async def reserve(self) -> int:
+        return (await self.reserve_many(1))[0]
+
+    async def reserve_many(self, count: int) -> List[int]:
+        async with self._locked():
+            nonces, gaps_filled, self._next_nonce = await self.coordinator.run(self._reserve, count)
+            self._reserved.update(nonces)
+            self.stats['gaps_filled'] += gaps_filled
+            self.stats['reserved'] += count
+            return nonces
+
+    def mark_sent(self, nonce: int):
+        self._reserved.discard(nonce)
+        # The send time, not the time the write runs, decides whether a resync's read could count it
+        self.coordinator.submit(self._mark_sent, nonce, time.time())
+
+    def release(self, nonce: int):
+        if nonce in self._reserved:
+            self._reserved.discard(nonce)
+            self.coordinator.submit(self._release, nonce)
+
+    async def resync(self):
+        """
+        Reconcile the shared allocator with the pending count and reclaim abandoned reservations.
+
+        Nonces sent (by any worker) after the pending count was requested are
+        kept out of the gaps: the count may not include them yet.
+        """
+        read_started = time.time()
+        pending_count = await self.w3.eth.get_transaction_count(self.account, 'pending')
+        async with self._locked():
+            self.stats['resyncs'] += 1
+            NONCE_RESETS.inc()
+            self._next_nonce, gaps, recovered = await self.coordinator.run(
+                self._sync, pending_count, read_started, False,
+            )
+            coordinator_logger.info(
+                f'Nonce resync for {self.account}: pending={pending_count}, '
+                f'next={self._next_nonce}, gaps={gaps}, recovered={recovered}',
+            )
+
+    # The methods below run inside a coordinator transaction on its thread
+
+    def _reserve(self, connection: sqlite3.Connection, count: int) -> Tuple[List[int], int, int]:
+        nonces = [
+            nonce for (nonce,) in connection.execute(
+                'SELECT nonce FROM nonce_gaps WHERE account = ? ORDER BY nonce LIMIT ?', (self.account, count),
+            )
+        ]
+        gaps_filled = len(nonces)
+        connection.executemany(
+            'DELETE FROM nonce_gaps WHERE account = ? AND nonce = ?', [(self.account, nonce) for nonce in nonces],
+        )
+        (next_nonce,) = connection.execute(
+            'SELECT next_nonce FROM nonce_state WHERE account = ?', (self.account,),
+        ).fetchone()
+        nonces.extend(range(next_nonce, next_nonce + count - gaps_filled))
+        next_nonce += count - gaps_filled
+        connection.execute('UPDATE nonce_state SET next_nonce = ? WHERE account = ?', (next_nonce, self.account))
+        now = time.time()
+        connection.executemany(
+            'INSERT OR REPLACE INTO nonce_reservations (account, nonce, pid, reserved_at, sent_at) '
+            'VALUES (?, ?, ?, ?, NULL)',
+            [(self.account, nonce, self.coordinator.pid, now) for nonce in nonces],
+        )
+        return nonces, gaps_filled, next_nonce
+
+    def _mark_sent(self, connection: sqlite3.Connection, nonce: int, sent_at: float):
+        # Kept until no resync can still be reading a pending count from before the send
+        connection.execute(
+            'UPDATE nonce_reservations SET sent_at = ? WHERE account = ? AND nonce = ?', (sent_at, self.account, nonce),
+        )
+        if sent_at - self._last_prune > 60:
+            self._last_prune = sent_at
+            connection.execute(
+                'DELETE FROM nonce_reservations WHERE account = ? AND sent_at < ?',
+                (self.account, sent_at - SENT_NONCE_RETENTION),
+            )
+
+    def _release(self, connection: sqlite3.Connection, nonce: int):
+        connection.execute(
+            'DELETE FROM nonce_reservations WHERE account = ? AND nonce = ?', (self.account, nonce),
+        )
+        connection.execute(
+            'INSERT OR IGNORE INTO nonce_gaps (account, nonce) VALUES (?, ?)', (self.account, nonce),
+        )
+
+    def _sync(
+        self, connection: sqlite3.Connection, pending_count: int, read_started: float, starting: bool,
+    ) -> Tuple[int, int, int]:
+        reservations = connection.execute(
+            'SELECT nonce, pid, sent_at FROM nonce_reservations WHERE account = ?', (self.account,),
+        ).fetchall()
+        # Nonces sent before the read are in the pending count, or were dropped and are gaps below
+        counted = [nonce for nonce, _, sent_at in reservations if sent_at is not None and sent_at < read_started]
+        # Unsent reservations of dead workers (and, on startup, of an earlier process with our pid)
+        # never complete; a live worker keeps its reservations however long it holds them
+        stale = [
+            nonce for nonce, pid, sent_at in reservations
+            if sent_at is None and (
+                (starting and pid == self.coordinator.pid)
+                or (pid != self.coordinator.pid and not _process_alive(pid))
+            )
+        ]
+        connection.executemany(
+            'DELETE FROM nonce_reservations WHERE account = ? AND nonce = ?',
+            [(self.account, nonce) for nonce in counted + stale],
+        )
+        # Reserved, or sent too recently for the pending count to include
+        held = {nonce for nonce, _, _ in reservations} - set(counted) - set(stale)
+
+        # A reclaimed nonce may have been sent before its worker died; reusing it then
+        # fails with "nonce too low", which retires it for good
+        gaps = {
+            nonce for (nonce,) in connection.execute(
+                'SELECT nonce FROM nonce_gaps WHERE account = ?', (self.account,),
+            )
+        }
+        gaps = {nonce for nonce in gaps.union(stale) if nonce >= pending_count}
+
+        row = connection.execute('SELECT next_nonce FROM nonce_state WHERE account = ?', (self.account,)).fetchone()
+        next_nonce = row[0] if row else pending_count
+        if pending_count >= next_nonce:
+            next_nonce = pending_count
+        elif pending_count not in held:
+            gaps.add(pending_count)
+
+        connection.execute(
+            'INSERT OR REPLACE INTO nonce_state (account, next_nonce) VALUES (?, ?)', (self.account, next_nonce),
+        )
+        connection.execute('DELETE FROM nonce_gaps WHERE account = ?', (self.account,))
+        connection.executemany(
+            'INSERT INTO nonce_gaps (account, nonce) VALUES (?, ?)', [(self.account, nonce) for nonce in sorted(gaps)],
+        )
+        return next_nonce, len(gaps), len(stale)
+
+
+class SharedSingleFlight(SingleFlight):
+    """
+    SingleFlight whose idempotency keys are shared with the other workers.
+
+    A key is claimed in this worker first, then in the coordinator database.
+    If another worker holds the database claim, this one waits for that
+    worker's job to be published and adopts it through the receipt tracker,
+    under the same `reusable`, `pinned` and TTL rules as local results. Claims
+    of workers that died before publishing a job are taken over; a live worker
+    that does not publish within the wait timeout fails the key with
+    SubmissionInFlightError rather than risking a second transaction.
+    """
+
+    def __init__(
+        self,
+        coordinator: SubmissionCoordinator,
+        tracker,
+        poll_interval: Optional[float] = None,
+        wait_timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            coordinator (SubmissionCoordinator): The database shared by the workers.
+            tracker (ReceiptTracker): Adopts jobs submitted by other workers.
+            poll_interval (float, optional): Seconds between checks on another worker's claim.
+            wait_timeout (float, optional): Seconds to wait for another worker's job.
+            **kwargs: Passed on to SingleFlight.
+        """
+        super().__init__(**kwargs)
+        self.coordinator = coordinator
+        self.tracker = tracker
+        self.poll_interval = poll_interval or float(os.getenv('SUBMISSION_POLL_INTERVAL', SUBMISSION_POLL_INTERVAL))
+        self.wait_timeout = wait_timeout or float(os.getenv('SUBMISSION_WAIT_TIMEOUT', SUBMISSION_WAIT_TIMEOUT))
+        self.write_retries = int(os.getenv('COORDINATOR_WRITE_RETRIES', COORDINATOR_WRITE_RETRIES))
+
+    @staticmethod
+    def _row_key(key: Hashable) -> str:
+        return json.dumps(key)
+
+    async def claimed_elsewhere(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        found = {}
+        replaceable = {}  # row key -> job_id of a published job that may not be reused
+        waiting = list(keys)
+        deadline = time.monotonic() + self.wait_timeout
+        while waiting:
+            rows = await self.coordinator.run(self._claim, [self._row_key(key) for key in waiting], replaceable)
+            retry = []
+            busy = []
+            for key, row in zip(waiting, rows):
+                if row is None:
+                    continue  # Claimed for this worker
+                job_id, record, stored_at = row
+                if job_id is None:
+                    # Another live worker is still submitting it
+                    busy.append(key)
+                    continue
+                job = self.tracker.track(record)
+                expired = time.time() - stored_at > self.ttl and not self.pinned(job)
+                if expired or not self.reusable(job):
+                    replaceable[self._row_key(key)] = job_id
+                    retry.append(key)
+                else:
+                    coordinator_logger.info(f'Attaching to submission for {key} sent by another worker')
+                    found[key] = job
+            if busy and time.monotonic() >= deadline:
+                for key in busy:
+                    coordinator_logger.warning(f'Submission for {key} is still in flight on another worker')
+                    found[key] = SubmissionInFlightError(
+                        f'Submission for {key} is still in flight on another worker; retry later',
+                    )
+                busy = []
+            waiting = retry + busy
+            if busy:
+                await asyncio.sleep(self.poll_interval)
+        return found
+
+    def resolve(self, key: Hashable, value: Any):
+        super().resolve(key, value)
+        self.coordinator.submit(
+            self._publish, self._row_key(key), value.job_id, time.time(), retries=self.write_retries,
+        )
+
+    def fail(self, key: Hashable, error: BaseException):
+        super().fail(key, error)
+        # A withdraw that never lands would hold the key for as long as this worker lives
+        self.coordinator.submit(self._withdraw, self._row_key(key), retries=self.write_retries)
+
+    # The methods below run inside a coordinator transaction on its thread
+
+    def _claim(
+        self, connection: sqlite3.Connection, row_keys: List[str], replaceable: Dict[str, str],
+    ) -> List[Optional[Tuple[Optional[str], Optional[Dict], float]]]:
+        pid = self.coordinator.pid
+        now = time.time()
+        rows = []
+        for row_key in row_keys:
+            row = connection.execute(
+                'SELECT job_id, pid, stored_at FROM submissions WHERE key = ?', (row_key,),
+            ).fetchone()
+            record = None
+            if row is not None and row[0] is not None:
+                stored = connection.execute('SELECT record FROM jobs WHERE job_id = ?', (row[0],)).fetchone()
+                record = json.loads(stored[0]) if stored else None
+
+            if row is None:
+                take = True
+            elif row[0] is None:
+                # This worker holds the local claim, so an unpublished claim with our pid is left over;
+                # a dead worker may have sent its transaction before dying, which cannot be known here
+                take = row[1] == pid or not _process_alive(row[1])
+            else:
+                take = record is None or replaceable.get(row_key) == row[0]
+
+            if take:
+                connection.execute(
+                    'INSERT OR REPLACE INTO submissions (key, job_id, pid, stored_at) VALUES (?, NULL, ?, ?)',
+                    (row_key, pid, now),
+                )
+                rows.append(None)
+            else:
+                rows.append((row[0], record, row[2]))
+        return rows
+
+    def _publish(self, connection: sqlite3.Connection, row_key: str, job_id: str, stored_at: float):
+        connection.execute(
+            'UPDATE submissions SET job_id = ?, stored_at = ? WHERE key = ? AND pid = ? AND job_id IS NULL',
+            (job_id, stored_at, row_key, self.coordinator.pid),
+        )
+
+    def _withdraw(self, connection: sqlite3.Connection, row_key: str):
+        connection.execute(
+            'DELETE FROM submissions WHERE key = ? AND pid = ? AND job_id IS NULL', (row_key, self.coordinator.pid),
+        )
@@ -0,0 +1,206 @@
+"""
+Shared fixtures: local aiohttp stand-ins for JSON-RPC nodes and plain HTTP APIs,
+and the transaction submission services running against the bench mock chain.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import pytest
+from aiohttp import web
+from eth_account import Account
+from eth_utils import to_checksum_address
+from web3 import AsyncWeb3
+
+from bench.mock_chain import ORACLE_ABI
+from bench.mock_chain import ORACLE_ADDRESS
+from bench.mock_chain import MockChain
+from bench.mock_chain import MockChainConfig
+from bench.mock_chain import MockChainServer
+from fee_oracle import FeeOracle
+from nonce_manager import NonceManager
+from receipt_tracker import JobStatus
+from receipt_tracker import ReceiptTracker
+from signer_accounts import SignerAccountPool
+from single_flight import SingleFlight
+from tx_signer import create_signer
+
+CHAIN_ID = 11155111
+
+
+class RpcError(Exception):
+    """Raised by a stand-in handler to answer with a JSON-RPC error object."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class HttpStandIn:
+    """
+    Local HTTP server with one handler per (method, path), recording every request.
+    """
+
+    def __init__(self):
+        self.routes: Dict[tuple, Callable] = {}
+        self.requests: List[web.Request] = []
+        self.latency = 0.0  # Seconds added to every response
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def route(self, method: str, path: str, handler: Callable):
+        self.routes[(method, path)] = handler
+
+    async def _dispatch(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            return web.Response(status=404)
+        response = handler(request)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+    async def start(self):
+        app = web.Application(client_max_size=16 * 1024 ** 2)
+        app.router.add_route('*', '/{tail:.*}', self._dispatch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class JsonRpcStandIn(HttpStandIn):
+    """
+    Local JSON-RPC node answering from per-method handlers.
+
+    Handlers take the params list and return the result, or raise RpcError.
+    Batch arrays are answered in reverse order, so callers must match replies
+    by id. Every POST body is recorded in `posts` (a list for batches).
+    """
+
+    def __init__(self, handlers: Optional[Dict[str, Callable[[list], Any]]] = None):
+        super().__init__()
+        self.handlers = {
+            'eth_chainId': lambda params: hex(CHAIN_ID),
+            'eth_blockNumber': lambda params: hex(100),
+        }
+        self.handlers.update(handlers or {})
+        self.posts: List[Any] = []
+        self.http_status = 200  # Answer every POST with this status instead, e.g. 429
+        self.drop_replies = set()  # Methods whose replies are left out of batch responses
+        self.route('POST', '/', self._handle)
+
+    def calls(self, method: str) -> int:
+        """How many requests for `method` arrived, in batches or alone."""
+        bodies = [item for post in self.posts for item in (post if isinstance(post, list) else [post])]
+        return sum(body['method'] == method for body in bodies)
+
+    def _answer(self, body: Dict) -> Dict:
+        handler = self.handlers.get(body['method'])
+        try:
+            if handler is None:
+                raise RpcError(-32601, f"the method {body['method']} does not exist/is not available")
+            return {'jsonrpc': '2.0', 'id': body['id'], 'result': handler(body.get('params') or [])}
+        except RpcError as e:
+            return {'jsonrpc': '2.0', 'id': body['id'], 'error': {'code': e.code, 'message': e.message}}
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        body = json.loads(await request.read())
+        self.posts.append(body)
+        if self.http_status != 200:
+            return web.Response(status=self.http_status, text='stand-in error')
+        if isinstance(body, list):
+            replies = [self._answer(item) for item in body if item['method'] not in self.drop_replies]
+            return web.json_response(list(reversed(replies)))
+        return web.json_response(self._answer(body))
+
+
+@pytest.fixture
+async def http_server():
+    """Start HttpStandIn servers on demand; all are stopped after the test."""
+    servers = []
+
+    async def start() -> HttpStandIn:
+        server = HttpStandIn()
+        await server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        await server.stop()
+
+
+@pytest.fixture
+async def rpc_server():
+    """Start JsonRpcStandIn nodes on demand; all are stopped after the test."""
+    servers = []
+
+    async def start(handlers: Optional[Dict[str, Callable[[list], Any]]] = None) -> JsonRpcStandIn:
+        server = JsonRpcStandIn(handlers)
+        await server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        await server.stop()
+
+
+@pytest.fixture
+async def writer_state():
+    """
+    Start the write path (fees, signing, nonces, receipts, deduplication) against a mock chain.
+
+    The app state is returned with the chain as `state.chain`; `state.request()`
+    builds a minimal request object carrying it, for calling endpoint helpers.
+    """
+    chain = MockChain(MockChainConfig(block_time=0.05))
+    server = MockChainServer(chain)
+    await server.start()
+    w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(server.url))
+    account = Account.create()
+    state = SimpleNamespace(
+        chain=chain,
+        w3=w3,
+        oracle_abi=ORACLE_ABI,
+        oracle_contract=w3.eth.contract(address=to_checksum_address(ORACLE_ADDRESS), abi=ORACLE_ABI),
+        fee_oracle=FeeOracle(w3),
+        signer=create_signer('inline'),
+        receipt_tracker=ReceiptTracker(w3, poll_interval=0.02),
+        submissions=SingleFlight(
+            reusable=lambda job: job.status != JobStatus.FAILED,
+            pinned=lambda job: job.status in (JobStatus.PENDING, JobStatus.UNKNOWN),
+        ),
+    )
+    state.signer_accounts = SignerAccountPool(
+        [(account.address, account.key.hex(), NonceManager(w3, account.address))], state.receipt_tracker,
+    )
+    state.request = lambda: SimpleNamespace(app=SimpleNamespace(state=state), state=SimpleNamespace(request_id='test'))
+    await state.fee_oracle.start()
+    await state.receipt_tracker.start()
+    await state.signer_accounts.initialize()
+    yield state
+    await state.receipt_tracker.stop()
+    await state.fee_oracle.stop()
+    await state.signer.close()
+    await server.stop()
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+
+import app_state as app_state_module
+from app_state import AppState
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ORACLE_ADDRESS = '0x000000000000000000000000000000000000bEEF'
+
+
+@pytest.fixture
+def reader_env(monkeypatch):
+    monkeypatch.chdir(BACKEND_DIR)  # ABIs are loaded from static/
+    monkeypatch.setattr(app_state_module, 'load_dotenv', lambda: None)
+    monkeypatch.setenv('ORACLE_CONTRACT_ADDRESS', ORACLE_ADDRESS)
+    monkeypatch.setenv('TOKEN_CONTRACT_ADDRESS', ORACLE_ADDRESS)
+    monkeypatch.setenv('RPC_URLS', '')
+    for name in ('SIGNER_ACCOUNT', 'SIGNER_PRIVATE_KEY', 'SIGNER_PRIVATE_KEYS', 'NONCE_DB_PATH'):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+async def test_reader_starts_no_writer_services(reader_env, rpc_server):
+    server = await rpc_server()
+    reader_env.setenv('INFURA_URL', server.url)
+    state = AppState()
+
+    await state.initialize_reader()
+    state.register_metrics()
+
+    assert state.oracle_contract.address == ORACLE_ADDRESS
+    assert await state.w3.eth.block_number == 100
+    assert state.fee_oracle is None and state.signer is None
+    assert state.receipt_tracker is None and state.signer_accounts is None and state.submissions is None
+    # Nothing but the block number read above reached the node
+    assert [post['method'] for post in server.posts] == ['eth_blockNumber']
+    await state.cleanup()
+
+
+async def test_full_initialization_still_requires_a_signer(reader_env, rpc_server):
+    server = await rpc_server()
+    reader_env.setenv('INFURA_URL', server.url)
+
+    with pytest.raises(ValueError, match='SIGNER_ACCOUNT'):
+        await AppState().initialize()
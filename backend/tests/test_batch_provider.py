@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientTimeout
+from web3 import AsyncWeb3
+
+from batch_provider import BatchingHTTPProvider
+from conftest import RpcError
+from rpc_limiter import OutboundLimiter
+
+
+def echo_balance(params):
+    # The balance of 0x00..0N is N, so every caller can check it got its own reply
+    return hex(int(params[0], 16))
+
+
+def address(index: int) -> str:
+    return '0x' + index.to_bytes(20, 'big').hex()
+
+
+async def test_concurrent_requests_share_one_batch(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=0)
+
+    responses = await asyncio.gather(*[
+        provider.make_request('eth_getBalance', [address(index), 'latest']) for index in range(1, 21)
+    ])
+
+    assert len(server.posts) == 1
+    assert isinstance(server.posts[0], list) and len(server.posts[0]) == 20
+    # The stand-in answers batches in reverse order; replies are matched by id
+    assert [int(response['result'], 16) for response in responses] == list(range(1, 21))
+    assert provider.stats == {'requests': 20, 'http_posts': 1}
+
+
+async def test_lone_request_is_sent_as_plain_object(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=0)
+
+    response = await provider.make_request('eth_getBalance', [address(7), 'latest'])
+
+    assert int(response['result'], 16) == 7
+    assert isinstance(server.posts[0], dict)
+
+
+async def test_batches_are_split_at_max_batch_size(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=0, max_batch_size=8)
+
+    responses = await asyncio.gather(*[
+        provider.make_request('eth_getBalance', [address(index), 'latest']) for index in range(1, 21)
+    ])
+
+    assert [len(post) for post in server.posts] == [8, 8, 4]
+    assert [int(response['result'], 16) for response in responses] == list(range(1, 21))
+
+
+async def test_window_coalesces_requests_from_later_ticks(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=50)
+
+    async def delayed(index: int):
+        await asyncio.sleep(0.005 * index)
+        return await provider.make_request('eth_getBalance', [address(index), 'latest'])
+
+    responses = await asyncio.gather(*[delayed(index) for index in range(1, 6)])
+
+    assert len(server.posts) == 1
+    assert [int(response['result'], 16) for response in responses] == list(range(1, 6))
+
+
+async def test_errors_reach_only_their_caller(rpc_server):
+    def get_code(params):
+        raise RpcError(-32000, 'execution reverted')
+
+    server = await rpc_server({'eth_getBalance': echo_balance, 'eth_getCode': get_code})
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=0)
+
+    balance, code = await asyncio.gather(
+        provider.make_request('eth_getBalance', [address(3), 'latest']),
+        provider.make_request('eth_getCode', [address(3), 'latest']),
+    )
+
+    assert int(balance['result'], 16) == 3
+    assert code['error'] == {'code': -32000, 'message': 'execution reverted'}
+
+
+async def test_missing_batch_reply_becomes_an_error(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance, 'eth_getCode': lambda params: '0x'})
+    server.drop_replies.add('eth_getCode')
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=0)
+
+    balance, code = await asyncio.gather(
+        provider.make_request('eth_getBalance', [address(3), 'latest']),
+        provider.make_request('eth_getCode', [address(3), 'latest']),
+    )
+
+    assert int(balance['result'], 16) == 3
+    assert 'No response for request' in code['error']['message']
+
+
+async def test_http_failure_fails_every_caller(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    server.http_status = 500
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=0)
+
+    results = await asyncio.gather(
+        *[provider.make_request('eth_getBalance', [address(index), 'latest']) for index in range(1, 4)],
+        return_exceptions=True,
+    )
+
+    assert len(server.posts) == 1
+    assert all(isinstance(result, Exception) for result in results)
+
+
+async def test_drop_in_for_async_web3(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    w3 = AsyncWeb3(BatchingHTTPProvider(server.url, batch_window_ms=0))
+
+    balances = await asyncio.gather(*[
+        w3.eth.get_balance(w3.to_checksum_address(address(index))) for index in range(1, 11)
+    ])
+
+    assert balances == list(range(1, 11))
+    assert server.calls('eth_getBalance') == 10
+    assert len(server.posts) == 1
+
+
+def reply_late(server, delay: float):
+    # The node processes every POST right away, but its reply arrives after `delay`
+    handle = server._handle
+
+    async def late(request):
+        response = await handle(request)
+        await asyncio.sleep(delay)
+        return response
+
+    server.route('POST', '/', late)
+
+
+def impatient_provider(server) -> BatchingHTTPProvider:
+    return BatchingHTTPProvider(
+        server.url, request_kwargs={'timeout': ClientTimeout(total=0.05)}, batch_window_ms=0,
+        limiter=OutboundLimiter(server.url),
+    )
+
+
+async def test_timed_out_read_is_resent(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    reply_late(server, 0.2)
+    provider = impatient_provider(server)
+    provider.overload_retries = 1
+
+    with pytest.raises(asyncio.TimeoutError):
+        await provider.make_request('eth_getBalance', [address(3), 'latest'])
+
+    assert server.calls('eth_getBalance') == 2
+    assert provider.stats['http_posts'] == 2  # Resends are POSTs too
+
+
+async def test_timed_out_write_batch_is_not_resent(rpc_server):
+    server = await rpc_server({
+        'eth_getBalance': echo_balance, 'eth_sendRawTransaction': lambda params: '0x' + '11' * 32,
+    })
+    reply_late(server, 0.2)
+    provider = impatient_provider(server)
+
+    results = await asyncio.gather(
+        provider.make_request('eth_sendRawTransaction', ['0x01']),
+        provider.make_request('eth_getBalance', [address(3), 'latest']),
+        return_exceptions=True,
+    )
+    await asyncio.sleep(0.3)
+
+    # The batch reached the node once; the caller finds out whether the send went through
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+    assert server.calls('eth_sendRawTransaction') == 1
+
+
+async def test_close_waits_for_batches_in_flight(rpc_server):
+    server = await rpc_server({'eth_getBalance': echo_balance})
+    server.latency = 0.05
+    provider = BatchingHTTPProvider(server.url, batch_window_ms=0)
+    callers = [
+        asyncio.ensure_future(provider.make_request('eth_getBalance', [address(index), 'latest']))
+        for index in range(1, 4)
+    ]
+    await asyncio.sleep(0)  # The requests are queued, not answered yet
+
+    await provider.close()
+
+    assert all(caller.done() for caller in callers)
+    assert [int(caller.result()['result'], 16) for caller in callers] == [1, 2, 3]
+    assert not provider._sending
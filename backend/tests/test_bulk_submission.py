@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from backend import submit_bulk
+from backend import validate_bulk_size
+
+
+def create_call(question_id: str):
+    return ('createMarket', 0, (question_id, 0, 2 ** 40, ['0x' + '00' * 64]))
+
+
+def payload(index: int):
+    return SimpleNamespace(question_id='0x' + index.to_bytes(32, 'big').hex())
+
+
+async def test_repeated_question_id_is_sent_once(writer_state):
+    payloads = [payload(1), payload(2), payload(1), payload(1)]
+    calls = [create_call(item.question_id) for item in payloads]
+
+    response = await submit_bulk(writer_state.request(), 'createMarket', payloads, calls, wait=True)
+
+    assert writer_state.chain.stats.sends == 2
+    results = response['results']
+    assert [result['question_id'] for result in results] == [item.question_id for item in payloads]
+    assert all(result['success'] for result in results)
+    assert results[0]['job']['job_id'] == results[2]['job']['job_id'] == results[3]['job']['job_id']
+    assert results[1]['job']['job_id'] != results[0]['job']['job_id']
+
+
+async def test_concurrent_bulk_requests_share_submissions(writer_state):
+    payloads = [payload(index) for index in range(1, 6)]
+    calls = [create_call(item.question_id) for item in payloads]
+
+    first, second = await asyncio.gather(
+        submit_bulk(writer_state.request(), 'createMarket', payloads, calls, wait=False),
+        submit_bulk(writer_state.request(), 'createMarket', payloads[::-1], calls[::-1], wait=False),
+    )
+
+    assert writer_state.chain.stats.sends == 5
+    first_jobs = {result['question_id']: result['job']['job_id'] for result in first['results']}
+    assert all(first_jobs[result['question_id']] == result['job']['job_id'] for result in second['results'])
+
+
+def test_oversized_bulk_request_is_rejected(monkeypatch):
+    monkeypatch.setenv('BULK_MAX_ITEMS', '3')
+    request = SimpleNamespace(state=SimpleNamespace(request_id='test'))
+
+    validate_bulk_size(request, [payload(index) for index in range(3)])
+    with pytest.raises(HTTPException) as error:
+        validate_bulk_size(request, [payload(index) for index in range(4)])
+    assert error.value.status_code == 413
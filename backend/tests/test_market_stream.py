@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import market_stream
+from market_cache import MarketSnapshot
+from market_reader import MarketRecord
+from market_stream import MarketUpdate
+from market_stream import MarketUpdateBroadcaster
+
+SUBSCRIBERS = 5000
+BLOCKS = 5
+
+
+def snapshot(block_number: int, markets: int = 20) -> MarketSnapshot:
+    records = {}
+    for index in range(markets):
+        question_id = '0x' + index.to_bytes(32, 'big').hex()
+        records[question_id] = MarketRecord(
+            question_id=question_id, begin_timestamp=0, end_timestamp=2 ** 40, fpmm_address='0x' + '11' * 20,
+            price_feed_id='0x' + '22' * 32, condition_id='0x' + '33' * 32, initial_price=100, final_price=0,
+            final_price_timestamp=0, answer_timestamp=0, answer_cid='', unique_buys=block_number,
+            probabilities=[block_number, 100 - block_number], buy_amounts=[block_number * 10 ** 18, 0],
+        )
+    return MarketSnapshot(block_number, records)
+
+
+async def consume(subscriber, received: list):
+    async for update in subscriber.updates(keepalive_interval=60):
+        received.append(update)
+
+
+async def publish_blocks(broadcaster: MarketUpdateBroadcaster, blocks: int, settle):
+    previous = snapshot(1)
+    for block_number in range(2, blocks + 2):
+        current = snapshot(block_number)
+        await broadcaster.on_snapshot(previous, current)
+        previous = current
+        await settle()
+
+
+async def finish(broadcaster: MarketUpdateBroadcaster, consumers: list):
+    broadcaster.close()
+    try:
+        await asyncio.wait_for(asyncio.gather(*consumers), 10)
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+
+
+async def test_every_subscriber_gets_each_block_serialized_once(monkeypatch):
+    serialized = []
+
+    class CountingUpdate(MarketUpdate):
+        def __init__(self, *args):
+            super().__init__(*args)
+            serialized.append(self)
+
+    monkeypatch.setattr(market_stream, 'MarketUpdate', CountingUpdate)
+    broadcaster = MarketUpdateBroadcaster(queue_size=BLOCKS)
+    received = [[] for _ in range(SUBSCRIBERS)]
+    consumers = [asyncio.ensure_future(consume(broadcaster.subscribe(), box)) for box in received]
+
+    # Nobody reads until every block is published: the queues absorb the burst
+    await publish_blocks(broadcaster, BLOCKS, lambda: asyncio.sleep(0))
+    await finish(broadcaster, consumers)
+
+    assert len(serialized) == BLOCKS
+    assert all(len(box) == BLOCKS for box in received)
+    # Every subscriber holds the very same serialized update objects
+    assert all(box[index] is serialized[index] for box in received for index in range(BLOCKS))
+    assert json.loads(received[0][-1].json)['block_number'] == BLOCKS + 1
+    assert broadcaster.stats['delivered'] == SUBSCRIBERS * BLOCKS
+    assert broadcaster.stats['dropped_subscribers'] == 0
+
+
+async def test_slow_subscribers_are_dropped_without_holding_up_the_rest():
+    broadcaster = MarketUpdateBroadcaster(queue_size=2)
+    fast = [broadcaster.subscribe() for _ in range(SUBSCRIBERS // 2)]
+    fast_received = [[] for _ in fast]
+    consumers = [asyncio.ensure_future(consume(subscriber, box)) for subscriber, box in zip(fast, fast_received)]
+    slow = [broadcaster.subscribe() for _ in range(SUBSCRIBERS // 2)]  # Never read
+
+    async def drain_fast():
+        while any(not subscriber.queue.empty() for subscriber in fast):
+            await asyncio.sleep(0)
+
+    await publish_blocks(broadcaster, 5, drain_fast)
+
+    assert broadcaster.stats['dropped_subscribers'] == len(slow)
+    assert set(broadcaster.subscribers) == set(fast)
+    # A dropped stream ends right away instead of replaying stale updates
+    assert [update async for update in slow[0].updates(keepalive_interval=60)] == []
+
+    await finish(broadcaster, consumers)
+    assert all(len(box) == 5 for box in fast_received)
+    assert not broadcaster.subscribers
@@ -0,0 +1,77 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from market_reader import MarketRecord
+from monitor_store import MonitorStateStore
+
+
+def record(index: int, unique_buys: int = 0) -> MarketRecord:
+    question_id = '0x' + index.to_bytes(32, 'big').hex()
+    return MarketRecord(
+        question_id=question_id, begin_timestamp=0, end_timestamp=2 ** 40, fpmm_address='0x' + '11' * 20,
+        price_feed_id='0x' + '22' * 32, condition_id='0x' + '33' * 32, initial_price=100, final_price=0,
+        final_price_timestamp=0, answer_timestamp=0, answer_cid='', unique_buys=unique_buys,
+        probabilities=[50, 50], buy_amounts=[0, 0],
+    )
+
+
+def stored_markets(path) -> int:
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT COUNT(*) FROM markets').fetchone()[0]
+
+
+async def test_writes_are_batched_behind_the_flush_interval(tmp_path):
+    path = str(tmp_path / 'monitor.db')
+    store = MonitorStateStore(path, flush_interval=0.05)
+    await store.open()
+
+    for index in range(3):
+        store.save_market(record(index))
+    assert stored_markets(path) == 0  # Buffered, not written yet
+
+    await asyncio.sleep(0.15)
+    assert stored_markets(path) == 3
+    await store.close()
+
+
+async def test_state_is_restored_after_a_restart(tmp_path):
+    path = str(tmp_path / 'monitor.db')
+    store = MonitorStateStore(path, flush_interval=60)
+    await store.open()
+    store.save_market(record(1))
+    store.save_market(record(2))
+    store.save_market(record(2, unique_buys=5))  # The latest version wins
+    store.remove_market(record(1).question_id)
+    store.mark_resolved(record(3).question_id)
+    store.record_attempt(record(3).question_id, True, stage='confirm', tx_hash='0x' + '44' * 32)
+    store.set_last_block(123)
+    await store.close()  # Writes what is still buffered
+
+    restarted = MonitorStateStore(path)
+    state = await restarted.open()
+    await restarted.close()
+
+    assert state.markets == {record(2).question_id: record(2, unique_buys=5)}
+    assert state.resolved_market_ids == {record(3).question_id}
+    assert state.last_block == 123
+
+
+async def test_close_releases_the_database_when_the_last_flush_fails(tmp_path, monkeypatch):
+    path = str(tmp_path / 'monitor.db')
+    store = MonitorStateStore(path, flush_interval=60)
+    await store.open()
+    store.save_market(record(1))
+
+    def failing_write(*batch):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(store, '_write', failing_write)
+    with pytest.raises(sqlite3.OperationalError):
+        await store.close()
+
+    assert store._connection is None
+    assert store._executor._shutdown
+    # The failed batch was put back rather than dropped
+    assert list(store._upserts) == [record(1).question_id]
@@ -0,0 +1,71 @@
+import asyncio
+
+from web3 import AsyncWeb3
+
+from nonce_manager import NonceManager
+
+ACCOUNT = '0x000000000000000000000000000000000000dEaD'
+
+
+async def start_manager(rpc_server, pending_count: int):
+    server = await rpc_server({'eth_getTransactionCount': lambda params: hex(server.pending_count)})
+    server.pending_count = pending_count
+    manager = NonceManager(AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(server.url)), ACCOUNT)
+    await manager.initialize()
+    return server, manager
+
+
+async def test_nonce_sent_during_the_pending_read_is_not_a_gap(rpc_server):
+    server, manager = await start_manager(rpc_server, 5)
+    nonce = await manager.reserve()
+    # The node has not counted the transaction yet when the resync reads it
+    server.latency = 0.05
+    resync = asyncio.ensure_future(manager.resync())
+    await asyncio.sleep(0.01)
+    manager.mark_sent(nonce)
+    await resync
+
+    assert await manager.reserve() == 6
+
+
+async def test_nonce_dropped_by_the_node_becomes_a_gap(rpc_server):
+    server, manager = await start_manager(rpc_server, 5)
+    for nonce in await manager.reserve_many(3):
+        manager.mark_sent(nonce)
+    server.pending_count = 6  # Nonce 6 was dropped, 7 is stuck behind it
+
+    await manager.resync()
+
+    assert await manager.reserve() == 6
+    assert await manager.reserve() == 8
+
+
+async def test_reserved_nonce_is_not_a_gap(rpc_server):
+    _, manager = await start_manager(rpc_server, 5)
+    await manager.reserve()
+    await manager.reserve()
+
+    await manager.resync()
+
+    assert await manager.reserve() == 7
+
+
+async def test_used_nonce_errors_retire_the_nonce(rpc_server):
+    server, manager = await start_manager(rpc_server, 5)
+    for message in ('nonce too low', 'already known', 'replacement transaction underpriced'):
+        nonce = await manager.reserve()
+        server.pending_count = nonce + 1  # Another transaction holds the nonce
+        manager.handle_send_error(nonce, ValueError({'code': -32000, 'message': message}))
+        await manager._resync_task
+        assert await manager.reserve() != nonce
+
+
+async def test_other_send_errors_free_the_nonce(rpc_server):
+    _, manager = await start_manager(rpc_server, 5)
+    for message in ('insufficient funds for gas * price + value', 'nonce too high'):
+        nonce = await manager.reserve()
+        manager.handle_send_error(nonce, ValueError({'code': -32000, 'message': message}))
+        if manager._resync_task is not None:
+            await manager._resync_task
+        assert await manager.reserve() == nonce
+        manager.release(nonce)
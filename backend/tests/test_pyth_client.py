@@ -0,0 +1,113 @@
+import asyncio
+import base64
+import os
+
+import pytest
+from aiohttp import web
+
+from http_session import HttpSessionManager
+from pyth_client import PythPriceClient
+
+BTC = '0xe62df6c8b4a85fe1a67db44dc12de5db330f7ac66b72dc658afedf0f4a415b43'
+ETH = '0xff61491a931112ddf1bd8147cd1b641375f79f5825126d665480874634fd0ace'
+
+
+def accumulator_update(tag: bytes) -> bytes:
+    # Hermes accumulator updates start with the PNAU magic and carry every requested feed
+    return b'PNAU\x01\x00\x00\x00\x03' + tag + os.urandom(64)
+
+
+@pytest.fixture
+async def hermes(http_server):
+    """Hermes stand-in answering `latest_vaas` like the real service: one PNAU blob per request."""
+    server = await http_server()
+    server.blobs = []
+    server.status = 200
+
+    async def latest_vaas(request: web.Request) -> web.Response:
+        if server.status != 200:
+            return web.Response(status=server.status, text='Hermes unavailable')
+        await asyncio.sleep(0.02)
+        ids = request.query.getall('ids[]')
+        blob = accumulator_update(','.join(sorted(ids)).encode())
+        server.blobs.append(blob)
+        return web.json_response([base64.b64encode(blob).decode()])
+
+    server.route('GET', '/api/latest_vaas', latest_vaas)
+    return server
+
+
+@pytest.fixture
+async def client(hermes):
+    sessions = HttpSessionManager()
+    client = PythPriceClient(hermes_url=hermes.url, cache_ttl=60, session_manager=sessions)
+    yield client
+    await sessions.close()
+
+
+async def test_concurrent_requests_for_one_feed_cost_one_hermes_request(client, hermes):
+    results = await asyncio.gather(*[client.get_price_update_data([ETH]) for _ in range(100)])
+
+    assert len(hermes.requests) == 1
+    assert all(result == ['0x' + hermes.blobs[0].hex()] for result in results)
+
+
+async def test_accumulator_update_for_several_feeds_is_passed_through(client, hermes):
+    update_data = await client.get_price_update_data([ETH, BTC])
+
+    # Both feeds arrive in a single PNAU blob; it must not be split or rejected
+    assert update_data == ['0x' + hermes.blobs[0].hex()]
+    assert hermes.requests[0].query.getall('ids[]') == sorted([ETH, BTC])
+
+
+async def test_different_feed_sets_are_fetched_separately(client, hermes):
+    eth, btc, both = await asyncio.gather(
+        client.get_price_update_data([ETH]),
+        client.get_price_update_data([BTC]),
+        client.get_price_update_data([BTC, ETH]),
+    )
+
+    assert len(hermes.requests) == 3
+    assert len({eth[0], btc[0], both[0]}) == 3
+
+
+async def test_feed_ids_are_normalized(client, hermes):
+    await client.get_price_update_data([ETH])
+    await client.get_price_update_data([ETH[2:].upper()])
+    await client.get_price_update_data([ETH, ETH])
+
+    assert len(hermes.requests) == 1
+    assert client.stats['cache_hits'] == 2
+
+
+async def test_cached_data_expires_after_the_ttl(hermes):
+    client = PythPriceClient(hermes_url=hermes.url, cache_ttl=0.05)
+    try:
+        first = await client.get_price_update_data([ETH])
+        assert await client.get_price_update_data([ETH]) == first
+        await asyncio.sleep(0.1)
+        assert await client.get_price_update_data([ETH]) != first
+        assert len(hermes.requests) == 2
+    finally:
+        await client.close()
+
+
+async def test_failures_reach_every_waiter_and_are_not_cached(client, hermes):
+    hermes.status = 503
+    results = await asyncio.gather(*[client.get_price_update_data([ETH]) for _ in range(5)], return_exceptions=True)
+
+    assert len(hermes.requests) == 1
+    assert all('503' in str(result) for result in results)
+
+    hermes.status = 200
+    assert await client.get_price_update_data([ETH]) == ['0x' + hermes.blobs[0].hex()]
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_request(client, hermes):
+    first = asyncio.ensure_future(client.get_price_update_data([ETH]))
+    second = asyncio.ensure_future(client.get_price_update_data([ETH]))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == ['0x' + hermes.blobs[0].hex()]
+    assert len(hermes.requests) == 1
@@ -0,0 +1,118 @@
+import asyncio
+
+from web3 import AsyncWeb3
+
+from receipt_tracker import JobStatus
+from receipt_tracker import ReceiptTracker
+from single_flight import SingleFlight
+
+ACCOUNT = '0x000000000000000000000000000000000000dEaD'
+ZERO_HASH = '0x' + '00' * 32
+
+
+def tx_hash(index: int) -> str:
+    return '0x' + index.to_bytes(32, 'big').hex()
+
+
+def receipt(transaction_hash: str, status: int = 1) -> dict:
+    return {
+        'blockHash': ZERO_HASH,
+        'blockNumber': hex(101),
+        'contractAddress': None,
+        'cumulativeGasUsed': hex(21000),
+        'effectiveGasPrice': hex(10 ** 9),
+        'from': ACCOUNT.lower(),
+        'gasUsed': hex(21000),
+        'logs': [],
+        'logsBloom': '0x' + '00' * 256,
+        'status': hex(status),
+        'to': ACCOUNT.lower(),
+        'transactionHash': transaction_hash,
+        'transactionIndex': '0x0',
+        'type': '0x2',
+    }
+
+
+async def start_tracker(rpc_server, **kwargs):
+    server = await rpc_server({
+        'eth_getTransactionReceipt': lambda params: server.receipts.get(params[0]),
+        'eth_getTransactionCount': lambda params: hex(server.mined_count),
+    })
+    server.receipts = {}
+    server.mined_count = 0
+    tracker = ReceiptTracker(AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(server.url)), **kwargs)
+    return server, tracker
+
+
+async def test_timed_out_transaction_is_unknown_until_mined(rpc_server):
+    server, tracker = await start_tracker(rpc_server, timeout=0.01)
+    job = tracker.add_job('resolveMarket', '0x01', tx_hash(1), account=ACCOUNT, nonce=4)
+    await asyncio.sleep(0.02)
+
+    await tracker.poll()
+
+    # Waiters are released, but the job is still tracked and must not be resubmitted
+    assert (await asyncio.wait_for(tracker.wait_for_job(job), 1)).status == JobStatus.UNKNOWN
+    assert tracker.pending_count == 1
+
+    server.receipts[tx_hash(1)] = receipt(tx_hash(1))
+    await tracker.poll()
+
+    assert job.status == JobStatus.CONFIRMED and job.block_number == 101
+    assert tracker.pending_count == 0
+
+
+async def test_timed_out_transaction_fails_once_its_nonce_is_used(rpc_server):
+    server, tracker = await start_tracker(rpc_server, timeout=0.01)
+    job = tracker.add_job('resolveMarket', '0x01', tx_hash(1), account=ACCOUNT, nonce=4)
+    await asyncio.sleep(0.02)
+    await tracker.poll()
+
+    server.mined_count = 4  # Nonce 4 not mined yet: still unknown
+    await tracker.poll()
+    assert job.status == JobStatus.UNKNOWN
+
+    server.mined_count = 5  # Another transaction took nonce 4
+    await tracker.poll()
+    assert job.status == JobStatus.FAILED and 'nonce 4' in job.error
+    assert tracker.pending_count == 0
+
+
+async def test_history_eviction_keeps_pending_jobs(rpc_server):
+    server, tracker = await start_tracker(rpc_server, history_size=2)
+    jobs = [tracker.add_job('createMarket', f'0x{index:02x}', tx_hash(index)) for index in range(4)]
+
+    assert all(tracker.get_job(job.job_id) is job for job in jobs)
+
+    server.receipts[tx_hash(0)] = receipt(tx_hash(0))
+    server.receipts[tx_hash(1)] = receipt(tx_hash(1), status=0)
+    await tracker.poll()
+    tracker.add_job('createMarket', '0x04', tx_hash(4))
+
+    # The oldest finished jobs go first; pending ones are still waited for
+    assert tracker.get_job(jobs[0].job_id) is None and tracker.get_job(jobs[1].job_id) is None
+    assert tracker.get_job(jobs[2].job_id) is jobs[2]
+    server.receipts[tx_hash(2)] = receipt(tx_hash(2))
+    await tracker.poll()
+    assert (await asyncio.wait_for(tracker.wait_for_job(jobs[2]), 1)).status == JobStatus.CONFIRMED
+
+
+async def test_unknown_job_is_not_resubmitted_after_the_idempotency_ttl(rpc_server):
+    _, tracker = await start_tracker(rpc_server, timeout=0.01)
+    submissions = SingleFlight(
+        ttl=0.01,
+        reusable=lambda job: job.status != JobStatus.FAILED,
+        pinned=lambda job: job.status in (JobStatus.PENDING, JobStatus.UNKNOWN),
+    )
+    key = ('resolveMarket', '0x01')
+    job = tracker.add_job('resolveMarket', '0x01', tx_hash(1), account=ACCOUNT, nonce=4)
+    submissions.claim(key)
+    submissions.resolve(key, job)
+    await asyncio.sleep(0.02)
+    await tracker.poll()
+
+    assert job.status == JobStatus.UNKNOWN
+    assert submissions.lookup(key) is job
+
+    tracker._finish(job, JobStatus.CONFIRMED)
+    assert submissions.lookup(key) is None
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+from resolution_pipeline import PipelineStage
+from resolution_pipeline import ResolutionPipeline
+
+
+def market(question_id: str):
+    return SimpleNamespace(question_id=question_id)
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, 'timed out'
+        await asyncio.sleep(0.01)
+
+
+async def test_slow_market_does_not_hold_up_later_ones():
+    release_slow = asyncio.Event()
+    results = []
+
+    async def fetch(item, _):
+        if item.question_id == 'slow':
+            await release_slow.wait()
+        return item.question_id
+
+    async def submit(item, value):
+        return {'tx_hash': f'0x{value}'}
+
+    pipeline = ResolutionPipeline(
+        [PipelineStage('fetch', fetch, concurrency=2), PipelineStage('submit', submit)],
+        on_result=results.append,
+    )
+    await pipeline.start()
+    try:
+        pipeline.submit(market('slow'))
+        await asyncio.sleep(0.01)
+        # Markets that become due later are fed in while the slow one is still fetching
+        for index in range(5):
+            pipeline.submit(market(f'm{index}'))
+        await wait_until(lambda: len(results) == 5)
+
+        assert [result.question_id for result in results] == [f'm{index}' for index in range(5)]
+        assert all(result.success for result in results)
+        assert 'slow' in pipeline and len(pipeline) == 1
+
+        release_slow.set()
+        await wait_until(lambda: len(results) == 6)
+        assert results[-1].question_id == 'slow' and results[-1].value == {'tx_hash': '0xslow'}
+        assert len(pipeline) == 0
+    finally:
+        await pipeline.stop()
+
+
+async def test_failures_and_timeouts_are_reported_per_market():
+    results = []
+
+    async def fetch(item, _):
+        if item.question_id == 'broken':
+            raise ValueError('no price data')
+        if item.question_id == 'stuck':
+            await asyncio.sleep(10)
+        return item.question_id
+
+    pipeline = ResolutionPipeline([PipelineStage('fetch', fetch, concurrency=3, timeout=0.1)], on_result=results.append)
+    await pipeline.start()
+    try:
+        for question_id in ('broken', 'stuck', 'ok'):
+            pipeline.submit(market(question_id))
+        await wait_until(lambda: len(results) == 3)
+    finally:
+        await pipeline.stop()
+
+    by_id = {result.question_id: result for result in results}
+    assert by_id['ok'].success
+    assert by_id['broken'].failed_stage == 'fetch' and by_id['broken'].error == 'no price data'
+    assert by_id['stuck'].failed_stage == 'fetch' and by_id['stuck'].error == 'TimeoutError'
+
+
+async def test_market_in_flight_is_not_submitted_twice():
+    release = asyncio.Event()
+    calls = []
+
+    async def fetch(item, _):
+        calls.append(item.question_id)
+        await release.wait()
+
+    pipeline = ResolutionPipeline([PipelineStage('fetch', fetch)])
+    await pipeline.start()
+    try:
+        assert pipeline.submit(market('a'))
+        assert not pipeline.submit(market('a'))
+        release.set()
+        await wait_until(lambda: 'a' not in pipeline)
+        assert calls == ['a']
+        # Once finished it may be submitted again, e.g. for a retry
+        assert pipeline.submit(market('a'))
+    finally:
+        await pipeline.stop()
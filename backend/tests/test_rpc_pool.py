@@ -0,0 +1,194 @@
+import asyncio
+
+from aiohttp import ClientTimeout
+from eth_account import Account
+from web3 import AsyncWeb3
+
+from conftest import RpcError
+from rpc_pool import PooledRPCProvider
+
+
+def balance(value: int):
+    return lambda params: hex(value)
+
+
+def reverted(params):
+    raise RpcError(-32603, 'execution reverted')
+
+
+def overloaded(params):
+    raise RpcError(-32005, 'limit exceeded')
+
+
+def signed_transaction():
+    account = Account.create()
+    signed = account.sign_transaction({
+        'to': account.address, 'value': 0, 'gas': 21000, 'maxFeePerGas': 10 ** 9,
+        'maxPriorityFeePerGas': 10 ** 6, 'nonce': 0, 'chainId': 11155111,
+    })
+    return bytes(signed.rawTransaction), '0x' + bytes(signed.hash).hex()
+
+
+async def start_nodes(rpc_server, count: int, handlers=None):
+    return [await rpc_server(dict(handlers or {})) for _ in range(count)]
+
+
+async def test_reads_go_to_the_fastest_endpoint(rpc_server):
+    slow, fast = await start_nodes(rpc_server, 2, {'eth_getBalance': balance(1)})
+    slow.latency = 0.05
+    provider = PooledRPCProvider([slow.url, fast.url])
+
+    # Every endpoint is measured once, then the fastest one serves the reads
+    for _ in range(10):
+        await provider.make_request('eth_getBalance', ['0x' + '00' * 20, 'latest'])
+
+    assert slow.calls('eth_getBalance') == 1
+    assert fast.calls('eth_getBalance') == 9
+
+
+async def test_endpoint_failures_fail_over(rpc_server):
+    broken, healthy = await start_nodes(rpc_server, 2, {'eth_getBalance': balance(7)})
+    broken.handlers['eth_getBalance'] = overloaded
+    provider = PooledRPCProvider([broken.url, healthy.url])
+
+    response = await provider.make_request('eth_getBalance', ['0x' + '00' * 20, 'latest'])
+
+    assert response['result'] == hex(7)
+    assert provider.stats['failovers'] == 1
+    assert provider.endpoints[0].consecutive_failures == 1
+
+
+async def test_reverts_are_returned_without_failing_over(rpc_server):
+    first, second = await start_nodes(rpc_server, 2, {'eth_call': reverted})
+    provider = PooledRPCProvider([first.url, second.url])
+
+    response = await provider.make_request('eth_call', [{'to': '0x' + '00' * 20, 'data': '0x'}, 'latest'])
+
+    assert response['error']['message'] == 'execution reverted'
+    assert first.calls('eth_call') + second.calls('eth_call') == 1
+    assert all(endpoint.consecutive_failures == 0 for endpoint in provider.endpoints)
+
+
+async def test_missing_batch_reply_fails_over(rpc_server):
+    first, second = await start_nodes(rpc_server, 2, {'eth_getBalance': balance(3), 'eth_getCode': balance(0)})
+    first.drop_replies.add('eth_getBalance')
+    provider = PooledRPCProvider([first.url, second.url])
+    provider.endpoints[1].latency = 1.0  # Measured as slower, so the first endpoint is tried first
+
+    balance_response, _ = await asyncio.gather(
+        provider.make_request('eth_getBalance', ['0x' + '00' * 20, 'latest']),
+        provider.make_request('eth_getCode', ['0x' + '00' * 20, 'latest']),
+    )
+
+    assert balance_response['result'] == hex(3)
+    assert second.calls('eth_getBalance') == 1
+
+
+async def test_slow_reads_are_hedged(rpc_server):
+    slow, backup = await start_nodes(rpc_server, 2, {'eth_getBalance': balance(5)})
+    provider = PooledRPCProvider([slow.url, backup.url], hedge_delay_ms=20)
+    provider.endpoints[0].latency = 0.001
+    provider.endpoints[1].latency = 0.002
+    slow.latency = 0.3
+
+    response = await provider.make_request('eth_getBalance', ['0x' + '00' * 20, 'latest'])
+
+    assert response['result'] == hex(5)
+    assert provider.stats == {'hedged': 1, 'hedge_wins': 1, 'failovers': 0}
+
+
+async def test_writes_stick_to_one_endpoint(rpc_server):
+    sticky, faster = await start_nodes(rpc_server, 2, {'eth_getTransactionCount': balance(4)})
+    sticky.latency = 0.02
+    provider = PooledRPCProvider([sticky.url, faster.url])
+    provider.endpoints[1].latency = 0.001
+
+    for _ in range(5):
+        await provider.make_request('eth_getTransactionCount', ['0x' + '00' * 20, 'pending'])
+
+    assert sticky.calls('eth_getTransactionCount') == 5
+    assert faster.calls('eth_getTransactionCount') == 0
+
+
+async def test_send_that_reached_the_node_is_not_resent(rpc_server):
+    raw, tx_hash = signed_transaction()
+    mempool = {}
+
+    def accept_then_fail(params):
+        # The node takes the transaction, but the reply is an overload error
+        mempool[tx_hash] = params[0]
+        raise RpcError(-32005, 'request limit exceeded')
+
+    first, second = await start_nodes(rpc_server, 2, {
+        'eth_getTransactionByHash': lambda params: {'hash': params[0]} if params[0] in mempool else None,
+    })
+    first.handlers['eth_sendRawTransaction'] = accept_then_fail
+    second.handlers['eth_sendRawTransaction'] = lambda params: tx_hash
+    w3 = AsyncWeb3(PooledRPCProvider([first.url, second.url]))
+
+    sent = await w3.eth.send_raw_transaction(raw)
+
+    assert '0x' + bytes(sent).hex() == tx_hash
+    assert second.calls('eth_sendRawTransaction') == 0
+
+
+async def test_resend_answered_already_known_counts_as_sent(rpc_server):
+    raw, tx_hash = signed_transaction()
+
+    def already_known(params):
+        raise RpcError(-32000, 'already known')
+
+    first, second = await start_nodes(rpc_server, 2, {'eth_getTransactionByHash': lambda params: None})
+    first.http_status = 502  # Delivered, but the reply was lost
+    second.handlers['eth_sendRawTransaction'] = already_known
+    w3 = AsyncWeb3(PooledRPCProvider([first.url, second.url]))
+
+    sent = await w3.eth.send_raw_transaction(raw)
+
+    assert '0x' + bytes(sent).hex() == tx_hash
+    assert second.calls('eth_getTransactionByHash') == 1
+
+
+async def test_undelivered_send_fails_over(rpc_server):
+    raw, tx_hash = signed_transaction()
+    first, second = await start_nodes(rpc_server, 2, {'eth_getTransactionByHash': lambda params: None})
+    first.http_status = 500
+    second.handlers['eth_sendRawTransaction'] = lambda params: tx_hash
+    w3 = AsyncWeb3(PooledRPCProvider([first.url, second.url]))
+
+    sent = await w3.eth.send_raw_transaction(raw)
+
+    assert '0x' + bytes(sent).hex() == tx_hash
+    assert second.calls('eth_sendRawTransaction') == 1
+
+
+async def test_timed_out_send_is_sent_once(rpc_server):
+    raw, tx_hash = signed_transaction()
+    mempool = {}
+
+    def accept(params):
+        mempool[tx_hash] = params[0]
+        return tx_hash
+
+    first, second = await start_nodes(rpc_server, 2, {
+        'eth_sendRawTransaction': accept,
+        'eth_getTransactionByHash': lambda params: {'hash': params[0]} if params[0] in mempool else None,
+    })
+    handle = first._handle
+
+    async def reply_late_to_sends(request):
+        # The node takes the transaction, but its reply arrives after the client gave up
+        response = await handle(request)
+        if first.posts[-1]['method'] == 'eth_sendRawTransaction':
+            await asyncio.sleep(0.2)
+        return response
+
+    first.route('POST', '/', reply_late_to_sends)
+    provider = PooledRPCProvider([first.url, second.url])
+    provider.endpoints[0].provider._request_kwargs = {'timeout': ClientTimeout(total=0.05)}
+    w3 = AsyncWeb3(provider)
+
+    sent = await w3.eth.send_raw_transaction(raw)
+
+    assert '0x' + bytes(sent).hex() == tx_hash
+    assert first.calls('eth_sendRawTransaction') + second.calls('eth_sendRawTransaction') == 1
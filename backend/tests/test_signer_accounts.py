@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from signer_accounts import SignerAccountPool
+
+ACCOUNT = '0x000000000000000000000000000000000000dEaD'
+
+
+class CountingNonceManager:
+    def __init__(self):
+        self.resyncs = 0
+
+    def schedule_resync(self):
+        self.resyncs += 1
+
+
+class PendingStandIn:
+    def __init__(self):
+        self.oldest = None
+
+    def pending_by_account(self):
+        return {} if self.oldest is None else {ACCOUNT.lower(): (1, self.oldest)}
+
+
+async def test_stuck_account_is_resynced_without_a_new_submission():
+    nonce_manager = CountingNonceManager()
+    tracker = PendingStandIn()
+    pool = SignerAccountPool([(ACCOUNT, '0x01', nonce_manager)], tracker, stuck_timeout=60, health_interval=0.01)
+    (account,) = pool.accounts
+    await pool.start()
+    try:
+        tracker.oldest = time.time() - 120  # Dropped by the node while no submission came in
+        for _ in range(100):
+            if nonce_manager.resyncs:
+                break
+            await asyncio.sleep(0.01)
+        assert account.stuck and nonce_manager.resyncs == 1
+
+        tracker.oldest = None
+        for _ in range(100):
+            if not account.stuck:
+                break
+            await asyncio.sleep(0.01)
+        assert not account.stuck and nonce_manager.resyncs == 1
+    finally:
+        await pool.stop()
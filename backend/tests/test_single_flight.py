@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+async def test_concurrent_callers_share_one_submission():
+    calls = []
+    release = asyncio.Event()
+
+    async def submit():
+        calls.append(1)
+        await release.wait()
+        return 'job'
+
+    flight = SingleFlight()
+    waiters = [asyncio.ensure_future(flight.do('key', submit)) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ['job'] * 10
+    assert calls == [1]
+    assert await flight.do('key', submit) == 'job'
+    assert flight.stats == {'submitted': 1, 'attached': 9, 'cached': 1}
+
+
+async def test_claiming_a_key_in_flight_raises():
+    flight = SingleFlight()
+    future = flight.claim('key')
+
+    with pytest.raises(RuntimeError, match='already in flight'):
+        flight.claim('key')
+
+    # The first claim is untouched and still resolves its waiters
+    assert flight.lookup('key') is future
+    flight.resolve('key', 'job')
+    assert await future == 'job'
+
+
+async def test_resolving_or_failing_an_unknown_key_is_ignored():
+    flight = SingleFlight()
+    future = flight.claim('key')
+    flight.resolve('key', 'job')
+
+    flight.resolve('key', 'other')
+    flight.fail('key', ValueError('late'))
+    flight.fail('missing', ValueError('never claimed'))
+
+    assert future.result() == 'job'
+    assert flight.lookup('key') == 'job'
+
+
+async def test_failed_submission_reaches_waiters_and_is_not_stored():
+    flight = SingleFlight()
+
+    async def submit():
+        await asyncio.sleep(0)
+        raise ValueError('send failed')
+
+    results = await asyncio.gather(*[flight.do('key', submit) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert 'key' not in flight
+
+
+async def test_results_expire_unless_pinned():
+    flight = SingleFlight(ttl=0.01, pinned=lambda value: value == 'pending')
+    for key, value in (('done', 'confirmed'), ('open', 'pending')):
+        flight.claim(key)
+        flight.resolve(key, value)
+    await asyncio.sleep(0.02)
+
+    assert flight.lookup('done') is None
+    assert flight.lookup('open') == 'pending'
+
+
+async def test_pinned_results_survive_eviction():
+    flight = SingleFlight(max_entries=3, pinned=lambda job: job == 'pending')
+    for key, job in [('a', 'pending'), ('b', 'confirmed'), ('c', 'confirmed'), ('d', 'confirmed'), ('e', 'confirmed')]:
+        flight.claim(key)
+        flight.resolve(key, job)
+
+    # The least recently used unpinned results went; the pending one is still found
+    assert flight.lookup('a') == 'pending'
+    assert flight.lookup('b') is None and flight.lookup('c') is None
+    assert flight.lookup('e') == 'confirmed'
+
+    for key in 'xyz':
+        flight.claim(key)
+        flight.resolve(key, 'pending')
+    # With nothing left to evict, the store grows past the cap rather than drop a live key
+    assert all(flight.lookup(key) == 'pending' for key in 'axyz')
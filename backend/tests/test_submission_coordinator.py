@@ -0,0 +1,221 @@
+import asyncio
+import fcntl
+import os
+import sqlite3
+import subprocess
+import time
+
+import pytest
+from web3 import AsyncWeb3
+
+from receipt_tracker import JobStatus
+from receipt_tracker import ReceiptTracker
+from submission_coordinator import SharedNonceManager
+from submission_coordinator import SharedSingleFlight
+from single_flight import SubmissionInFlightError
+from submission_coordinator import SubmissionCoordinator
+
+ACCOUNT = '0x000000000000000000000000000000000000dEaD'
+KEY = ('resolveMarket', '0x01')
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+async def coordinators(tmp_path):
+    opened = []
+
+    async def open_coordinator(pid=None):
+        coordinator = SubmissionCoordinator(str(tmp_path / 'coordinator.db'))
+        await coordinator.open()
+        if pid is not None:
+            coordinator.pid = pid  # Stands in for another worker process
+        opened.append(coordinator)
+        return coordinator
+
+    yield open_coordinator
+    for coordinator in opened:
+        await coordinator.close()
+
+
+async def start_manager(rpc_server, coordinator, pending_count: int):
+    server = await rpc_server({'eth_getTransactionCount': lambda params: hex(server.pending_count)})
+    server.pending_count = pending_count
+    manager = SharedNonceManager(AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(server.url)), ACCOUNT, coordinator)
+    await manager.initialize()
+    return server, manager
+
+
+async def reserve_as(coordinator, nonce: int, pid: int, reserved_at: float):
+    await coordinator.run(lambda connection: connection.execute(
+        'INSERT INTO nonce_reservations (account, nonce, pid, reserved_at) VALUES (?, ?, ?, ?)',
+        (ACCOUNT, nonce, pid, reserved_at),
+    ))
+
+
+async def test_nonce_sent_during_the_pending_read_is_not_a_gap(rpc_server, coordinators):
+    server, manager = await start_manager(rpc_server, await coordinators(), 5)
+    nonce = await manager.reserve()
+    # The node has not counted the transaction yet when the resync reads it
+    server.latency = 0.05
+    resync = asyncio.ensure_future(manager.resync())
+    await asyncio.sleep(0.01)
+    manager.mark_sent(nonce)
+    await resync
+
+    assert await manager.reserve() == 6
+
+
+async def test_nonce_dropped_by_the_node_becomes_a_gap(rpc_server, coordinators):
+    server, manager = await start_manager(rpc_server, await coordinators(), 5)
+    for nonce in await manager.reserve_many(3):
+        manager.mark_sent(nonce)
+    server.pending_count = 6  # Nonce 6 was dropped, 7 is stuck behind it
+
+    await manager.resync()
+
+    assert await manager.reserve() == 6
+    assert await manager.reserve() == 8
+
+
+async def test_only_unsent_reservations_of_dead_workers_are_reclaimed(rpc_server, coordinators):
+    coordinator = await coordinators()
+    _, manager = await start_manager(rpc_server, coordinator, 5)
+    await manager.reserve_many(3)  # 5, 6 and 7 are now reserved by this worker...
+    await coordinator.run(lambda connection: connection.execute('DELETE FROM nonce_reservations'))
+    # ...and handed to a worker that is long-running but alive, and one that died
+    await reserve_as(coordinator, 6, os.getppid(), time.time() - 3600)
+    await reserve_as(coordinator, 7, dead_pid(), time.time())
+
+    await manager.resync()
+
+    # Only the dead worker's nonce comes back, and the pending count (5) was never reserved
+    assert await manager.reserve_many(3) == [5, 7, 8]
+
+
+async def test_retry_on_another_worker_attaches_to_the_sent_transaction(coordinators):
+    first = await coordinators()
+    second = await coordinators(pid=os.getppid())
+    first_tracker = ReceiptTracker(None, store=first)
+    second_tracker = ReceiptTracker(None, store=second)
+    first_flight = SharedSingleFlight(first, first_tracker, poll_interval=0.01)
+    second_flight = SharedSingleFlight(second, second_tracker, poll_interval=0.01)
+    sends = []
+
+    async def send(tracker):
+        sends.append(tracker)
+        await asyncio.sleep(0.05)
+        return tracker.add_job(*KEY, '0x' + '11' * 32, account=ACCOUNT, nonce=5)
+
+    jobs = await asyncio.gather(
+        first_flight.do(KEY, lambda: send(first_tracker)),
+        second_flight.do(KEY, lambda: send(second_tracker)),
+    )
+
+    # Either worker may win the claim; the other one attaches to its transaction
+    assert len(sends) == 1
+    winner = 0 if sends[0] is first_tracker else 1
+    sent, attached = jobs[winner], jobs[1 - winner]
+    assert attached.job_id == sent.job_id and attached.tx_hash == sent.tx_hash
+    # The adopted job is polled by the other worker as well
+    other_tracker, other_flight = [(second_tracker, second_flight), (first_tracker, first_flight)][winner]
+    assert other_tracker.pending_count == 1
+    assert other_flight.lookup(KEY) is attached
+
+
+async def test_failed_job_on_another_worker_is_retried(coordinators):
+    first = await coordinators()
+    second = await coordinators(pid=os.getppid())
+    first_tracker = ReceiptTracker(None, store=first)
+    reuse_rules = {'reusable': lambda job: job.status != JobStatus.FAILED}
+    first_flight = SharedSingleFlight(first, first_tracker, **reuse_rules)
+    second_flight = SharedSingleFlight(second, ReceiptTracker(None, store=second), **reuse_rules)
+
+    async def send(tracker, tx_hash):
+        return tracker.add_job(*KEY, tx_hash)
+
+    failed = await first_flight.do(KEY, lambda: send(first_tracker, '0x' + '11' * 32))
+    first_tracker._finish(failed, JobStatus.FAILED, error='transaction reverted')
+
+    retried = await second_flight.do(KEY, lambda: send(second_flight.tracker, '0x' + '22' * 32))
+
+    assert retried.job_id != failed.job_id and retried.tx_hash == '0x' + '22' * 32
+
+
+async def test_claim_of_a_dead_worker_is_taken_over(coordinators):
+    dead = await coordinators(pid=dead_pid())
+    alive = await coordinators()
+    # The dead worker claimed the key, but never published a job
+    await dead.run(SharedSingleFlight(dead, None)._claim, [SharedSingleFlight._row_key(KEY)], {})
+    tracker = ReceiptTracker(None, store=alive)
+
+    async def send():
+        return tracker.add_job(*KEY, '0x' + '33' * 32)
+
+    job = await asyncio.wait_for(SharedSingleFlight(alive, tracker).do(KEY, send), 1)
+
+    assert job.tx_hash == '0x' + '33' * 32
+
+
+async def test_wait_for_a_live_worker_is_bounded(coordinators):
+    busy = await coordinators(pid=os.getppid())
+    waiting = await coordinators()
+    # A live worker claimed the key and is stuck before publishing its job
+    await busy.run(SharedSingleFlight(busy, None)._claim, [SharedSingleFlight._row_key(KEY)], {})
+    flight = SharedSingleFlight(waiting, ReceiptTracker(None, store=waiting), poll_interval=0.01, wait_timeout=0.05)
+    sends = []
+
+    async def send():
+        sends.append(KEY)
+
+    with pytest.raises(SubmissionInFlightError):
+        await asyncio.wait_for(flight.do(KEY, send), 1)
+    assert sends == []
+
+
+async def test_failed_withdraw_is_retried(coordinators, monkeypatch):
+    coordinator = await coordinators()
+    flight = SharedSingleFlight(coordinator, ReceiptTracker(None, store=coordinator))
+    withdraw = flight._withdraw
+    attempts = []
+
+    def flaky_withdraw(connection, row_key):
+        attempts.append(row_key)
+        if len(attempts) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        withdraw(connection, row_key)
+
+    monkeypatch.setattr(flight, '_withdraw', flaky_withdraw)
+
+    async def send():
+        raise ValueError('gas estimation failed')
+
+    with pytest.raises(ValueError):
+        await flight.do(KEY, send)
+    for _ in range(100):
+        if len(attempts) == 2:
+            break
+        await asyncio.sleep(0.01)
+
+    assert len(attempts) == 2
+    claims = await coordinator.run(lambda connection: connection.execute('SELECT key FROM submissions').fetchall())
+    assert claims == []
+
+
+async def test_lock_held_by_a_stuck_worker_times_out(tmp_path):
+    coordinator = SubmissionCoordinator(str(tmp_path / 'coordinator.db'), lock_timeout=0.1)
+    await coordinator.open()
+    with open(f'{coordinator.path}.lock', 'a') as stuck:
+        fcntl.flock(stuck, fcntl.LOCK_EX)  # Held through another open file, like another process
+
+        with pytest.raises(TimeoutError, match='held'):
+            await asyncio.wait_for(coordinator.run(lambda connection: None), 2)
+
+        fcntl.flock(stuck, fcntl.LOCK_UN)
+    # The coordinator thread is free again
+    assert await asyncio.wait_for(coordinator.run(lambda connection: 'ok'), 2) == 'ok'
+    await coordinator.close()
@@ -0,0 +1,61 @@
+from eth_account import Account
+from eth_account._utils.typed_transactions import TypedTransaction
+from eth_utils import to_checksum_address
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+
+from bench.mock_chain import ORACLE_ABI
+from bench.mock_chain import ORACLE_ADDRESS
+from fee_oracle import FeeOracle
+from transaction_utils import write_payable_transaction
+from tx_signer import TransactionSigner
+
+
+class CountingSigner(TransactionSigner):
+    def __init__(self):
+        self.encoded = []
+
+    async def encode(self, fn_abi, args):
+        data = await super().encode(fn_abi, args)
+        self.encoded.append(data)
+        return data
+
+
+def fee_history(params):
+    return {
+        'oldestBlock': hex(96), 'baseFeePerGas': [hex(10 ** 9)] * 6, 'gasUsedRatio': [0.5] * 5,
+        'reward': [[hex(10 ** 6)]] * 5,
+    }
+
+
+async def test_call_data_is_encoded_once_for_estimate_and_signature(rpc_server):
+    estimates = []
+    sent = []
+    server = await rpc_server({
+        'eth_feeHistory': fee_history,
+        'eth_estimateGas': lambda params: estimates.append(params[0]) or hex(100000),
+        'eth_sendRawTransaction': lambda params: sent.append(params[0]) or '0x' + '11' * 32,
+    })
+    w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(server.url))
+    fee_oracle = FeeOracle(w3)
+    await fee_oracle.start()
+    account = Account.create()
+    contract = w3.eth.contract(address=to_checksum_address(ORACLE_ADDRESS), abi=ORACLE_ABI)
+    signer = CountingSigner()
+    price_update = [b'PNAU' + bytes(1046)]
+
+    try:
+        await write_payable_transaction(
+            w3, account.address, account.key.hex(), contract, 'resolveMarket', 7, 0,
+            '0x' + '01' * 32, price_update, 'bafy-cid', fee_oracle=fee_oracle, signer=signer,
+        )
+    finally:
+        await fee_oracle.stop()
+
+    assert len(signer.encoded) == 1
+    data = '0x' + signer.encoded[0].hex()
+    # The estimate is made from the encoded call, not by encoding the arguments again
+    assert estimates[0]['data'] == data and estimates[0]['to'] == contract.address
+    signed = TypedTransaction.from_bytes(HexBytes(sent[0])).as_dict()
+    assert '0x' + bytes(signed['data']).hex() == data
+    assert signed['nonce'] == 7 and signed['gas'] == 120000
@@ -0,0 +1,347 @@
+"""
+Lightweight in-process tracing for the transaction lifecycle.
+
+Spans are timed with the wall clock in nanoseconds and nest through a
+contextvar, so a span opened in a request handler is the parent of every span
+opened in the code it awaits. The W3C `traceparent` header carries the trace
+across HTTP hops (monitor -> backend). Finished spans are queued and written
+by a background thread as OTLP/JSON lines (one ExportTraceServiceRequest per
+line, the format of the OpenTelemetry collector's file exporter), which
+collectors, Jaeger and the trace report script can read.
+
+Tracing is off unless TRACE_EXPORT_PATH is set; then every span call is a
+no-op that costs one attribute check.
+"""
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from logger import logger
+
+tracing_logger = logger.bind(
+    service='I Was BORED|Tracing',
+)
+
+TRACE_EXPORT_PATH = ''  # Empty disables tracing; "{pid}" is replaced by the process id
+TRACE_FLUSH_INTERVAL = 1  # Seconds between writes of finished spans
+TRACE_QUEUE_SIZE = 100000  # Finished spans buffered before new ones are dropped
+TRACE_BATCH_SIZE = 1000
+
+TRACEPARENT_HEADER = 'traceparent'
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class SpanContext:
+    __slots__ = ('trace_id', 'span_id')
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    @classmethod
+    def from_traceparent(cls, value: Optional[str]) -> Optional['SpanContext']:
+        """Parse a W3C traceparent header; None if it is missing or malformed."""
+        if not value:
+            return None
+        parts = value.strip().split('-')
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            int(parts[1], 16), int(parts[2], 16)
+        except ValueError:
+            return None
+        return cls(parts[1].lower(), parts[2].lower())
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(hex_digits: int) -> str:
+    return f'{random.getrandbits(hex_digits * 4):0{hex_digits}x}'
+
+
+class Span:
+    """
+    A timed operation; use as a context manager or call `end()` explicitly.
+    """
+    __slots__ = (
+        'tracer', 'name', 'context', 'parent_span_id', 'kind', 'attributes',
+        'start_ns', 'end_ns', 'status', 'status_message', '_token',
+    )
+
+    def __init__(
+        self, tracer: 'Tracer', name: str, parent: Optional[SpanContext], kind: int,
+        attributes: Dict[str, Any], trace_id: Optional[str] = None, start_ns: Optional[int] = None,
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.context = SpanContext(
+            parent.trace_id if parent is not None else trace_id or _new_id(32), _new_id(16),
+        )
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = STATUS_OK
+        self.status_message = ''
+        self._token = None
+
+    def update_name(self, name: str):
+        self.name = name
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_status(self, status: int, message: str = ''):
+        self.status = status
+        self.status_message = message
+
+    def set_error(self, error: BaseException):
+        self.set_status(STATUS_ERROR, str(error) or type(error).__name__)
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            self.tracer._export(self)
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, _traceback):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.set_error(exc)
+        self.end()
+        return False
+
+    def to_otlp(self) -> Dict:
+        span = {
+            'traceId': self.context.trace_id,
+            'spanId': self.context.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': self.status, **({'message': self.status_message} if self.status_message else {})},
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        return span
+
+
+class _NoopSpan:
+    """Stands in for Span while tracing is disabled."""
+    context = None
+
+    def update_name(self, name: str):
+        pass
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_status(self, status: int, message: str = ''):
+        pass
+
+    def set_error(self, error: BaseException):
+        pass
+
+    def end(self, end_ns: Optional[int] = None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, _traceback):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+class Tracer:
+    """
+    Creates spans and exports finished ones from a background thread.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.service_name = 'iwasbored'
+        self.path: Optional[str] = None
+        self.flush_interval = float(TRACE_FLUSH_INTERVAL)
+        self.dropped = 0
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def configure(self, service_name: str, path: Optional[str] = None):
+        """
+        Enable tracing for this process if TRACE_EXPORT_PATH (or `path`) is set.
+        """
+        path = path if path is not None else os.getenv('TRACE_EXPORT_PATH', TRACE_EXPORT_PATH)
+        self.service_name = service_name
+        if not path or self.enabled:
+            return
+        self.path = path.replace('{pid}', str(os.getpid()))
+        self.flush_interval = float(os.getenv('TRACE_FLUSH_INTERVAL', TRACE_FLUSH_INTERVAL))
+        self._queue = queue.Queue(maxsize=int(os.getenv('TRACE_QUEUE_SIZE', TRACE_QUEUE_SIZE)))
+        self._thread = threading.Thread(target=self._run, name='trace-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+        self.enabled = True
+        tracing_logger.info(f'Exporting {service_name} spans to {self.path}')
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def span(
+        self, name: str, parent: Optional[SpanContext] = None, kind: int = SPAN_KIND_INTERNAL,
+        trace_id: Optional[str] = None, **attributes,
+    ):
+        """
+        Start a span under `parent`, or under the current span if no parent is given.
+
+        Args:
+            name (str): The operation name.
+            parent (SpanContext, optional): Explicit parent, e.g. from a traceparent header.
+            kind (int): SPAN_KIND_INTERNAL, SPAN_KIND_SERVER or SPAN_KIND_CLIENT.
+            trace_id (str, optional): Trace id for a new root span.
+            **attributes: Span attributes.
+
+        Returns:
+            Span: Use it as a context manager to make it current, or call `end()`.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+        return Span(self, name, parent, kind, attributes, trace_id)
+
+    def child_span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+        """
+        Like `span`, but only inside an existing trace; background work outside a trace is not recorded.
+        """
+        if not self.enabled or _current_span.get() is None:
+            return NOOP_SPAN
+        return self.span(name, kind=kind, **attributes)
+
+    def record(
+        self, name: str, start_ns: int, end_ns: int, parent: Optional[SpanContext] = None,
+        error: Optional[str] = None, **attributes,
+    ):
+        """
+        Record an already finished operation, e.g. a backoff sleep or a receipt wait.
+        """
+        if not self.enabled:
+            return
+        if parent is None:
+            current = _current_span.get()
+            if current is None:
+                return
+            parent = current.context
+        span = Span(self, name, parent, SPAN_KIND_INTERNAL, attributes, start_ns=start_ns)
+        if error:
+            span.set_status(STATUS_ERROR, error)
+        span.end(end_ns)
+
+    def current_context(self) -> Optional[SpanContext]:
+        current = _current_span.get()
+        return current.context if current is not None else None
+
+    def inject(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Add the traceparent of the current span to `headers`.
+        """
+        headers = headers if headers is not None else {}
+        context = self.current_context()
+        if context is not None:
+            headers[TRACEPARENT_HEADER] = context.traceparent()
+        return headers
+
+    def _export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, spans: List[Span]):
+        request = {
+            'resourceSpans': [{
+                'resource': {'attributes': [
+                    _otlp_attribute('service.name', self.service_name),
+                    _otlp_attribute('process.pid', os.getpid()),
+                ]},
+                'scopeSpans': [{
+                    'scope': {'name': 'iwasbored.tracing'},
+                    'spans': [span.to_otlp() for span in spans],
+                }],
+            }],
+        }
+        try:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(request, separators=(',', ':')) + '\n')
+        except OSError as e:
+            tracing_logger.error(f'Failed to write {len(spans)} spans to {self.path}: {e}')
+
+    def _run(self):
+        while True:
+            spans = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(spans) < TRACE_BATCH_SIZE:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stop = True
+                    break
+                spans.append(span)
+            if spans:
+                self._write(spans)
+            if self.dropped:
+                tracing_logger.warning(f'Trace queue full, dropped {self.dropped} spans')
+                self.dropped = 0
+            if stop:
+                return
+
+    def shutdown(self):
+        """Write the queued spans and stop the writer thread."""
+        if self.enabled:
+            self.enabled = False
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+tracer = Tracer()
@@ -1,9 +1,75 @@
-# Get the chain ID from the settings
-CHAIN_ID = "11155111"
+from tracing import tracer
+from tx_signer import TransactionSigner
+
+# Fallback fee settings, used when no fee oracle is passed in
+DEFAULT_GAS_LIMIT = 10000000
+
+
+def _transaction_params(w3, address, nonce, value=0):
+    """ Builds the legacy transaction parameters passed to build_transaction
+
+    Used without a fee oracle: a fixed gas limit and max fee.
+
+    Args:
+        w3 (web3.Web3): Web3 object for interacting with the Ethereum blockchain
+        address (str): The address of the account sending the transaction
+        nonce (int): The transaction count of the account
+        value (int): The amount of Ether to send with the transaction (in wei)
+
+    Returns:
+        dict: The transaction parameters
+    """
+    return {
+        'from': address,
+        'value': value,
+        'gas': DEFAULT_GAS_LIMIT,  # Set gas limit
+        'maxFeePerGas': w3.to_wei('0.02', 'gwei'),  # Set max fee per gas
+        'nonce': nonce,
+    }
+
+
+async def _sign_and_send(w3, contract, function, args, address, nonce, value, private_key, fee_oracle, signer):
+    """ Encodes the call once, estimates its gas, then signs and sends it through a signing backend
+
+    The call data, which carries the large price updates, is encoded by the
+    signer (off the event loop with a pooled backend); the gas estimate and
+    the signed transaction both use that same data.
+
+    Args:
+        w3 (web3.Web3): Web3 object for interacting with the Ethereum blockchain
+        contract (web3.eth.contract): Web3 contract object to interact with
+        function (str): The name of the function to call on the contract
+        args (tuple): The function parameters
+        address (str): The address of the account sending the transaction
+        nonce (int): The transaction count of the account
+        value (int): The amount of Ether to send with the transaction (in wei)
+        private_key (str): The private key of the account sending the transaction
+        fee_oracle (FeeOracle): Supplies cached chain id and fees, and gas estimates
+        signer (TransactionSigner): Backend that ABI-encodes and signs
+
+    Returns:
+        str: The transaction hash as a hexadecimal string
+    """
+    fn_abi = contract.get_function_by_name(function).abi
+    with tracer.span('tx.encode', function=function):
+        data = await signer.encode(fn_abi, args)
+
+    transaction = {'from': address, 'to': contract.address, 'value': value, 'data': data}
+    with tracer.span('tx.build_params', function=function):
+        transaction.update(await fee_oracle.transaction_params(function, transaction))
+    transaction['nonce'] = nonce
+
+    with tracer.span('tx.sign', function=function):
+        raw_transaction, _ = await signer.sign_transaction(transaction, private_key)
+
+    # Send the raw transaction to the network
+    with tracer.span('tx.send_raw_transaction', function=function):
+        tx_hash = await w3.eth.send_raw_transaction(raw_transaction)
+    return tx_hash.hex()
 
 
 async def write_transaction(
-    w3, address, private_key, contract, function, nonce, *args,
+    w3, address, private_key, contract, function, nonce, *args, fee_oracle=None, signer=None,
 ):
     """ Writes a transaction to the blockchain
 
@@ -17,37 +83,45 @@ async def write_transaction(
         function (str): The name of the function to call on the contract
         nonce (int): The transaction count of the account
         *args: Variable length argument list for the function parameters
+        fee_oracle (FeeOracle, optional): Supplies cached chain id and fees, and gas estimates
+        signer (TransactionSigner, optional): Encodes and signs off the event loop; used with
+            fee_oracle (inline signing without one)
 
     Returns:
         str: The transaction hash as a hexadecimal string
     """
 
+    if fee_oracle is not None:
+        return await _sign_and_send(
+            w3, contract, function, args, address, nonce, 0, private_key, fee_oracle, signer or TransactionSigner(),
+        )
+
     # Create the function object from the contract
     func = getattr(contract.functions, function)
+    contract_function = func(*args)
+    params = _transaction_params(w3, address, nonce)
 
     # Build the transaction dictionary
-    transaction = await func(*args).build_transaction({
-        'from': address,
-        'gas': 10000000,  # Set gas limit
-        'maxFeePerGas': w3.to_wei('0.02', 'gwei'),  # Set max fee per gas
-        'nonce': nonce,
-    })
+    with tracer.span('tx.build_transaction', function=function):
+        transaction = await contract_function.build_transaction(params)
 
     # Sign the transaction with the private key
     # ref: https://web3py.readthedocs.io/en/v5/web3.eth.html#web3.eth.Eth.send_raw_transaction
-    signed_transaction = w3.eth.account.sign_transaction(
-        transaction, private_key,
-    )
+    with tracer.span('tx.sign', function=function):
+        signed_transaction = w3.eth.account.sign_transaction(
+            transaction, private_key,
+        )
 
     # Send the raw transaction to the network
-    tx_hash = await w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+    with tracer.span('tx.send_raw_transaction', function=function):
+        tx_hash = await w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
 
     # Return the transaction hash as a hexadecimal string
     return tx_hash.hex()
 
 
 async def write_payable_transaction(
-    w3, address, private_key, contract, function, nonce, value=0, *args,
+    w3, address, private_key, contract, function, nonce, value=0, *args, fee_oracle=None, signer=None,
 ):
     """ Writes a payable transaction to the blockchain
 
@@ -63,29 +137,37 @@ async def write_payable_transaction(
         nonce (int): The transaction count of the account
         value (int): The amount of Ether to send with the transaction (in wei)
         *args: Variable length argument list for the function parameters
+        fee_oracle (FeeOracle, optional): Supplies cached chain id and fees, and gas estimates
+        signer (TransactionSigner, optional): Encodes and signs off the event loop; used with
+            fee_oracle (inline signing without one)
 
     Returns:
         str: The transaction hash as a hexadecimal string
     """
+    if fee_oracle is not None:
+        return await _sign_and_send(
+            w3, contract, function, args, address, nonce, value, private_key, fee_oracle,
+            signer or TransactionSigner(),
+        )
+
     # Create the function object from the contract
     func = getattr(contract.functions, function)
+    contract_function = func(*args)
+    params = _transaction_params(w3, address, nonce, value)
 
     # Build the transaction dictionary, including the value to be sent
-    transaction = await func(*args).build_transaction({
-        'from': address,
-        'value': value,
-        'gas': 10000000,  # Set gas limit
-        'maxFeePerGas': w3.to_wei('0.02', 'gwei'),  # Set max fee per gas
-        'nonce': nonce,
-    })
+    with tracer.span('tx.build_transaction', function=function):
+        transaction = await contract_function.build_transaction(params)
 
     # Sign the transaction with the private key
-    signed_transaction = w3.eth.account.sign_transaction(
-        transaction, private_key,
-    )
+    with tracer.span('tx.sign', function=function):
+        signed_transaction = w3.eth.account.sign_transaction(
+            transaction, private_key,
+        )
 
     # Send the raw transaction to the network
-    tx_hash = await w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+    with tracer.span('tx.send_raw_transaction', function=function):
+        tx_hash = await w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
 
     # Return the transaction hash as a hexadecimal string
     return tx_hash.hex()
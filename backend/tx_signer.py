@@ -0,0 +1,157 @@
+"""
+Pluggable transaction signing backends.
+
+ABI-encoding the call data (which carries large Pyth VAAs) and secp256k1
+signing are CPU-bound. The signers here run that work inline, in a thread
+pool or in a process pool, behind one async interface, so the event loop is
+not blocked and the signer can later be swapped for e.g. a remote KMS.
+
+A call is encoded once with `encode`; the same data goes into the gas
+estimate and, through `sign_transaction`, into the signed transaction.
+"""
+import asyncio
+import os
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import function_abi_to_4byte_selector
+from eth_utils.abi import collapse_if_tuple
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import abi_address_to_hex
+from web3._utils.normalizers import abi_bytes_to_bytes
+from web3._utils.normalizers import abi_string_to_text
+
+from logger import logger
+
+signer_logger = logger.bind(
+    service='I Was BORED|Transaction Signer',
+)
+
+SIGNER_BACKEND = 'thread'  # inline | thread | process
+SIGNER_POOL_WORKERS = 2
+
+ENCODING_NORMALIZERS = [abi_address_to_hex, abi_bytes_to_bytes, abi_string_to_text]
+
+
+def encode_call(fn_abi: Dict, args: Sequence[Any]) -> bytes:
+    """
+    ABI-encode a contract call: the function selector followed by its arguments.
+
+    Args:
+        fn_abi (dict): ABI entry of the contract function.
+        args (list): The function parameters.
+
+    Returns:
+        bytes: The transaction `data`.
+    """
+    types = [collapse_if_tuple(arg) for arg in fn_abi['inputs']]
+    normalized_args = map_abi_data(ENCODING_NORMALIZERS, types, list(args))
+    return function_abi_to_4byte_selector(fn_abi) + encode(types, normalized_args)
+
+
+def sign_transaction(transaction: Dict, private_key: str) -> Tuple[bytes, str]:
+    """
+    Sign a complete transaction, `data` included.
+
+    Returns:
+        tuple: The raw signed transaction and its 0x-prefixed hash.
+    """
+    signed_transaction = Account.sign_transaction(transaction, private_key)
+    return bytes(signed_transaction.rawTransaction), '0x' + bytes(signed_transaction.hash).hex()
+
+
+def encode_and_sign(fn_abi: Dict, args: Sequence[Any], transaction: Dict, private_key: str) -> Tuple[bytes, str]:
+    """
+    ABI-encode a contract call into `transaction` and sign it.
+
+    These are plain module-level functions so they can run in a process pool.
+
+    Args:
+        fn_abi (dict): ABI entry of the contract function.
+        args (list): The function parameters.
+        transaction (dict): Complete transaction fields except `data`.
+        private_key (str): The signer's private key.
+
+    Returns:
+        tuple: The raw signed transaction and its 0x-prefixed hash.
+    """
+    return sign_transaction(dict(transaction, data=encode_call(fn_abi, args)), private_key)
+
+
+class TransactionSigner:
+    """
+    Signs transactions inline on the event loop.
+
+    Subclasses override `sign` (and `close`) to move the work elsewhere.
+    """
+
+    async def encode(self, fn_abi: Dict, args: Sequence[Any]) -> bytes:
+        return encode_call(fn_abi, args)
+
+    async def sign_transaction(self, transaction: Dict, private_key: str) -> Tuple[bytes, str]:
+        return sign_transaction(transaction, private_key)
+
+    async def sign(self, fn_abi: Dict, args: Sequence[Any], transaction: Dict, private_key: str) -> Tuple[bytes, str]:
+        return encode_and_sign(fn_abi, args, transaction, private_key)
+
+    async def close(self):
+        pass
+
+
+class ExecutorTransactionSigner(TransactionSigner):
+    """
+    Signs transactions in a thread or process pool.
+    """
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+
+    async def encode(self, fn_abi: Dict, args: Sequence[Any]) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, encode_call, fn_abi, list(args))
+
+    async def sign_transaction(self, transaction: Dict, private_key: str) -> Tuple[bytes, str]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, sign_transaction, transaction, private_key,
+        )
+
+    async def sign(self, fn_abi: Dict, args: Sequence[Any], transaction: Dict, private_key: str) -> Tuple[bytes, str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, encode_and_sign, fn_abi, list(args), transaction, private_key,
+        )
+
+    async def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_signer(backend: Optional[str] = None, workers: Optional[int] = None) -> TransactionSigner:
+    """
+    Build the signer configured by SIGNER_BACKEND and SIGNER_POOL_WORKERS.
+
+    Returns:
+        TransactionSigner: The signing backend.
+    """
+    backend = backend or os.getenv('SIGNER_BACKEND', SIGNER_BACKEND)
+    workers = workers or int(os.getenv('SIGNER_POOL_WORKERS', SIGNER_POOL_WORKERS))
+
+    if backend == 'inline':
+        signer = TransactionSigner()
+    elif backend == 'thread':
+        signer = ExecutorTransactionSigner(
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tx-signer'),
+        )
+    elif backend == 'process':
+        signer = ExecutorTransactionSigner(ProcessPoolExecutor(max_workers=workers))
+    else:
+        raise ValueError(f'Unknown SIGNER_BACKEND: {backend}')
+
+    signer_logger.info(f'Using {backend} transaction signer with {workers} workers')
+    return signer